@@ -1,3 +1,5 @@
+import { apiFetch } from "./api/http";
+
 const API_BASE = "http://localhost:3000/api"; // API Gateway
 
 // --- Menu ---
@@ -16,7 +18,7 @@ export async function getMenu(filters = {}) {
     const queryString = params.toString();
     const url = queryString ? `${API_BASE}/menu/?${queryString}` : `${API_BASE}/menu/`;
 
-    const res = await fetch(url);
+    const res = await apiFetch(url);
     if (!res.ok) throw new Error('Failed to fetch menu');
     const data = await res.json();
     return data.success ? data.data : [];
@@ -28,7 +30,7 @@ export async function getMenu(filters = {}) {
 
 export async function createMenuItem(menuData) {
   try {
-    const res = await fetch(`${API_BASE}/menu/`, {
+    const res = await apiFetch(`${API_BASE}/menu/`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(menuData),
@@ -50,7 +52,7 @@ export async function createMenuItem(menuData) {
 
 export async function updateMenuItem(menuId, updateData) {
   try {
-    const res = await fetch(`${API_BASE}/menu/${menuId}`, {
+    const res = await apiFetch(`${API_BASE}/menu/${menuId}`, {
       method: "PUT",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(updateData),
@@ -72,7 +74,7 @@ export async function updateMenuItem(menuId, updateData) {
 
 export async function deleteMenuItem(menuId) {
   try {
-    const res = await fetch(`${API_BASE}/menu/${menuId}`, {
+    const res = await apiFetch(`${API_BASE}/menu/${menuId}`, {
       method: "DELETE",
     });
     if (!res.ok) throw new Error('Failed to delete menu item');
@@ -0,0 +1,14 @@
+// Read-your-writes con le repliche di lettura: ogni scrittura riuscita restituisce
+// X-Last-Write, che rimandiamo con le richieste successive così le letture restano
+// sul database primario finché una replica non è aggiornata (services/shared/replicas.py)
+let lastWrite = null;
+
+export async function apiFetch(url, options = {}) {
+  const headers = new Headers(options.headers || {});
+  if (lastWrite) headers.set('X-Last-Write', lastWrite);
+
+  const response = await fetch(url, { ...options, headers });
+  const written = response.headers.get('X-Last-Write');
+  if (written) lastWrite = written;
+  return response;
+}
@@ -1,5 +1,7 @@
 // Funzioni API per la gestione degli ordini
 
+import { apiFetch } from './http';
+
 const ORDER_SERVICE_URL = process.env.REACT_APP_ORDER_SERVICE_URL || 'http://localhost:3000/api';
 
 // Gestione errori API
@@ -22,7 +24,50 @@ export const getOrders = async (filters = {}) => {
     if (filters.date_to) params.append('date_to', filters.date_to);
     if (filters.limit) params.append('limit', filters.limit);
 
-    const response = await fetch(`${ORDER_SERVICE_URL}/orders?${params}`);
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders?${params}`);
+    const data = await response.json();
+    
+    if (!data.success) {
+      throw new Error(data.message);
+    }
+    
+    return data.data;
+  } catch (error) {
+    throw handleApiError(error);
+  }
+};
+
+// Delta sync: ordini modificati dopo il cursore, più gli ordini eliminati
+export const getOrderChanges = async (since = 0) => {
+  try {
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/changes?since=${since}`);
+    const data = await response.json();
+    
+    if (!data.success) {
+      throw new Error(data.message);
+    }
+    
+    return {
+      orders: data.data,
+      deleted: data.deleted,
+      nextCursor: data.next_cursor,
+      hasMore: data.has_more,
+      reset: data.reset
+    };
+  } catch (error) {
+    throw handleApiError(error);
+  }
+};
+
+// Conti per tavolo: saldo aperto, numero di ordini e riepilogo piatti
+export const getTableBills = async (filters = {}) => {
+  try {
+    const params = new URLSearchParams();
+    
+    if (filters.status) params.append('status', filters.status);
+    if (filters.table_number) params.append('table_number', filters.table_number);
+
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/tables?${params}`);
     const data = await response.json();
     
     if (!data.success) {
@@ -37,7 +82,7 @@ export const getOrders = async (filters = {}) => {
 
 export const getOrderById = async (orderId) => {
   try {
-    const response = await fetch(`${ORDER_SERVICE_URL}/orders/${orderId}`);
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/${orderId}`);
     const data = await response.json();
     
     if (!data.success) {
@@ -52,7 +97,7 @@ export const getOrderById = async (orderId) => {
 
 export const createOrder = async (orderData) => {
   try {
-    const response = await fetch(`${ORDER_SERVICE_URL}/orders`, {
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -74,7 +119,7 @@ export const createOrder = async (orderData) => {
 
 export const updateOrderStatus = async (orderId, status) => {
   try {
-    const response = await fetch(`${ORDER_SERVICE_URL}/orders/${orderId}/status`, {
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/${orderId}/status`, {
       method: 'PUT',
       headers: {
         'Content-Type': 'application/json',
@@ -96,13 +141,13 @@ export const updateOrderStatus = async (orderId, status) => {
 
 export const payOrder = async (orderId, paymentData = {}) => {
   try {
-    // Update the order status to 'delivered' (represents paid and completed)
-    const response = await fetch(`${ORDER_SERVICE_URL}/orders/${orderId}/status`, {
-      method: 'PUT',
+    // Mark the order as payed (no actual payment processing)
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/${orderId}/pay`, {
+      method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ status: 'delivered' }),
+      body: JSON.stringify(paymentData),
     });
     
     const data = await response.json();
@@ -115,9 +160,9 @@ export const payOrder = async (orderId, paymentData = {}) => {
       success: true,
       data: data.data,
       payment_info: {
-        payment_method: paymentData.payment_method || 'cash',
+        payment_method: data.payment_info.method,
         payment_amount: paymentData.payment_amount || 0,
-        change: paymentData.payment_amount ? Math.max(0, paymentData.payment_amount - parseFloat(data.data.final_amount || 0)) : 0
+        change: Math.max(0, data.payment_info.change || 0)
       }
     };
   } catch (error) {
@@ -125,9 +170,37 @@ export const payOrder = async (orderId, paymentData = {}) => {
   }
 };
 
+// Pagamento di più ordini (es. tutto il tavolo) in un'unica transazione: al massimo
+// 50 ordini per chiamata; payment_amount, se presente, deve coprire il totale
+export const payOrdersBatch = async (orderIds, paymentData = {}) => {
+  try {
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/pay-batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ order_ids: orderIds, ...paymentData }),
+    });
+    
+    const data = await response.json();
+    
+    if (!data.success) {
+      throw new Error(data.message);
+    }
+    
+    return {
+      orders: data.data,
+      receipt: data.receipt,
+      payment_info: data.payment_info
+    };
+  } catch (error) {
+    throw handleApiError(error);
+  }
+};
+
 export const getKitchenOrders = async () => {
   try {
-    const response = await fetch(`${ORDER_SERVICE_URL}/orders/kitchen`);
+    const response = await apiFetch(`${ORDER_SERVICE_URL}/orders/kitchen`);
     const data = await response.json();
     
     if (!data.success) {
@@ -146,7 +219,7 @@ const MENU_SERVICE_URL = process.env.REACT_APP_MENU_SERVICE_URL || 'http://local
 
 export const getMenu = async () => {
   try {
-    const response = await fetch(`${MENU_SERVICE_URL}/menu`);
+    const response = await apiFetch(`${MENU_SERVICE_URL}/menu`);
     const data = await response.json();
     
     if (!data.success) {
@@ -161,7 +234,7 @@ export const getMenu = async () => {
 
 export const createMenuItem = async (menuItemData) => {
   try {
-    const response = await fetch(`${MENU_SERVICE_URL}/menu`, {
+    const response = await apiFetch(`${MENU_SERVICE_URL}/menu`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
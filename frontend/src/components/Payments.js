@@ -1,8 +1,11 @@
 import React, { useState, useEffect } from 'react';
-import { getOrders, payOrder, formatOrderStatus, formatOrderType } from '../api/orderApi';
+import { getTableBills, payOrdersBatch } from '../api/orderApi';
+
+// Il servizio ordini accetta al massimo 50 ordini per pagamento (MAX_BATCH_ORDERS)
+const MAX_BATCH_ORDERS = 50;
 
 export default function Payments() {
-  const [orders, setOrders] = useState([]);
+  const [tables, setTables] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedTable, setSelectedTable] = useState('');
   const [autoRefresh, setAutoRefresh] = useState(true);
@@ -21,43 +24,44 @@ export default function Payments() {
       if (interval) clearInterval(interval);
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [selectedTable, autoRefresh]);
+  }, [autoRefresh]);
 
   const loadOrders = async () => {
     try {
-      const filters = {
-        status: 'ready' // Solo ordini pronti per il pagamento (delivered = già pagato)
-      };
-
-      if (selectedTable) {
-        filters.table_number = selectedTable;
-      }
-
-      const data = await getOrders(filters);
-      setOrders(data);
+      // Un conto per tavolo, solo con gli ordini pronti per il pagamento
+      const data = await getTableBills({ status: 'payable' });
+      setTables(data);
     } catch (error) {
-      console.error('Error loading orders:', error);
+      console.error('Error loading table bills:', error);
     } finally {
       setLoading(false);
     }
   };
 
-  const handlePayment = async (orderId, orderAmount) => {
+  const payTable = async (table) => {
+    // Pagamento in contanti: nessuna logica di resto, si assume importo esatto
+    // Tutti gli ordini del tavolo vengono saldati insieme oppure nessuno
+    const orderIds = table.payable_order_ids;
+    if (orderIds.length <= MAX_BATCH_ORDERS) {
+      // Si paga il conto mostrato: se nel frattempo è cresciuto il server rifiuta
+      return payOrdersBatch(orderIds, { payment_method: paymentMethod, payment_amount: table.payable_balance });
+    }
+    // Tavolo oltre il limite: a blocchi, senza importo (il conto è solo per tavolo)
+    for (let start = 0; start < orderIds.length; start += MAX_BATCH_ORDERS) {
+      await payOrdersBatch(orderIds.slice(start, start + MAX_BATCH_ORDERS), { payment_method: paymentMethod });
+    }
+  };
+
+  const handlePayment = async (table) => {
     try {
-      setProcessingPayment(orderId);
+      setProcessingPayment(table.table_number);
       
-      // Pagamento in contanti: nessuna logica di resto, si assume importo esatto
-      let paymentAmount = orderAmount;
-      
-      // Mark order as paid (no actual payment processing)
-      const result = await payOrder(orderId, {
-        payment_method: paymentMethod,
-        payment_amount: paymentAmount
-      });
+      // Mark the table's orders as paid (no actual payment processing)
+      await payTable(table);
       
       alert('Pagamento completato con successo!');
       
-      // Reload orders
+      // Reload bills
       await loadOrders();
     } catch (error) {
       console.error('Error processing payment:', error);
@@ -67,17 +71,7 @@ export default function Payments() {
     }
   };
 
-  const getStatusColor = (status) => {
-    const colors = {
-      confirmed: '#0a84ff',
-      preparing: '#ff5722',
-      ready: '#34c759',
-      delivered: '#8e8e93',
-      payed: '#30d158',
-      cancelled: '#ff453a'
-    };
-    return colors[status] || '#8e8e93';
-  };
+  const accentColor = '#34c759';
 
   const hexToRgba = (hex, alpha = 1) => {
     const sanitized = hex.replace('#', '');
@@ -92,14 +86,16 @@ export default function Payments() {
   };
 
   const getUniqueTableNumbers = () => {
-    const tables = [...new Set(orders.map(order => order.table_number))];
-    return tables.sort((a, b) => a - b);
+    return tables.map(table => table.table_number).filter(number => number !== null);
   };
 
-  const filteredOrders = orders.filter(order =>
-    !selectedTable || order.table_number.toString() === selectedTable
+  const filteredTables = tables.filter(table =>
+    !selectedTable || String(table.table_number) === selectedTable
   );
 
+  const totalAmount = filteredTables.reduce((total, table) => total + table.payable_balance, 0).toFixed(2);
+  const ordersCount = filteredTables.reduce((total, table) => total + table.payable_orders_count, 0);
+
   if (loading) {
     return <div className="glass-card loading-panel">Caricamento pagamenti...</div>;
   }
@@ -168,20 +164,19 @@ export default function Payments() {
             </select>
           </div>
 
-          <span className="active-orders__count">{filteredOrders.length} ordini pronti</span>
+          <span className="active-orders__count">{ordersCount} ordini pronti</span>
         </div>
       </section>
 
       <div className="active-orders__list">
-        {filteredOrders.length === 0 && (
+        {filteredTables.length === 0 && (
           <div className="empty-state">
             <span role="img" aria-label="payment">💳</span>
             Non ci sono ordini pronti per il pagamento al momento.
           </div>
         )}
 
-        {filteredOrders.map((order) => {
-          const accentColor = getStatusColor(order.status);
+        {filteredTables.map((table) => {
           const cardStyle = {
             border: `1px solid ${hexToRgba(accentColor, 0.45)}`,
             boxShadow: `0 24px 38px -28px ${hexToRgba(accentColor, 0.55)}`
@@ -191,62 +186,48 @@ export default function Payments() {
           };
 
           return (
-            <article key={order.id} className="glass-card active-orders__card" style={cardStyle}>
+            <article key={table.table_number ?? 'none'} className="glass-card active-orders__card" style={cardStyle}>
               <header className="active-orders__card-header" style={headerStyle}>
                 <div className="active-orders__card-meta">
-                  <strong className="active-orders__order-number">{order.order_number}</strong>
-                  <span>{formatOrderStatus(order.status)} • {formatOrderType(order.order_type)}</span>
-                </div>
-                <div className="active-orders__card-meta active-orders__card-meta--right">
-                  <span className="status-badge">Tavolo {order.table_number}</span>
-                  {order.customer_name && (
-                    <span>{order.customer_name}</span>
-                  )}
+                  <strong className="active-orders__order-number">
+                    {table.table_number !== null ? `Tavolo ${table.table_number}` : 'Senza tavolo'}
+                  </strong>
+                  <span>{table.payable_orders_count} ordini pronti</span>
                 </div>
               </header>
 
               <div className="active-orders__card-body">
                 <div>
-                  <strong>Piatti ({order.items.length})</strong>
+                  <strong>Piatti ({table.items.length})</strong>
                   <div className="active-orders__items">
-                    {order.items.map((item, index) => (
-                      <div key={index} className="active-orders__item">
+                    {table.items.map((item) => (
+                      <div key={item.menu_item_id} className="active-orders__item">
                         <div>
                           <span className="active-orders__item-name">
                             {item.quantity}× {item.menu_item_name}
                           </span>
-                          {item.special_instructions && (
-                            <span className="active-orders__item-notes">📝 {item.special_instructions}</span>
-                          )}
                         </div>
                         <div className="active-orders__item-price">
-                          <span>€{item.total_price}</span>
+                          <span>€{item.total_price.toFixed(2)}</span>
                         </div>
                       </div>
                     ))}
                   </div>
                 </div>
-
-                {order.special_instructions && (
-                  <div className="active-orders__items active-orders__notes">
-                    <strong>📋 Note Ordine</strong>
-                    <span className="text-muted">{order.special_instructions}</span>
-                  </div>
-                )}
               </div>
 
               <footer className="active-orders__footer">
                 <div>
-                  <div className="active-orders__footer-total">Totale: €{order.final_amount}</div>
+                  <div className="active-orders__footer-total">Totale: €{table.payable_balance.toFixed(2)}</div>
                 </div>
                 <button
                   type="button"
                   className="button-glass button-glass--success"
-                  onClick={() => handlePayment(order.id, parseFloat(order.final_amount))}
-                  disabled={processingPayment === order.id}
+                  onClick={() => handlePayment(table)}
+                  disabled={processingPayment === table.table_number}
                   style={{ minWidth: '140px' }}
                 >
-                  {processingPayment === order.id ? '⏳ Elaborazione...' : '💰 Paga Ora'}
+                  {processingPayment === table.table_number ? '⏳ Elaborazione...' : '💰 Paga Tavolo'}
                 </button>
               </footer>
             </article>
@@ -258,7 +239,7 @@ export default function Payments() {
         <div className="active-orders__summary-grid">
           <div className="active-orders__summary-card">
             <div className="active-orders__summary-value">
-              €{filteredOrders.reduce((total, order) => total + parseFloat(order.final_amount), 0).toFixed(2)}
+              €{totalAmount}
             </div>
             <div className="active-orders__summary-label">Totale da Incassare</div>
           </div>
@@ -267,37 +248,35 @@ export default function Payments() {
               type="button"
               className="button-glass button-glass--success"
               onClick={async () => {
-                if (filteredOrders.length === 0) {
+                if (ordersCount === 0) {
                   alert('Non ci sono ordini da pagare');
                   return;
                 }
                 
-                const totalAmount = filteredOrders.reduce((total, order) => total + parseFloat(order.final_amount), 0).toFixed(2);
-                
-                if (!window.confirm(`Confermi il pagamento di €${totalAmount} per ${filteredOrders.length} ordini?`)) {
+                if (!window.confirm(`Confermi il pagamento di €${totalAmount} per ${ordersCount} ordini?`)) {
                   return;
                 }
                 
+                let paidTables = 0;
                 try {
-                  // Process all payments
-                  for (const order of filteredOrders) {
-                    await payOrder(order.id, {
-                      payment_method: paymentMethod,
-                      payment_amount: parseFloat(order.final_amount)
-                    });
+                  // Un pagamento per tavolo, ognuno con il proprio conto
+                  for (const table of filteredTables.filter(table => table.payable_orders_count > 0)) {
+                    await payTable(table);
+                    paidTables += 1;
                   }
                   
                   alert(`Tutti i pagamenti completati con successo! Totale: €${totalAmount}`);
-                  await loadOrders();
                 } catch (error) {
                   console.error('Error processing batch payment:', error);
-                  alert('Errore nel processare i pagamenti: ' + error.message);
+                  alert(`Errore nel processare i pagamenti (tavoli pagati: ${paidTables}): ` + error.message);
+                } finally {
+                  await loadOrders();
                 }
               }}
-              disabled={filteredOrders.length === 0 || processingPayment !== null}
+              disabled={ordersCount === 0 || processingPayment !== null}
               style={{ width: '100%', height: '60px', fontSize: '1.1em' }}
             >
-              💰 Paga Tutti ({filteredOrders.length})
+              💰 Paga Tutti ({ordersCount})
             </button>
           </div>
         </div>
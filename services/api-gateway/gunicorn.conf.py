@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for the API gateway (shared/gunicorn_config.py).
+
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+The gateway only waits on the backends, so it defaults to 8 threads per
+worker and also runs on gevent (GUNICORN_WORKER_CLASS=gevent). The backend
+HTTP connection pool is reset in post_fork so no two processes ever share
+a socket.
+"""
+
+from shared.gunicorn_config import WORKER_CLASSES, post_worker_init, settings  # noqa: F401
+
+globals().update(settings(port=3000, threads=8, worker_classes=WORKER_CLASSES + ('gevent',)))
+
+
+def post_fork(server, worker):
+    # Start every worker with its own, empty backend connection pool
+    import http_pool
+
+    http_pool.reset()
@@ -0,0 +1,279 @@
+"""
+Admission control for the gateway: rate limits, priority lanes and load shedding.
+
+Every API request belongs to a lane (LANES, by endpoint). Kitchen bumps and
+payments must keep flowing while a manager bulk-edits the menu or a
+terminal misbehaves, so:
+
+1. Rate limits: a token bucket per client and endpoint, refilled at the
+   lane's rate (RATE_LIMITS). An empty bucket answers 429 with Retry-After.
+2. Concurrency: at most ADMISSION_CONCURRENCY requests per worker are
+   passed on to the services at once, and each lane may only fill its share
+   of those slots. The lower lanes leave headroom for the higher ones.
+3. Priority queue: a request that finds no free slot waits, highest lane
+   first, for up to ADMISSION_QUEUE_TIMEOUT seconds. It is shed (503 with
+   Retry-After) when its lane's queue-depth limit is reached or the wait
+   times out.
+
+Buckets and slots are per worker process. The counters are in /health
+under 'admission'.
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+from itertools import count
+
+from flask import g, jsonify, request
+
+Lane = namedtuple('Lane', 'priority share max_queue retry_after')
+
+# share: fraction of the slots the lane may occupy; max_queue: requests
+# waiting (in every lane) beyond which it is shed; retry_after: seconds
+LANES = {
+    'critical': Lane(priority=0, share=1.0, max_queue=16, retry_after=1),
+    'high': Lane(priority=1, share=0.9, max_queue=8, retry_after=1),
+    'normal': Lane(priority=2, share=0.75, max_queue=4, retry_after=2),
+    'low': Lane(priority=3, share=0.5, max_queue=2, retry_after=5),
+}
+
+ENDPOINT_LANES = {
+    # Kitchen
+    'gateway.update_order_item_status': 'critical',
+    'gateway.update_order_items_status': 'critical',
+    'gateway.update_order_status': 'critical',
+    # Payments
+    'gateway.pay_order': 'critical',
+    'gateway.pay_orders_batch': 'critical',
+    # Waiters
+    'gateway.create_order': 'high',
+    'gateway.update_order': 'high',
+    'gateway.cancel_order': 'high',
+    'gateway.get_order_changes': 'high',
+    'gateway.get_table_bills': 'high',
+    'gateway.get_orders': 'high',
+    'gateway.get_order': 'high',
+    # Menu browsing
+    'gateway.get_menu_items': 'normal',
+    'gateway.get_available_menu_items': 'normal',
+    'gateway.get_menu_item': 'normal',
+    # Menu administration and reports
+    'gateway.create_menu_item': 'low',
+    'gateway.update_menu_item': 'low',
+    'gateway.delete_menu_item': 'low',
+    'gateway.get_analytics': 'low',
+}
+DEFAULT_LANE = 'normal'
+
+# Never limited: probes, the API index, CORS preflights
+EXEMPT_PATHS = ('/', '/health', '/livez', '/readyz')
+
+MAX_BUCKETS = 10000  # Idle (full) buckets are dropped beyond this many
+
+
+def parse_rate_limits(value):
+    """'critical=20/40,low=2/10' -> {'critical': (20.0, 40.0), 'low': (2.0, 10.0)} (tokens per second / burst)"""
+    limits = {}
+    for part in (value or '').split(','):
+        if not part.strip():
+            continue
+        lane, _, spec = part.partition('=')
+        rate, _, burst = spec.partition('/')
+        rate = float(rate)
+        limits[lane.strip()] = (rate, float(burst) if burst else rate)
+    return limits
+
+
+class TokenBuckets:
+    """Token buckets keyed by (client, endpoint)"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, rate, burst):
+        """Take one token; returns 0 when allowed, else the seconds until a token is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, rate, burst)
+                if len(self._buckets) > MAX_BUCKETS:
+                    self._sweep(now)
+                return 0
+            self._buckets[key] = (tokens, now, rate, burst)
+            return (1 - tokens) / rate
+
+    def _sweep(self, now):
+        # Buckets that have refilled completely (at their own lane's rate)
+        # hold no state worth keeping
+        for key, (tokens, last, rate, burst) in list(self._buckets.items()):
+            if tokens + (now - last) * rate >= burst:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class _Waiter:
+    __slots__ = ('lane', 'sequence', 'event', 'granted')
+
+    def __init__(self, lane, sequence):
+        self.lane = lane
+        self.sequence = sequence
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """Rate limits and priority admission for the gateway's API requests"""
+
+    def __init__(self):
+        self.app = None
+        self.buckets = TokenBuckets()
+        self.concurrency = 0
+        self._sequence = count()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._lock = threading.Lock()
+        self._waiters = []
+        self.in_flight = 0
+        self.counts = {
+            name: {'in_flight': 0, 'admitted': 0, 'queued': 0, 'shed': 0, 'rate_limited': 0, 'wait_ms': 0.0}
+            for name in LANES
+        }
+        self.max_waiting = 0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['admission'] = self
+        config = app.config
+        self.rate_limits = parse_rate_limits(config.get('RATE_LIMITS', ''))
+        self.rate_limit_enabled = config.get('RATE_LIMIT_ENABLED', True)
+        self.admission_enabled = config.get('ADMISSION_ENABLED', True)
+        self.concurrency = config.get('ADMISSION_CONCURRENCY', 6)
+        self.queue_timeout = config.get('ADMISSION_QUEUE_TIMEOUT', 2.0)
+        self.trust_proxy = config.get('RATE_LIMIT_TRUST_PROXY', False)
+        self.buckets.clear()
+        self._reset_state()
+
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    @property
+    def stats(self):
+        lanes = {}
+        for name, counts in self.counts.items():
+            lanes[name] = {key: value for key, value in counts.items() if key != 'wait_ms'}
+            lanes[name]['avg_wait_ms'] = round(counts['wait_ms'] / counts['queued'], 1) if counts['queued'] else 0
+            lanes[name]['waiting'] = sum(1 for waiter in self._waiters if waiter.lane == name)
+        return {
+            'concurrency': self.concurrency,
+            'in_flight': self.in_flight,
+            'waiting': len(self._waiters),
+            'max_waiting': self.max_waiting,
+            'rate_limit_buckets': len(self.buckets),
+            'lanes': lanes
+        }
+
+    # -- request hooks -----------------------------------------------------
+
+    def _admit(self):
+        if request.method == 'OPTIONS' or request.path in EXEMPT_PATHS or request.endpoint is None:
+            return None
+        lane = ENDPOINT_LANES.get(request.endpoint, DEFAULT_LANE)
+
+        if self.rate_limit_enabled and lane in self.rate_limits:
+            rate, burst = self.rate_limits[lane]
+            wait = self.buckets.take((self.client_id(), request.endpoint), rate, burst) if rate > 0 else 0
+            if wait:
+                self.counts[lane]['rate_limited'] += 1
+                return self._reject(429, 'Too many requests', math.ceil(wait), lane)
+
+        if self.admission_enabled and self.concurrency > 0:
+            if not self.acquire(lane):
+                return self._reject(503, 'Server busy, try again shortly', LANES[lane].retry_after, lane)
+            g.admission_lane = lane
+        return None
+
+    def _release(self, error=None):
+        lane = g.pop('admission_lane', None)
+        if lane is not None:
+            self.release(lane)
+
+    def client_id(self):
+        """The client a request is counted against: its address (or the first X-Forwarded-For hop behind a proxy)"""
+        if self.trust_proxy and request.headers.get('X-Forwarded-For'):
+            return request.headers['X-Forwarded-For'].split(',')[0].strip()
+        return request.remote_addr or 'unknown'
+
+    def _reject(self, status_code, message, retry_after, lane):
+        response = jsonify({'success': False, 'message': message, 'lane': lane, 'retry_after': retry_after})
+        response.status_code = status_code
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    # -- slots ---------------------------------------------------------------
+
+    def _limit(self, lane):
+        return max(1, int(self.concurrency * LANES[lane].share))
+
+    def _admissible(self, lane):
+        return self.in_flight < self._limit(lane)
+
+    def _grant(self, lane):
+        self.in_flight += 1
+        self.counts[lane]['in_flight'] += 1
+        self.counts[lane]['admitted'] += 1
+
+    def acquire(self, lane):
+        """Take a slot for a request of `lane`, waiting in the priority queue if needed; False when shed"""
+        priority = LANES[lane].priority
+        with self._lock:
+            ahead = any(LANES[waiter.lane].priority <= priority for waiter in self._waiters)
+            if not ahead and self._admissible(lane):
+                self._grant(lane)
+                return True
+            if len(self._waiters) >= LANES[lane].max_queue:
+                self.counts[lane]['shed'] += 1
+                return False
+            waiter = _Waiter(lane, next(self._sequence))
+            self._waiters.append(waiter)
+            self._waiters.sort(key=lambda queued: (LANES[queued.lane].priority, queued.sequence))
+            self.max_waiting = max(self.max_waiting, len(self._waiters))
+            self.counts[lane]['queued'] += 1
+
+        started = time.monotonic()
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            self.counts[lane]['wait_ms'] += (time.monotonic() - started) * 1000
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.counts[lane]['shed'] += 1
+            return False
+
+    def release(self, lane):
+        with self._lock:
+            self.in_flight -= 1
+            self.counts[lane]['in_flight'] -= 1
+            # Hand the freed capacity to the highest waiting lane that may use it
+            for waiter in list(self._waiters):
+                if not self._admissible(waiter.lane):
+                    continue
+                self._waiters.remove(waiter)
+                waiter.granted = True
+                self._grant(waiter.lane)
+                waiter.event.set()
+                if self.in_flight >= self.concurrency:
+                    break
+
+
+admission = AdmissionController()
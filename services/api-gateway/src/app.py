@@ -1,18 +1,44 @@
-from flask import Flask, jsonify
+from flask import Flask, current_app, jsonify
 from flask_cors import CORS
 from datetime import datetime
+import logging
 import os
 import time
 
+from admission import admission
 from config import config
-from routes.gateway_routes import gateway_bp
+from http_pool import get_session
+from recorder import recorder
+from shared.json_provider import WireRequest, json_provider
+from shared.logs import setup_logging, pipeline as log_pipeline
+from shared.startup import readiness
+from shared.tracing import tracer
+from routes.gateway_routes import gateway_bp, RETURNED_HEADERS
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_http_pool():
+    """Create this process's pooled session to the services"""
+    get_session(current_app.config.get('HTTP_POOL_MAXSIZE', 32))
+
 
 def create_app(config_name='default'):
+    readiness.begin()
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = json_provider(app)
+    app.request_class = WireRequest  # MessagePack request bodies
+    setup_logging(app, 'api-gateway')
     
     # Initialize extensions
-    CORS(app)
+    CORS(app, expose_headers=RETURNED_HEADERS + ['Retry-After'])
+    tracer.init_app(app, 'api-gateway')
+    # The readiness gate goes first: a request held while the worker starts
+    # must not sit on an admission slot or spend its client's tokens
+    readiness.init_app(app, warmups=[('http_pool', warm_up_http_pool)])
+    admission.init_app(app)
+    recorder.init_app(app)
     
     # Configure Flask to handle trailing slashes flexibly
     app.url_map.strict_slashes = False
@@ -27,7 +53,7 @@ def create_app(config_name='default'):
             'service': 'ByteRisto API Gateway',
             'version': '1.0.0',
             'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcnow(),
             'endpoints': {
                 'health': '/health',
                 'menu': '/api/menu',
@@ -38,7 +64,7 @@ def create_app(config_name='default'):
     # Health check endpoint
     @app.route('/health')
     def health_check():
-        # Check health of all services
+        # Check readiness of all services
         services_health = {}
         
         try:
@@ -47,27 +73,32 @@ def create_app(config_name='default'):
             
             # Check menu service
             try:
-                response = requests.get(f"{app.config['MENU_SERVICE_URL']}/health", timeout=timeout)
-                services_health['menu-service'] = 'healthy' if response.status_code == 200 else 'unhealthy'
+                response = requests.get(f"{app.config['MENU_SERVICE_URL']}/readyz", timeout=timeout)
+                services_health['menu-service'] = 'healthy' if response.status_code == 200 else 'not_ready'
             except:
                 services_health['menu-service'] = 'unavailable'
             
             # Check order service
             try:
-                response = requests.get(f"{app.config['ORDER_SERVICE_URL']}/health", timeout=timeout)
-                services_health['order-service'] = 'healthy' if response.status_code == 200 else 'unhealthy'
+                response = requests.get(f"{app.config['ORDER_SERVICE_URL']}/readyz", timeout=timeout)
+                services_health['order-service'] = 'healthy' if response.status_code == 200 else 'not_ready'
             except:
                 services_health['order-service'] = 'unavailable'
             
         except Exception as e:
-            print(f"Error checking service health: {str(e)}")
+            logger.exception('Error checking service health')
         
         return jsonify({
             'status': 'healthy',
             'service': 'api-gateway',
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcnow(),
             'uptime': time.process_time(),
-            'services': services_health
+            'services': services_health,
+            'tracing': tracer.exporter.stats,
+            'logging': log_pipeline.stats,
+            'admission': admission.stats,
+            'recording': recorder.stats,
+            'ready': readiness.ready
         })
     
     # Error handlers
@@ -100,8 +131,10 @@ if __name__ == '__main__':
     port = app.config.get('PORT', 3000)
     debug = app.config.get('DEBUG', True)
     
-    print(f"🚀 ByteRisto API Gateway running on port {port}")
-    print(f"❤️ Health check available at http://localhost:{port}/health")
-    print(f"📚 API endpoints available at http://localhost:{port}/api")
+    logger.info('ByteRisto API Gateway starting', extra={
+        'port': port,
+        'health': f'http://localhost:{port}/health',
+        'api': f'http://localhost:{port}/api'
+    })
     
     app.run(host='0.0.0.0', port=port, debug=debug)
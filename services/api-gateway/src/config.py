@@ -19,10 +19,56 @@ class Config:
     
     # Request timeout
     REQUEST_TIMEOUT = 30
+    
+    # Keep-alive connections kept per backend service, per worker process
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))
+    # Format asked of the services (json or msgpack); clients negotiate their own with Accept
+    SERVICE_WIRE_FORMAT = os.environ.get('SERVICE_WIRE_FORMAT', 'json')
+    
+    # Admission control (admission.py): per client and endpoint token buckets,
+    # rates per lane as tokens per second / burst
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMITS = os.environ.get('RATE_LIMITS', 'critical=20/40,high=10/30,normal=10/20,low=2/10')
+    RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'  # Client = X-Forwarded-For
+    # Requests passed on at once per worker; keep it below the worker's own
+    # concurrency (GUNICORN_THREADS, or GUNICORN_WORKER_CONNECTIONS with gevent)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_CONCURRENCY = int(os.environ.get('ADMISSION_CONCURRENCY', 6))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2.0))  # Max wait for a slot
+    
+    # Traffic recording (recorder.py): share of clients whose proxied requests are
+    # appended to RECORD_FILE (JSON lines, gzip members when it ends in .gz)
+    RECORD_FILE = os.environ.get('RECORD_FILE')
+    RECORD_SAMPLE_RATE = float(os.environ.get('RECORD_SAMPLE_RATE', 0.0))
+    RECORD_FLUSH_INTERVAL = float(os.environ.get('RECORD_FLUSH_INTERVAL', 1.0))
+    RECORD_MAX_QUEUE = int(os.environ.get('RECORD_MAX_QUEUE', 10000))  # Exchanges beyond this are dropped
+    
+    # Tracing (shared/tracing.py): share of requests traced where a trace starts,
+    # written as OTLP/JSON lines to TRACE_FILE and/or POSTed to TRACE_ENDPOINT
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.0))
+    TRACE_FILE = os.environ.get('TRACE_FILE')
+    TRACE_ENDPOINT = os.environ.get('TRACE_ENDPOINT')  # e.g. http://otel-collector:4318/v1/traces
+    TRACE_FLUSH_INTERVAL = float(os.environ.get('TRACE_FLUSH_INTERVAL', 1.0))
+    TRACE_MAX_QUEUE = int(os.environ.get('TRACE_MAX_QUEUE', 10000))  # Spans beyond this are dropped
+
+    # Logging (shared/logs.py): JSON lines on stdout, written by a background thread
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json or text
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')  # e.g. debug=0.01,info=0.5
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))  # Records beyond this are dropped
+    LOG_MAX_FIELD_LENGTH = int(os.environ.get('LOG_MAX_FIELD_LENGTH', 512))
+    LOG_MAX_LIST_ITEMS = int(os.environ.get('LOG_MAX_LIST_ITEMS', 20))
+    LOG_REDACT_KEYS = os.environ.get('LOG_REDACT_KEYS', '')  # Added to the built-in list
+
+    # Startup (shared/startup.py): per-process warm-up, /livez and /readyz
+    STARTUP_BLOCKING = os.environ.get('STARTUP_BLOCKING', 'false').lower() == 'true'  # Warm up inside create_app()
+    STARTUP_GATE_TIMEOUT = float(os.environ.get('STARTUP_GATE_TIMEOUT', 10))  # Max wait of a request for startup
+    STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 5))  # Warn above this cold start
 
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -31,6 +77,8 @@ class ProductionConfig(Config):
 class TestConfig(Config):
     """Test configuration."""
     TESTING = True
+    STARTUP_BLOCKING = True
+    RATE_LIMIT_ENABLED = False
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,50 @@
+"""
+Pooled HTTP session for calls from the gateway to the backend services.
+
+Reusing keep-alive connections saves a TCP handshake per proxied request.
+The session (and its connection pool) belongs to one process: it is created
+lazily and dropped after fork, so gunicorn workers forked from a preloaded
+master never share sockets.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session(pool_maxsize=32):
+    """Return this process's session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                # One retry when a pooled connection turns out to be closed by
+                # the backend (e.g. a recycled worker); urllib3 only retries
+                # idempotent methods once the request was sent, never POST
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=pool_maxsize,
+                    max_retries=Retry(total=1, connect=1, read=1, status=0, redirect=0)
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def reset():
+    """Forget the session; the next call opens fresh connections"""
+    global _session, _lock
+    _session = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset)
@@ -0,0 +1,184 @@
+"""
+Traffic recording at the gateway, for replaying real service nights.
+
+proxy_request() hands every proxied exchange to the recorder. For a
+sampled share of clients (RECORD_SAMPLE_RATE, decided per client so that a
+terminal's whole sequence is kept) it appends one JSON line per request to
+RECORD_FILE:
+
+    t      epoch seconds the request reached the gateway
+    c      client, hashed
+    m, p   method and path; q: query string
+    e      gateway endpoint (e.g. gateway.pay_order)
+    h      forwarded headers (Idempotency-Key, ...)
+    b      request body, with sensitive keys redacted (LOG_REDACT_KEYS)
+    s      status from the service
+    ms     milliseconds from reaching the gateway to the service's answer
+    n      response size in bytes
+    shape  response shape: keys and value types, one list item per list
+    ids    'id' values in the response, by key path (e.g. data.items)
+
+Response values other than ids are not kept. A background thread writes the
+lines in batches, one O_APPEND write each, so workers can share the file; a
+name ending in .gz writes each batch as a gzip member. When the queue is
+full, exchanges are dropped. Requests refused by admission control never
+reach a service and are not recorded.
+
+Replay with test/load/replay.py.
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+
+from flask import request
+
+from admission import admission
+from shared.batch_writer import BatchWriter
+from shared.logs import DEFAULT_REDACT_KEYS, Sanitizer
+
+MAX_IDS = 500  # Per key path and exchange
+
+logger = logging.getLogger(__name__)
+
+
+def response_shape(value):
+    """Keys and value types of a JSON document; a list is described by its first item"""
+    if isinstance(value, dict):
+        return {key: response_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [response_shape(value[0])] if value else []
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+    return 'string'
+
+
+def collect_ids(value, path='', found=None):
+    """{'data': ['3f2a...'], 'data.items': ['9c1e...', '0b7d...']}: the 'id' values by the path of their object"""
+    if found is None:
+        found = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == 'id' and isinstance(item, (str, int)) and not isinstance(item, bool):
+                ids = found.setdefault(path, [])
+                if len(ids) < MAX_IDS:
+                    ids.append(item)
+            else:
+                collect_ids(item, f'{path}.{key}' if path else key, found)
+    elif isinstance(value, list):
+        for item in value:
+            collect_ids(item, path, found)
+    return found
+
+
+class TrafficRecorder(BatchWriter):
+    """Samples proxied exchanges and appends them to RECORD_FILE from a background thread"""
+
+    thread_name = 'traffic-recorder'
+
+    def __init__(self):
+        super().__init__()
+        self.file_path = None
+        self.sample_rate = 0.0
+        self.sanitizer = Sanitizer()
+        self.counts = {'recorded': 0, 'dropped': 0}
+        self.last_error = None
+
+    def init_app(self, app):
+        config = app.config
+        self.file_path = config.get('RECORD_FILE') or None
+        self.sample_rate = float(config.get('RECORD_SAMPLE_RATE', 0.0))
+        self.flush_interval = float(config.get('RECORD_FLUSH_INTERVAL', 1.0))
+        self.set_max_queue(int(config.get('RECORD_MAX_QUEUE', 10000)))
+        redact_keys = DEFAULT_REDACT_KEYS + tuple(
+            key.strip() for key in config.get('LOG_REDACT_KEYS', '').split(',') if key.strip()
+        )
+        # Bodies are replayed, so lists are kept whole; only long strings are cut
+        self.sanitizer = Sanitizer(redact_keys, max_length=int(config.get('LOG_MAX_FIELD_LENGTH', 512)),
+                                   max_items=10000)
+        app.extensions['recorder'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.file_path) and self.sample_rate > 0
+
+    @property
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'queued': self.queued,
+            **self.counts,
+            'last_error': self.last_error
+        }
+
+    def sampled(self, client):
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(client.encode('utf-8')) % 10000 < self.sample_rate * 10000
+
+    def record(self, method, data, status_code, response_data, response_size, headers):
+        """Queue the current request's exchange if its client is sampled"""
+        if not self.enabled:
+            return
+        client = admission.client_id()
+        if not self.sampled(client):
+            return
+        now_ns = time.time_ns()
+        started_ns = request.environ.get('byteristo.start_ns', now_ns)
+        entry = {
+            't': round(started_ns / 1e9, 3),
+            'c': format(zlib.crc32(client.encode('utf-8')), '08x'),
+            'm': method,
+            'p': request.path,
+            'q': request.query_string.decode('latin-1'),
+            'e': request.endpoint,
+            'h': headers,
+            'b': self.sanitizer.clean(data) if data is not None else None,
+            's': status_code,
+            'ms': round((now_ns - started_ns) / 1e6, 2),
+            'n': response_size
+        }
+        # Shape and ids are worked out on the writer thread
+        if not self.submit((entry, response_data)):
+            self.counts['dropped'] += 1
+
+    def encode(self, batch):
+        lines = []
+        for entry, response_data in batch:
+            entry['shape'] = response_shape(response_data)
+            entry['ids'] = collect_ids(response_data)
+            lines.append(json.dumps(entry, separators=(',', ':'), default=str))
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        return gzip.compress(payload) if self.file_path.endswith('.gz') else payload
+
+    def write(self, batch):
+        try:
+            payload = self.encode(batch)
+            fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
+            self.counts['recorded'] += len(batch)
+        except Exception as e:
+            self.counts['dropped'] += len(batch)
+            self.last_error = str(e)
+            logger.warning('Traffic recording failed', extra={'exchanges': len(batch), 'error': str(e)})
+
+
+recorder = TrafficRecorder()
+
+atexit.register(recorder.flush)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=recorder._reset_after_fork)
+
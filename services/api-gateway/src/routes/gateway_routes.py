@@ -1,31 +1,65 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
+import logging
 import requests
 from flask import current_app
+from http_pool import get_session
+from recorder import recorder
+from shared.json_provider import MSGPACK_MIMETYPE, loads_body, msgpack, packb
+from shared.tracing import tracer, KIND_CLIENT
 
 gateway_bp = Blueprint('gateway', __name__)
+logger = logging.getLogger(__name__)
+
+# Client headers passed through to the services, and service headers passed back
+# (X-Last-Write: read-your-writes with read replicas, see shared/replicas.py)
+FORWARDED_HEADERS = ['Idempotency-Key', 'X-Last-Write', 'X-Read-Consistency']
+RETURNED_HEADERS = ['X-Last-Write']
+
+
+@gateway_bp.after_request
+def return_service_headers(response):
+    response.headers.update(g.get('returned_headers', {}))
+    return response
 
 def proxy_request(service_url, path, method='GET', data=None, params=None):
     """Proxy request to a microservice"""
     try:
         url = f"{service_url}{path}"
         timeout = current_app.config.get('REQUEST_TIMEOUT', 30)
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        session = get_session(current_app.config.get('HTTP_POOL_MAXSIZE', 32))
         
-        if method == 'GET':
-            response = requests.get(url, params=params, timeout=timeout)
-        elif method == 'POST':
-            response = requests.post(url, json=data, timeout=timeout)
-        elif method == 'PUT':
-            response = requests.put(url, json=data, timeout=timeout)
-        elif method == 'PATCH':
-            response = requests.patch(url, json=data, timeout=timeout)
-        elif method == 'DELETE':
-            response = requests.delete(url, timeout=timeout)
-        else:
+        if method not in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
             return jsonify({'success': False, 'message': 'Method not allowed'}), 405
         
-        return response.json(), response.status_code
+        recorded_headers = dict(headers)
         
-    except requests.RequestException as e:
+        # The format on the gateway-service hop; the client's own is negotiated by jsonify()
+        body = {}
+        if msgpack is not None and current_app.config.get('SERVICE_WIRE_FORMAT') == 'msgpack':
+            headers['Accept'] = MSGPACK_MIMETYPE
+            if data is not None and method in ('POST', 'PUT', 'PATCH'):
+                headers['Content-Type'] = MSGPACK_MIMETYPE
+                body['data'] = packb(data)
+        elif method in ('POST', 'PUT', 'PATCH'):
+            body['json'] = data
+        
+        with tracer.span(f'{method} {path}', KIND_CLIENT, **{'http.method': method, 'http.url': url}) as span:
+            # Request ID and trace context travel to the service
+            headers.update(tracer.outgoing_headers())
+            
+            response = session.request(method, url, params=params if method == 'GET' else None, headers=headers,
+                                       timeout=timeout, **body)
+            
+            if span is not None:
+                span.set_attribute('http.status_code', response.status_code)
+            g.returned_headers = {name: response.headers[name] for name in RETURNED_HEADERS if name in response.headers}
+            response_data = loads_body(current_app, response.content, response.headers.get('Content-Type'))
+            recorder.record(method, data, response.status_code, response_data, len(response.content), recorded_headers)
+            return response_data, response.status_code
+        
+    except (requests.RequestException, ValueError) as e:  # ValueError: the body is not JSON
+        logger.warning('Service unavailable', extra={'url': f"{service_url}{path}", 'method': method, 'error': str(e)})
         return {
             'success': False,
             'message': 'Service unavailable',
@@ -109,6 +143,28 @@ def get_orders():
     )
     return jsonify(response_data), status_code
 
+@gateway_bp.route('/orders/changes', methods=['GET'])
+def get_order_changes():
+    """Get orders changed since a cursor (delta sync)"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/changes',
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/orders/tables', methods=['GET'])
+def get_table_bills():
+    """Get open balances per table"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/tables',
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
+
 @gateway_bp.route('/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
     """Get specific order"""
@@ -163,6 +219,39 @@ def update_order_item_status(order_id, item_id):
     )
     return jsonify(response_data), status_code
 
+@gateway_bp.route('/orders/items/status', methods=['PATCH'])
+def update_order_items_status():
+    """Update many order item statuses at once"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/items/status',
+        method='PATCH',
+        data=request.json
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/orders/pay-batch', methods=['POST'])
+def pay_orders_batch():
+    """Pay several orders (or a whole table) at once"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        '/api/orders/pay-batch',
+        method='POST',
+        data=request.json
+    )
+    return jsonify(response_data), status_code
+
+@gateway_bp.route('/orders/<order_id>/pay', methods=['POST'])
+def pay_order(order_id):
+    """Mark order as paid"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        f'/api/orders/{order_id}/pay',
+        method='POST',
+        data=request.json
+    )
+    return jsonify(response_data), status_code
+
 @gateway_bp.route('/orders/<order_id>/cancel', methods=['POST'])
 def cancel_order(order_id):
     """Cancel order"""
@@ -173,3 +262,15 @@ def cancel_order(order_id):
         data=request.json
     )
     return jsonify(response_data), status_code
+
+# Analytics Routes (served by the order service)
+@gateway_bp.route('/analytics/<path:subpath>', methods=['GET'])
+def get_analytics(subpath):
+    """Get sales analytics"""
+    response_data, status_code = proxy_request(
+        current_app.config['ORDER_SERVICE_URL'],
+        f'/api/analytics/{subpath}',
+        method='GET',
+        params=request.args
+    )
+    return jsonify(response_data), status_code
@@ -0,0 +1,31 @@
+"""
+Fixtures for the gateway tests: a fresh app per test (TestConfig: blocking
+startup, rate limits off unless a test turns them on). Nothing here calls
+the menu and order services.
+
+Run from the service's directory (the services share module names):
+
+    cd services/api-gateway && python -m pytest
+"""
+
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(SERVICE_DIR, 'src'), os.path.dirname(SERVICE_DIR)]  # The service, then shared/
+
+from app import create_app  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,53 @@
+"""Admission control (admission.py): token buckets and where admission sits among the request hooks"""
+
+from types import SimpleNamespace
+
+import admission as admission_module
+from admission import TokenBuckets, admission
+from shared.startup import readiness
+
+
+def test_sweep_keeps_buckets_of_slower_lanes(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(admission_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(admission_module, 'MAX_BUCKETS', 2)
+    buckets = TokenBuckets()
+
+    assert buckets.take('menu-admin', rate=0.5, burst=10) == 0  # Full again in 2 seconds
+    assert buckets.take('kitchen', rate=100, burst=1) == 0  # Full again in 10 ms
+    clock.now += 1
+    # The third bucket triggers a sweep: only the kitchen bucket has refilled
+    assert buckets.take('payments', rate=100, burst=1) == 0
+    assert len(buckets) == 2
+
+    clock.now += 10
+    assert buckets.take('cashier', rate=100, burst=1) == 0
+    assert len(buckets) == 1  # Everything but the new one had refilled
+
+
+def test_bucket_empties_and_refills(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(admission_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    buckets = TokenBuckets()
+
+    assert [buckets.take('terminal', rate=2, burst=2) for _ in range(2)] == [0, 0]
+    assert buckets.take('terminal', rate=2, burst=2) == 0.5
+    clock.now += 0.5
+    assert buckets.take('terminal', rate=2, burst=2) == 0
+
+
+def test_starting_worker_rejects_before_admission(app, client, monkeypatch):
+    admission.rate_limit_enabled = True
+    admission.rate_limits = {'normal': (1.0, 1.0)}
+    app.config['STARTUP_GATE_TIMEOUT'] = 0
+    readiness._ready.clear()
+    monkeypatch.setattr(readiness, 'ensure_running', lambda: None)
+
+    for _ in range(3):
+        response = client.get('/api/menu')
+        assert response.status_code == 503
+        assert response.get_json()['message'] == 'Service is starting'
+
+    # Held by the readiness gate: no slot taken, no token spent
+    assert len(admission.buckets) == 0
+    assert all(counts['admitted'] == 0 and counts['rate_limited'] == 0 for counts in admission.counts.values())
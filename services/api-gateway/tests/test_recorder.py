@@ -0,0 +1,58 @@
+"""Traffic recording (recorder.py): sampled exchanges written with redacted bodies and response shapes only"""
+
+import gzip
+import json
+
+import pytest
+
+from recorder import recorder
+
+
+@pytest.fixture
+def recording(app, tmp_path, monkeypatch):
+    """Record every client to a file; returns a function reading the lines written so far"""
+    def configure(name='traffic.jsonl'):
+        app.config.update(RECORD_FILE=str(tmp_path / name), RECORD_SAMPLE_RATE=1.0)
+        recorder.init_app(app)
+        monkeypatch.setattr(recorder, '_ensure_running', lambda: None)  # Written on flush() only
+
+        def lines():
+            recorder.flush()
+            with open(recorder.file_path, 'rb') as file:
+                data = file.read()
+            if name.endswith('.gz'):
+                data = gzip.decompress(data)
+            return [json.loads(line) for line in data.decode().splitlines()]
+        return lines
+    return configure
+
+
+def pay(app, response_data):
+    with app.test_request_context('/api/orders/o-1/pay', method='POST', environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        recorder.record('POST', {'payment_method': 'card', 'card_number': '4111', 'discard_count': 1},
+                        200, response_data, 321, {'Idempotency-Key': 'k-1'})
+
+
+@pytest.mark.parametrize('name', ['traffic.jsonl', 'traffic.jsonl.gz'])
+def test_exchange_recorded(app, recording, name):
+    lines = recording(name)
+    recorded = recorder.stats['recorded']
+    pay(app, {'success': True, 'data': {'id': 'o-1', 'final_amount': 17.5, 'items': [{'id': 'i-1'}, {'id': 'i-2'}]}})
+
+    [entry] = lines()
+    assert (entry['m'], entry['p'], entry['s'], entry['n']) == ('POST', '/api/orders/o-1/pay', 200, 321)
+    assert entry['h'] == {'Idempotency-Key': 'k-1'}
+    assert entry['b'] == {'payment_method': 'card', 'card_number': '[redacted]', 'discard_count': 1}
+    assert entry['c'] != '10.0.0.7'  # Hashed
+    # Values other than ids are left out
+    assert entry['shape'] == {'success': 'bool', 'data': {'id': 'string', 'final_amount': 'number',
+                                                           'items': [{'id': 'string'}]}}
+    assert entry['ids'] == {'data': ['o-1'], 'data.items': ['i-1', 'i-2']}
+    assert recorder.stats['recorded'] == recorded + 1
+
+
+def test_unsampled_client_not_recorded(app, recording):
+    recording()
+    recorder.sample_rate = 0.0001  # 10.0.0.7 falls outside this share
+    pay(app, {'success': True})
+    assert recorder.queued == 0
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for the menu & inventory service (shared/gunicorn_config.py).
+
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+psycopg2 blocks the gevent loop, so gevent workers are refused; gthread
+it is. The database connection pool is reset in post_fork so no two
+processes ever share a connection. The master does no database I/O; each
+worker checks the schema and warms up in post_worker_init.
+"""
+
+from shared.gunicorn_config import post_worker_init, settings  # noqa: F401
+from shared.gunicorn_config import dispose_database_pool as post_fork  # noqa: F401
+
+globals().update(settings(port=3001, threads=4))
@@ -1,21 +1,54 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from datetime import datetime
+import logging
 import os
 import time
 
 from config import config
-from models import db
+from models import db, MenuItem, SCHEMA_VERSION
+from shared.cache import cache
+from shared.json_provider import WireRequest, json_provider
+from shared.logs import setup_logging, pipeline as log_pipeline
+from shared.query_budget import query_budget
+from shared.replicas import router as replica_router
+from shared.startup import readiness
+from shared.statements import statements
+from shared.tracing import tracer
 from routes.menu_routes import menu_bp
 
+logger = logging.getLogger(__name__)
+
+
+def bootstrap_database():
+    """Add sample data to a freshly created schema that is still empty"""
+    if MenuItem.query.count() == 0:
+        add_sample_data()
+        logger.info('Sample data added')
+
+
+def warm_up_menu():
+    """Run the menu query every new order triggers (GET /api/menu/available)"""
+    MenuItem.query.filter(MenuItem.is_available == True).all()
+
 
 def create_app(config_name='default'):
+    readiness.begin()
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = json_provider(app)
+    app.request_class = WireRequest  # MessagePack request bodies
+    setup_logging(app, 'menu-service')
 
     # Initialize extensions
     db.init_app(app)
+    replica_router.init_app(app)
+    query_budget.init_app(app, db)
+    statements.init_app(app, db)
+    cache.init_app(app)
     CORS(app)
+    tracer.init_app(app, 'menu-service')
+    tracer.instrument_sqlalchemy()
 
     # Register blueprints
     app.register_blueprint(menu_bp, url_prefix='/api/menu')
@@ -26,8 +59,15 @@ def create_app(config_name='default'):
         return jsonify({
             'status': 'healthy',
             'service': 'menu-service',
-            'timestamp': datetime.utcnow().isoformat(),
-            'uptime': time.process_time()
+            'timestamp': datetime.utcnow(),
+            'uptime': time.process_time(),
+            'tracing': tracer.exporter.stats,
+            'logging': log_pipeline.stats,
+            'replicas': replica_router.stats,
+            'cache': cache.stats,
+            'queries': query_budget.stats,
+            'statements': statements.stats,
+            'ready': readiness.ready
         })
 
     # API Overview endpoint
@@ -71,28 +111,16 @@ def create_app(config_name='default'):
             'message': 'Bad request'
         }), 400
 
-    # Initialize database
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ Database tables created successfully")
-
-            # Add some sample data if tables are empty
-            from models import MenuItem
-            if MenuItem.query.count() == 0:
-                add_sample_data()
-                print("✅ Sample data added successfully")
-
-        except Exception as e:
-            print(f"❌ Error creating database tables: {str(e)}")
+    # Schema check and warm-up run per process, off the import path (shared/startup.py)
+    readiness.init_app(app, db, SCHEMA_VERSION, bootstrap=bootstrap_database, warmups=[
+        ('menu', warm_up_menu)
+    ])
 
     return app
 
 
 def add_sample_data():
     """Add some sample menu items for testing"""
-    from models import MenuItem
-
     menu_items = [
         MenuItem(
             name="Pizza Margherita",
@@ -138,8 +166,10 @@ if __name__ == '__main__':
     port = app.config.get('PORT', 3001)
     debug = app.config.get('DEBUG', True)
 
-    print(f"🚀 Menu Service running on port {port}")
-    print(f"❤️ Health check available at http://localhost:{port}/health")
-    print(f"📖 API documentation at http://localhost:{port}/api")
+    logger.info('Menu Service starting', extra={
+        'port': port,
+        'health': f'http://localhost:{port}/health',
+        'docs': f'http://localhost:{port}/api'
+    })
 
     app.run(host='0.0.0.0', port=port, debug=debug)
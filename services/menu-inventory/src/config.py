@@ -16,6 +16,33 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replicas (shared/replicas.py): comma-separated URLs; GET listings read from them
+    SQLALCHEMY_REPLICA_URIS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))  # Replicas further behind are skipped
+    REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 1.0))  # Seconds between lag checks
+    REPLICA_READ_YOUR_WRITES_SECONDS = float(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 10))  # Max primary pinning after a write
+    
+    # Query budgets (shared/query_budget.py): statements per request, per endpoint
+    # in QUERY_BUDGETS (e.g. order.create_order=12), else QUERY_BUDGET_DEFAULT
+    QUERY_BUDGET_DEFAULT = int(os.environ.get('QUERY_BUDGET_DEFAULT', 20))
+    QUERY_BUDGETS = os.environ.get('QUERY_BUDGETS', '')
+    QUERY_TIME_BUDGET_MS = float(os.environ.get('QUERY_TIME_BUDGET_MS', 0))  # Database time per request; 0: no limit
+    QUERY_BUDGET_ACTION = os.environ.get('QUERY_BUDGET_ACTION', 'warn')  # warn or raise
+    QUERY_DEBUG_HEADERS = os.environ.get('QUERY_DEBUG_HEADERS', 'false').lower() == 'true'  # X-DB-* response headers
+    
+    # Hot statements (shared/statements.py) are prepared once per connection on PostgreSQL;
+    # turn off behind a transaction-pooling PgBouncer
+    PREPARED_STATEMENTS = os.environ.get('PREPARED_STATEMENTS', 'true').lower() == 'true'
+    
+    # Cache (shared/cache.py): in-process LRU over a shared Redis tier
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'none')  # redis, memory (one process only: tests, benchmarks) or none
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_PREFIX = os.environ.get('CACHE_PREFIX', 'byteristo')  # Shared by every service using the same Redis
+    CACHE_DEFAULT_TTL = float(os.environ.get('CACHE_DEFAULT_TTL', 60))  # Seconds in the shared tier
+    CACHE_LOCAL_TTL = float(os.environ.get('CACHE_LOCAL_TTL', 5))  # Seconds in the LRU; bounds staleness on lost invalidations
+    CACHE_LOCAL_MAX_ITEMS = int(os.environ.get('CACHE_LOCAL_MAX_ITEMS', 1000))
+    CACHE_LOCK_TIMEOUT = float(os.environ.get('CACHE_LOCK_TIMEOUT', 5))  # Max wait for another process's load
+    
     # Flask settings
     PORT = int(os.environ.get('PORT', 3001))
     DEBUG = os.environ.get('FLASK_ENV') == 'development'
@@ -23,10 +50,35 @@ class Config:
     # JWT
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_ALGORITHM = 'HS256'
+    
+    # Tracing (shared/tracing.py): share of requests traced where a trace starts,
+    # written as OTLP/JSON lines to TRACE_FILE and/or POSTed to TRACE_ENDPOINT
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.0))
+    TRACE_FILE = os.environ.get('TRACE_FILE')
+    TRACE_ENDPOINT = os.environ.get('TRACE_ENDPOINT')  # e.g. http://otel-collector:4318/v1/traces
+    TRACE_FLUSH_INTERVAL = float(os.environ.get('TRACE_FLUSH_INTERVAL', 1.0))
+    TRACE_MAX_QUEUE = int(os.environ.get('TRACE_MAX_QUEUE', 10000))  # Spans beyond this are dropped
+
+    # Logging (shared/logs.py): JSON lines on stdout, written by a background thread
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json or text
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')  # e.g. debug=0.01,info=0.5
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))  # Records beyond this are dropped
+    LOG_MAX_FIELD_LENGTH = int(os.environ.get('LOG_MAX_FIELD_LENGTH', 512))
+    LOG_MAX_LIST_ITEMS = int(os.environ.get('LOG_MAX_LIST_ITEMS', 20))
+    LOG_REDACT_KEYS = os.environ.get('LOG_REDACT_KEYS', '')  # Added to the built-in list
+
+    # Startup (shared/startup.py): per-process schema check and warm-up, /livez and /readyz
+    SCHEMA_AUTO_CREATE = os.environ.get('SCHEMA_AUTO_CREATE', 'true').lower() == 'true'  # Create a missing schema
+    STARTUP_BLOCKING = os.environ.get('STARTUP_BLOCKING', 'false').lower() == 'true'  # Warm up inside create_app()
+    STARTUP_GATE_TIMEOUT = float(os.environ.get('STARTUP_GATE_TIMEOUT', 10))  # Max wait of a request for startup
+    STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 5))  # Warn above this cold start
 
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    QUERY_DEBUG_HEADERS = True
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -35,6 +87,10 @@ class ProductionConfig(Config):
 class TestConfig(Config):
     """Test configuration."""
     TESTING = True
+    STARTUP_BLOCKING = True
+    QUERY_BUDGET_ACTION = 'raise'  # A test going over an endpoint's budget fails
+    QUERY_DEBUG_HEADERS = True
+    CACHE_BACKEND = 'none'  # Benchmarks switch it on with cache.configure()
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
 
 config = {
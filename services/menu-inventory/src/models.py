@@ -1,10 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
+from shared.replicas import RoutingSession
 from datetime import datetime
 import uuid
 import json
 
 
-db = SQLAlchemy()
+# Reads of @replica_read endpoints go to a replica (shared/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Bump together with a migration script that stamps the new version
+# (shared.startup.stamp_schema_version)
+SCHEMA_VERSION = 1
 
 
 class MenuItem(db.Model):
@@ -27,12 +33,12 @@ class MenuItem(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'price': float(self.price) if self.price else 0,
+            'price': self.price or 0,
             'category': self.category,
             'is_available': self.is_available,
             'preparation_time': self.preparation_time,
             'allergens': json.loads(self.allergens) if self.allergens else [],
             'nutritional_info': json.loads(self.nutritional_info) if self.nutritional_info else {},
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
@@ -1,14 +1,19 @@
 from flask import Blueprint, request, jsonify
 from models import db, MenuItem
+from shared.tracing import tracer
+from shared.cache import cache
+from shared.replicas import replica_read, router as replica_router
+from shared.statements import statements
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import inspect, text
 from marshmallow import Schema, fields, ValidationError
+from datetime import datetime
+import logging
 import uuid
 import json
-import psycopg2
-import os
 
 menu_bp = Blueprint('menu', __name__)
+logger = logging.getLogger(__name__)
 
 # Marshmallow schemas for validation
 class MenuItemSchema(Schema):
@@ -24,33 +29,47 @@ class MenuItemSchema(Schema):
 menu_item_schema = MenuItemSchema()
 menu_items_schema = MenuItemSchema(many=True)
 
-def get_db_connection():
-    """Get database connection using app config"""
-    from flask import current_app
-    config = current_app.config
-    
-    # Try to get connection info from Flask config first
-    try:
-        # Use the config values directly (these come from environment variables)
-        return psycopg2.connect(
-            host=config.get('DB_HOST', 'localhost'),
-            port=int(config.get('DB_PORT', '5432')),
-            database=config.get('DB_NAME', 'menu_inventory_db'),
-            user=config.get('DB_USER', 'menu_user'),
-            password=config.get('DB_PASSWORD', 'menu_password')
-        )
-    except Exception as e:
-        # Fallback to direct environment variables
-        print(f"Failed to connect using config, trying env vars: {e}")
-        return psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=int(os.getenv('DB_PORT', '5432')),
-            database=os.getenv('DB_NAME', 'menu_inventory_db'),
-            user=os.getenv('DB_USER', 'menu_user'),
-            password=os.getenv('DB_PASSWORD', 'menu_password')
-        )
+# Typed columns so SQLite rows come back as datetimes/booleans like PostgreSQL ones
+SELECT_MENU_ITEM = statements.register('menu_items.by_id', text("SELECT * FROM menu_items WHERE id = :menu_id").columns(
+    is_available=db.Boolean,
+    created_at=db.DateTime,
+    updated_at=db.DateTime
+))
+MENU_ITEM_EXISTS = statements.register('menu_items.exists', text("SELECT id FROM menu_items WHERE id = :menu_id"))
+DELETE_MENU_ITEM = statements.register('menu_items.delete', text("DELETE FROM menu_items WHERE id = :menu_id"))
+
+def menu_row_to_dict(row):
+    """Same shape as MenuItem.to_dict, built from a raw SQL row"""
+    row_dict = row._mapping
+    return {
+        'id': row_dict['id'],
+        'name': row_dict['name'],
+        'description': row_dict['description'],
+        'price': row_dict['price'] or 0,
+        'category': row_dict['category'],
+        'is_available': row_dict['is_available'],
+        'preparation_time': row_dict['preparation_time'],
+        'allergens': json.loads(row_dict['allergens']) if row_dict['allergens'] else [],
+        'nutritional_info': json.loads(row_dict['nutritional_info']) if row_dict['nutritional_info'] else {},
+        'created_at': row_dict['created_at'],
+        'updated_at': row_dict['updated_at']
+    }
+
+def load_available_menu_items():
+    """Available menu items as returned by GET /available"""
+    return [item.to_dict() for item in MenuItem.query.filter(MenuItem.is_available == True).all()]
+
+def load_menu_item(menu_id):
+    """One menu item as a dict, or None when it does not exist"""
+    result = statements.execute(SELECT_MENU_ITEM, {'menu_id': menu_id}).fetchone()
+    if not result and replica_router.on_replica():
+        # Possibly created after the replica's last replayed commit
+        replica_router.use_primary()
+        result = statements.execute(SELECT_MENU_ITEM, {'menu_id': menu_id}).fetchone()
+    return menu_row_to_dict(result) if result else None
 
 @menu_bp.route('/', methods=['GET'])
+@replica_read
 def get_all_menu_items():
     """Get all menu items with optional filtering"""
     try:
@@ -68,15 +87,18 @@ def get_all_menu_items():
             query = query.filter(MenuItem.is_available == is_available)
         
         # Execute query and order results
-        menu_items = query.order_by(MenuItem.category, MenuItem.name).all()
+        def load():
+            return [item.to_dict() for item in query.order_by(MenuItem.category, MenuItem.name).all()]
+        menu_items = cache.get_or_set('menu', f'list:{category or ""}:{available or ""}', load)
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in menu_items],
+            'data': menu_items,
             'count': len(menu_items)
         })
         
     except Exception as e:
+        logger.exception('Error in get_all_menu_items')
         return jsonify({
             'success': False,
             'message': 'Error fetching menu items',
@@ -84,18 +106,21 @@ def get_all_menu_items():
         }), 500
 
 @menu_bp.route('/available', methods=['GET'])
+@replica_read
 def get_available_menu_items():
     """Get available menu items for ordering"""
     try:
-        menu_items = MenuItem.query.filter(MenuItem.is_available == True).all()
+        # Same entry the order service reads when it validates a new order
+        menu_items = cache.get_or_set('menu', 'available', load_available_menu_items)
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in menu_items],
+            'data': menu_items,
             'count': len(menu_items)
         })
         
     except Exception as e:
+        logger.exception('Error in get_available_menu_items')
         return jsonify({
             'success': False,
             'message': 'Error fetching available menu items',
@@ -103,6 +128,7 @@ def get_available_menu_items():
         }), 500
 
 @menu_bp.route('/<string:menu_id>', methods=['GET'])
+@replica_read
 def get_menu_item_by_id(menu_id):
     """Get menu item by ID"""
     try:
@@ -115,40 +141,21 @@ def get_menu_item_by_id(menu_id):
                 'message': 'Invalid menu item ID format'
             }), 400
         
-        # Check if the item exists using text() for explicit SQL
-        result = db.session.execute(
-            text("SELECT * FROM menu_items WHERE id = :menu_id"),
-            {'menu_id': menu_id}
-        ).fetchone()
+        menu_item_dict = cache.get_or_set('menu', f'item:{menu_id}', lambda: load_menu_item(menu_id))
         
-        if not result:
+        if not menu_item_dict:
             return jsonify({
                 'success': False,
                 'message': 'Menu item not found'
             }), 404
         
-        # Convert result to dict format
-        row_dict = dict(result._mapping)
-        menu_item_dict = {
-            'id': row_dict['id'],
-            'name': row_dict['name'],
-            'description': row_dict['description'],
-            'price': float(row_dict['price']) if row_dict['price'] else 0,
-            'category': row_dict['category'],
-            'is_available': row_dict['is_available'],
-            'preparation_time': row_dict['preparation_time'],
-            'allergens': json.loads(row_dict['allergens']) if row_dict['allergens'] else [],
-            'nutritional_info': json.loads(row_dict['nutritional_info']) if row_dict['nutritional_info'] else {},
-            'created_at': row_dict['created_at'].isoformat() if row_dict['created_at'] else None,
-            'updated_at': row_dict['updated_at'].isoformat() if row_dict['updated_at'] else None
-        }
-        
         return jsonify({
             'success': True,
             'data': menu_item_dict
         })
         
     except Exception as e:
+        logger.exception('Error in get_menu_item_by_id')
         return jsonify({
             'success': False,
             'message': 'Error fetching menu item',
@@ -161,7 +168,8 @@ def create_menu_item():
     try:
         # Validate request data
         try:
-            data = menu_item_schema.load(request.json)
+            with tracer.span('validate'):
+                data = menu_item_schema.load(request.json)
         except ValidationError as err:
             return jsonify({
                 'success': False,
@@ -183,6 +191,7 @@ def create_menu_item():
         
         db.session.add(menu_item)
         db.session.commit()
+        cache.invalidate_namespace('menu')
         
         return jsonify({
             'success': True,
@@ -198,6 +207,7 @@ def create_menu_item():
             'error': str(e.orig)
         }), 400
     except Exception as e:
+        logger.exception('Error in create_menu_item')
         db.session.rollback()
         return jsonify({
             'success': False,
@@ -226,93 +236,60 @@ def update_menu_item(menu_id):
                 'message': 'No data provided'
             }), 400
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Check if item exists
+        if not statements.execute(MENU_ITEM_EXISTS, {'menu_id': menu_id}).fetchone():
+            return jsonify({
+                'success': False,
+                'message': 'Menu item not found'
+            }), 404
+        
+        # Build update query dynamically
+        update_fields = []
+        update_values = {'menu_id': menu_id}
         
-        try:
-            # Check if item exists
-            cursor.execute("SELECT id FROM menu_items WHERE id = %s", (menu_id,))
-            if not cursor.fetchone():
-                return jsonify({
-                    'success': False,
-                    'message': 'Menu item not found'
-                }), 404
-            
-            # Build update query dynamically
-            update_fields = []
-            update_values = []
-            
-            if 'is_available' in data:
-                update_fields.append("is_available = %s")
-                update_values.append(bool(data['is_available']))
-            if 'name' in data:
-                update_fields.append("name = %s")
-                update_values.append(data['name'])
-            if 'description' in data:
-                update_fields.append("description = %s")
-                update_values.append(data['description'])
-            if 'price' in data:
-                update_fields.append("price = %s")
-                update_values.append(float(data['price']))
-            if 'category' in data:
-                update_fields.append("category = %s")
-                update_values.append(data['category'])
-            if 'preparation_time' in data:
-                update_fields.append("preparation_time = %s")
-                update_values.append(int(data['preparation_time']))
-            if 'allergens' in data:
-                update_fields.append("allergens = %s")
-                update_values.append(json.dumps(data['allergens']) if data['allergens'] is not None else None)
-            if 'nutritional_info' in data:
-                update_fields.append("nutritional_info = %s")
-                update_values.append(json.dumps(data['nutritional_info']) if data['nutritional_info'] is not None else None)
-            
-            if update_fields:
-                update_fields.append("updated_at = CURRENT_TIMESTAMP")
-                update_query = f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = %s"
-                update_values.append(menu_id)
-                
-                cursor.execute(update_query, update_values)
-                conn.commit()
-            
-            # Get updated item
-            cursor.execute("SELECT * FROM menu_items WHERE id = %s", (menu_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [desc[0] for desc in cursor.description]
-                row_dict = dict(zip(columns, result))
-                
-                updated_item = {
-                    'id': row_dict['id'],
-                    'name': row_dict['name'],
-                    'description': row_dict['description'],
-                    'price': float(row_dict['price']) if row_dict['price'] else 0,
-                    'category': row_dict['category'],
-                    'is_available': row_dict['is_available'],
-                    'preparation_time': row_dict['preparation_time'],
-                    'allergens': json.loads(row_dict['allergens']) if row_dict['allergens'] else [],
-                    'nutritional_info': json.loads(row_dict['nutritional_info']) if row_dict['nutritional_info'] else {},
-                    'created_at': row_dict['created_at'].isoformat() if row_dict['created_at'] else None,
-                    'updated_at': row_dict['updated_at'].isoformat() if row_dict['updated_at'] else None
-                }
-                
-                return jsonify({
-                    'success': True,
-                    'message': 'Menu item updated successfully',
-                    'data': updated_item
-                })
-            
-        finally:
-            cursor.close()
-            conn.close()
+        if 'is_available' in data:
+            update_fields.append("is_available = :is_available")
+            update_values['is_available'] = bool(data['is_available'])
+        if 'name' in data:
+            update_fields.append("name = :name")
+            update_values['name'] = data['name']
+        if 'description' in data:
+            update_fields.append("description = :description")
+            update_values['description'] = data['description']
+        if 'price' in data:
+            update_fields.append("price = :price")
+            update_values['price'] = float(data['price'])
+        if 'category' in data:
+            update_fields.append("category = :category")
+            update_values['category'] = data['category']
+        if 'preparation_time' in data:
+            update_fields.append("preparation_time = :preparation_time")
+            update_values['preparation_time'] = int(data['preparation_time'])
+        if 'allergens' in data:
+            update_fields.append("allergens = :allergens")
+            update_values['allergens'] = json.dumps(data['allergens']) if data['allergens'] is not None else None
+        if 'nutritional_info' in data:
+            update_fields.append("nutritional_info = :nutritional_info")
+            update_values['nutritional_info'] = json.dumps(data['nutritional_info']) if data['nutritional_info'] is not None else None
+        
+        if update_fields:
+            update_fields.append("updated_at = :updated_at")
+            update_values['updated_at'] = datetime.utcnow()
+            update_query = f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = :menu_id"
             
-    except Exception as e:
+            db.session.execute(text(update_query), update_values)
+            db.session.commit()
+            cache.invalidate_namespace('menu')
+        
+        # Get updated item
+        result = statements.execute(SELECT_MENU_ITEM, {'menu_id': menu_id}).fetchone()
+        updated_item = menu_row_to_dict(result)
+        
         return jsonify({
-            'success': False,
-            'message': 'Error updating menu item',
-            'error': str(e)
-        }), 500
+            'success': True,
+            'message': 'Menu item updated successfully',
+            'data': updated_item
+        })
         
     except IntegrityError as e:
         db.session.rollback()
@@ -322,6 +299,7 @@ def update_menu_item(menu_id):
             'error': str(e.orig)
         }), 400
     except Exception as e:
+        logger.exception('Error in update_menu_item')
         db.session.rollback()
         return jsonify({
             'success': False,
@@ -342,34 +320,28 @@ def delete_menu_item(menu_id):
                 'message': 'Invalid menu item ID format'
             }), 400
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Check if item exists
+        result = statements.execute(MENU_ITEM_EXISTS, {'menu_id': menu_id}).fetchone()
         
-        try:
-            # Check if item exists
-            cursor.execute("SELECT id FROM menu_items WHERE id = %s", (menu_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return jsonify({
-                    'success': False,
-                    'message': 'Menu item not found'
-                }), 404
-
-            # Delete using explicit SQL
-            cursor.execute("DELETE FROM menu_items WHERE id = %s", (menu_id,))
-            conn.commit()
-            
+        if not result:
             return jsonify({
-                'success': True,
-                'message': 'Menu item deleted successfully'
-            })
-            
-        finally:
-            cursor.close()
-            conn.close()
+                'success': False,
+                'message': 'Menu item not found'
+            }), 404
+        
+        # Delete using explicit SQL
+        statements.execute(DELETE_MENU_ITEM, {'menu_id': menu_id})
+        db.session.commit()
+        cache.invalidate_namespace('menu')
+        
+        return jsonify({
+            'success': True,
+            'message': 'Menu item deleted successfully'
+        })
         
     except Exception as e:
+        logger.exception('Error in delete_menu_item')
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': 'Error deleting menu item',
@@ -0,0 +1,42 @@
+"""
+Move settled orders to the archive tables in one go
+
+The service archives payed and cancelled orders on its own (ARCHIVE_ENABLED),
+a batch at a time. Run this after deploying the archive tables to move the
+existing history right away. The age cannot be shorter than
+ARCHIVE_AFTER_HOURS: reads only look in the archive past that horizon, so
+lower the setting (for the service too) to keep fewer orders hot.
+
+Usage:
+    FLASK_ENV=production python archive_orders.py [older_than_hours]
+"""
+
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from app import create_app  # noqa: E402
+from archive import archive_orders  # noqa: E402
+from models import italy_now  # noqa: E402
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Order Archival")
+    print("=" * 60)
+    
+    app = create_app(os.environ.get('FLASK_ENV', 'default'))
+    hours = int(sys.argv[1]) if len(sys.argv) > 1 else app.config.get('ARCHIVE_AFTER_HOURS', 48)
+    
+    try:
+        with app.app_context():
+            started = time.time()
+            cutoff = italy_now() - timedelta(hours=hours)
+            moved = archive_orders(cutoff, app.config.get('ARCHIVE_BATCH_SIZE', 500))
+            print(f"\n✓ Archived {moved} orders settled before {cutoff.isoformat()} in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"\n✗ Archival failed: {e}")
+        exit(1)
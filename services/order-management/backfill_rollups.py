@@ -0,0 +1,36 @@
+"""
+Rebuild the sales rollup tables from the full orders history
+
+Run this once after deploying the rollup tables, or whenever the rollups
+need to be recomputed (e.g. after fixing historical orders by hand). The
+service keeps the rollups up to date on its own afterwards.
+
+Usage:
+    FLASK_ENV=production python backfill_rollups.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from app import create_app  # noqa: E402
+from rollups import backfill  # noqa: E402
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Sales Rollups Backfill")
+    print("=" * 60)
+    
+    app = create_app(os.environ.get('FLASK_ENV', 'default'))
+    
+    try:
+        with app.app_context():
+            started = time.time()
+            counted = backfill()
+            print(f"\n✓ Rollups rebuilt from {counted} orders in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"\n✗ Backfill failed: {e}")
+        exit(1)
@@ -0,0 +1,123 @@
+"""
+Migration script to add delta sync support to the orders database
+
+This script adds the change_seq column to orders, creates the order_tombstones
+and change_counters tables, and backfills existing orders with distinct
+sequence values so that the first GET /api/orders/changes call returns them.
+
+Usage:
+    python migrate_add_change_seq.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5433'),
+    'database': os.getenv('DB_NAME', 'byteristo_orders'),
+    'user': os.getenv('DB_USER', 'byteristo'),
+    'password': os.getenv('DB_PASSWORD', 'byteristo123')
+}
+
+
+def migrate():
+    """Add change_seq, tombstones and the change counter"""
+    conn = None
+    cursor = None
+    
+    try:
+        # Connect to the database
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        print("Checking if change_seq column already exists...")
+        
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1
+                FROM information_schema.columns
+                WHERE table_name = 'orders' AND column_name = 'change_seq'
+            );
+        """)
+        
+        exists = cursor.fetchone()[0]
+        
+        if exists:
+            print("✓ change_seq already exists in the database. No migration needed.")
+            return
+        
+        print("Adding change_seq column to orders...")
+        cursor.execute("""
+            ALTER TABLE orders ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0;
+            CREATE INDEX ix_orders_change_seq ON orders (change_seq);
+        """)
+        
+        print("Creating order_tombstones and change_counters tables...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS order_tombstones (
+                order_id VARCHAR(36) PRIMARY KEY,
+                order_number VARCHAR(50),
+                change_seq BIGINT NOT NULL,
+                deleted_at TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS ix_order_tombstones_change_seq ON order_tombstones (change_seq);
+            CREATE TABLE IF NOT EXISTS change_counters (
+                name VARCHAR(50) PRIMARY KEY,
+                value BIGINT NOT NULL DEFAULT 0
+            );
+        """)
+        
+        print("Backfilling change_seq for existing orders...")
+        cursor.execute("""
+            UPDATE orders SET change_seq = numbered.seq
+            FROM (
+                SELECT id, row_number() OVER (ORDER BY updated_at, id) AS seq
+                FROM orders
+            ) AS numbered
+            WHERE orders.id = numbered.id;
+        """)
+        cursor.execute("""
+            INSERT INTO change_counters (name, value)
+            SELECT 'orders', COALESCE(MAX(change_seq), 0) FROM orders
+            ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value;
+        """)
+        
+        conn.commit()
+        print("✓ Migration completed successfully!")
+        print("  - Added change_seq column to orders")
+        print("  - Created order_tombstones and change_counters tables")
+        
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Order Delta Sync Migration: Adding change_seq")
+    print("=" * 60)
+    
+    try:
+        migrate()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
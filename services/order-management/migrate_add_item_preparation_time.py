@@ -0,0 +1,67 @@
+"""
+Migration script to add preparation_time to order_items
+
+The kitchen ETA scheduler needs each item's preparation time. New orders
+store it (copied from the menu service) in order_items.preparation_time;
+existing rows keep NULL and fall back to KITCHEN_DEFAULT_PREP_TIME.
+
+Usage:
+    python migrate_add_item_preparation_time.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5433'),
+    'database': os.getenv('DB_NAME', 'byteristo_orders'),
+    'user': os.getenv('DB_USER', 'byteristo'),
+    'password': os.getenv('DB_PASSWORD', 'byteristo123')
+}
+
+
+def migrate():
+    """Add preparation_time column to order_items"""
+    conn = None
+    cursor = None
+    
+    try:
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        
+        print("Adding preparation_time column to order_items...")
+        cursor.execute("""
+            ALTER TABLE order_items ADD COLUMN IF NOT EXISTS preparation_time INTEGER;
+        """)
+        
+        conn.commit()
+        print("✓ Migration completed successfully!")
+        
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Order Items Migration: Adding preparation_time")
+    print("=" * 60)
+    
+    try:
+        migrate()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
@@ -0,0 +1,144 @@
+"""
+Migration script to make the change cursor unique (schema version 2)
+
+Batch payments and kitchen bumps used to stamp one change_seq on several
+orders. This script gives the extra copies fresh values from the change
+counter, replaces the change_seq indexes of orders and order_tombstones with
+unique ones and creates the change_leases table used to reserve values on
+PostgreSQL (see src/changes.py). Writers are blocked while it runs.
+
+Usage:
+    python migrate_unique_change_seq.py
+"""
+
+import psycopg2
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5433'),
+    'database': os.getenv('DB_NAME', 'byteristo_orders'),
+    'user': os.getenv('DB_USER', 'byteristo'),
+    'password': os.getenv('DB_PASSWORD', 'byteristo123')
+}
+
+SCHEMA_VERSION = 2
+
+# Tables stamped by the change cursor and their primary keys
+CURSOR_TABLES = (('orders', 'id'), ('order_tombstones', 'order_id'))
+
+
+def migrate():
+    """Renumber shared change_seq values, add the unique indexes and change_leases"""
+    conn = None
+    cursor = None
+
+    try:
+        # Connect to the database
+        print(f"Connecting to database {DB_CONFIG['database']}...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        print("Checking the schema version...")
+
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL;")
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+            if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                print(f"✓ Schema version {SCHEMA_VERSION} already applied. No migration needed.")
+                return
+
+        # Running writers take the counter first: keep them out until commit
+        print("Locking the change counter...")
+        cursor.execute("LOCK TABLE change_counters IN EXCLUSIVE MODE;")
+
+        for table, key in CURSOR_TABLES:
+            print(f"Renumbering shared change_seq values in {table}...")
+            cursor.execute(f"""
+                UPDATE {table} SET change_seq = counter.value + duplicates.n
+                FROM (
+                    SELECT {key}, row_number() OVER (ORDER BY change_seq, {key}) AS n
+                    FROM (
+                        SELECT {key}, change_seq,
+                               row_number() OVER (PARTITION BY change_seq ORDER BY {key}) AS copy
+                        FROM {table}
+                    ) AS numbered
+                    WHERE copy > 1
+                ) AS duplicates, change_counters AS counter
+                WHERE {table}.{key} = duplicates.{key} AND counter.name = 'orders';
+            """)
+            renumbered = cursor.rowcount
+            cursor.execute("UPDATE change_counters SET value = value + %s WHERE name = 'orders';", (renumbered,))
+            print(f"  {renumbered} rows renumbered")
+
+            print(f"Making the change_seq index of {table} unique...")
+            cursor.execute(f"""
+                DROP INDEX IF EXISTS ix_{table}_change_seq;
+                CREATE UNIQUE INDEX ix_{table}_change_seq ON {table} (change_seq);
+            """)
+
+        # Every write stamps change_seq explicitly now
+        cursor.execute("ALTER TABLE orders ALTER COLUMN change_seq DROP DEFAULT;")
+
+        print("Creating the change_leases table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS change_leases (
+                first_seq BIGINT PRIMARY KEY,
+                last_seq BIGINT NOT NULL,
+                expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+            );
+        """)
+
+        # A database from before versioning gets its baseline stamped by the
+        # service on startup (shared/startup.py)
+        print(f"Stamping schema version {SCHEMA_VERSION}...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR(200),
+                applied_at TIMESTAMP NOT NULL
+            );
+        """)
+        cursor.execute("""
+            INSERT INTO schema_version (version, description, applied_at)
+            VALUES (%s, 'unique change_seq, change_leases', now() AT TIME ZONE 'UTC');
+        """, (SCHEMA_VERSION,))
+
+        conn.commit()
+        print("✓ Migration completed successfully!")
+        print("  - Renumbered orders and tombstones sharing a change_seq")
+        print("  - Made ix_orders_change_seq and ix_order_tombstones_change_seq unique")
+        print("  - Created the change_leases table")
+
+    except psycopg2.Error as e:
+        print(f"✗ Database error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        if conn:
+            conn.rollback()
+        raise
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("Database connection closed.")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Order Delta Sync Migration: Unique change_seq")
+    print("=" * 60)
+
+    try:
+        migrate()
+        print("\n✓ Migration process completed!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        exit(1)
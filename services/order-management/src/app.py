@@ -1,23 +1,58 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from datetime import datetime
+import logging
 import os
 import time
 
 from config import config
-from models import db
+from models import db, SCHEMA_VERSION
+from shared.cache import cache
+from shared.json_provider import WireRequest, json_provider
+from shared.logs import setup_logging, pipeline as log_pipeline
+from shared.query_budget import query_budget
+from shared.replicas import router as replica_router
+from shared.startup import readiness
+from shared.statements import statements
+from shared.tracing import tracer
+from changes import ensure_change_counter
+from outbox import dispatcher
+from archive import archiver
+from kitchen import scheduler as kitchen_scheduler
 from routes.order_routes import order_bp
+from routes.analytics_routes import analytics_bp
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_imports():
+    """Modules kept out of the import path (see fetch_available_menu_items)"""
+    import requests  # noqa: F401
+
 
 def create_app(config_name='default'):
+    readiness.begin()
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = json_provider(app)
+    app.request_class = WireRequest  # MessagePack request bodies
+    setup_logging(app, 'order-service')
     
     # Initialize extensions
     db.init_app(app)
+    replica_router.init_app(app)
+    query_budget.init_app(app, db)
+    statements.init_app(app, db)
+    cache.init_app(app)
     CORS(app)
+    tracer.init_app(app, 'order-service')
+    tracer.instrument_sqlalchemy()
+    dispatcher.init_app(app)
+    archiver.init_app(app)
     
     # Register blueprints
     app.register_blueprint(order_bp, url_prefix='/api/orders')
+    app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     
     # Health check endpoint
     @app.route('/health')
@@ -25,8 +60,17 @@ def create_app(config_name='default'):
         return jsonify({
             'status': 'healthy',
             'service': 'order-management-service',
-            'timestamp': datetime.utcnow().isoformat(),
-            'uptime': time.process_time()
+            'timestamp': datetime.utcnow(),
+            'uptime': time.process_time(),
+            'outbox': dispatcher.stats,
+            'archive': archiver.stats,
+            'tracing': tracer.exporter.stats,
+            'logging': log_pipeline.stats,
+            'replicas': replica_router.stats,
+            'cache': cache.stats,
+            'queries': query_budget.stats,
+            'statements': statements.stats,
+            'ready': readiness.ready
         })
     
     # API Overview endpoint
@@ -37,12 +81,24 @@ def create_app(config_name='default'):
             'version': '2.0.0',
             'endpoints': {
                 'orders': {
-                    'GET /api/orders/': 'Get all orders (filter by status, table_number, order_type)',
-                    'POST /api/orders/': 'Create new order',
+                    'GET /api/orders/': 'Get all orders (filter by status, table_number, order_type, date_from, date_to; older dates include archived orders)',
+                    'GET /api/orders/changes?since={cursor}': 'Get orders changed after cursor, with tombstones and next_cursor',
+                    'GET /api/orders/tables': 'Open balance, order counts and item summary per table (status=open|payable, table_number)',
+                    'POST /api/orders/': 'Create new order (honors Idempotency-Key header)',
                     'GET /api/orders/{id}': 'Get order by ID',
                     'PUT /api/orders/{id}/status': 'Update order status',
+                    'POST /api/orders/{id}/pay': 'Mark order as paid (honors Idempotency-Key header)',
+                    'POST /api/orders/pay-batch': 'Pay several orders at once ({order_ids} or {table_number}; honors Idempotency-Key header)',
                     'PUT /api/orders/{id}/items/{item_id}/status': 'Update order item status',
+                    'PATCH /api/orders/items/status': 'Update many item statuses at once ({items: [{order_id, item_id, status}]})',
                     'DELETE /api/orders/{id}': 'Delete order (pending/cancelled only)'
+                },
+                'analytics': {
+                    'GET /api/analytics/revenue/hourly': 'Revenue per hour (date_from, date_to)',
+                    'GET /api/analytics/revenue/items': 'Revenue per menu item (date_from, date_to)',
+                    'GET /api/analytics/revenue/tables': 'Revenue per table (date_from, date_to)',
+                    'GET /api/analytics/revenue/order-types': 'Revenue per order type per day (date_from, date_to)',
+                    'GET /api/analytics/summary': 'Totals and average ticket (date_from, date_to)'
                 }
             }
         })
@@ -70,13 +126,11 @@ def create_app(config_name='default'):
             'message': 'Bad request'
         }), 400
     
-    # Initialize database
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ Database tables created successfully")
-        except Exception as e:
-            print(f"❌ Error creating database tables: {str(e)}")
+    # Schema check and warm-up run per process, off the import path (shared/startup.py)
+    readiness.init_app(app, db, SCHEMA_VERSION, bootstrap=ensure_change_counter, warmups=[
+        ('imports', warm_up_imports),
+        ('kitchen', kitchen_scheduler.sync)
+    ])
     
     return app
 
@@ -86,8 +140,10 @@ if __name__ == '__main__':
     port = app.config.get('PORT', 3002)
     debug = app.config.get('DEBUG', True)
     
-    print(f"🚀 Order Management Service running on port {port}")
-    print(f"❤️ Health check available at http://localhost:{port}/health")
-    print(f"📖 API documentation at http://localhost:{port}/api")
+    logger.info('Order Management Service starting', extra={
+        'port': port,
+        'health': f'http://localhost:{port}/health',
+        'docs': f'http://localhost:{port}/api'
+    })
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
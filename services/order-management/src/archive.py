@@ -0,0 +1,194 @@
+"""
+Hot/cold storage for orders.
+
+The hot `orders` / `order_items` tables only need today's open orders and
+the recently settled ones. A background archiver moves payed and cancelled
+orders whose last change is older than ARCHIVE_AFTER_HOURS into
+`orders_archive` / `order_items_archive`, in batches, with set-based
+INSERT ... SELECT and DELETE statements.
+
+Every archived order leaves a tombstone in the change feed (with its own
+change sequence value), so delta sync clients drop it just like GET
+/api/orders stops listing it. Read endpoints reach into the archive only
+when a date filter goes back past the archive horizon (see
+archive_needed()) or when an order id is not found in the hot table.
+"""
+
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, literal, select
+
+from changes import next_change_seq
+from models import db, italy_now, Order, OrderItem, OrderTombstone, ArchivedOrder, ArchivedOrderItem
+
+ARCHIVABLE_STATUSES = ('payed', 'cancelled')
+
+_orders = Order.__table__
+_items = OrderItem.__table__
+_ORDER_COLUMNS = [column.name for column in _orders.columns]
+_ITEM_COLUMNS = [column.name for column in _items.columns]
+
+logger = logging.getLogger(__name__)
+
+
+def archive_cutoff(config=None):
+    """Orders last changed before this moment may already be archived"""
+    config = config or current_app.config
+    return italy_now() - timedelta(hours=config.get('ARCHIVE_AFTER_HOURS', 48))
+
+
+def archive_needed(date_from=None, date_to=None, statuses=None):
+    """Whether a read filtered this way may match archived orders"""
+    if statuses is not None and not set(statuses) & set(ARCHIVABLE_STATUSES):
+        return False
+    if date_from is None and date_to is None:
+        return False  # Unfiltered reads only list the hot set
+    if date_from is None:
+        return True
+    # An order is archived at least ARCHIVE_AFTER_HOURS after it was created
+    return date_from < archive_cutoff()
+
+
+def archive_batch(cutoff, batch_size=500):
+    """Move one batch of settled orders older than `cutoff` to the archive; returns how many moved"""
+    candidates = (select(_orders.c.id)
+                  .where(_orders.c.status.in_(ARCHIVABLE_STATUSES), _orders.c.updated_at < cutoff)
+                  .order_by(_orders.c.updated_at)
+                  .limit(batch_size))
+
+    # Cheap check first, so an idle run does not touch the change counter
+    if db.session.execute(candidates.limit(1)).first() is None:
+        db.session.rollback()
+        return 0
+
+    # Counter first (see changes.py), then lock the batch; rows another
+    # archiver holds are skipped
+    change_seq = next_change_seq(batch_size)
+    ids = db.session.execute(candidates.with_for_update(skip_locked=True)).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return 0
+
+    now = italy_now()
+    db.session.execute(insert(ArchivedOrder.__table__).from_select(
+        _ORDER_COLUMNS + ['archived_at'],
+        select(*[_orders.c[name] for name in _ORDER_COLUMNS], literal(now, db.DateTime))
+        .where(_orders.c.id.in_(ids))
+    ))
+    db.session.execute(insert(ArchivedOrderItem.__table__).from_select(
+        _ITEM_COLUMNS,
+        select(*[_items.c[name] for name in _ITEM_COLUMNS]).where(_items.c.order_id.in_(ids))
+    ))
+
+    numbers = dict(db.session.execute(
+        select(_orders.c.id, _orders.c.order_number).where(_orders.c.id.in_(ids))
+    ).all())
+    first_seq = change_seq - batch_size + 1
+    db.session.execute(insert(OrderTombstone.__table__), [
+        {'order_id': order_id, 'order_number': numbers.get(order_id),
+         'change_seq': first_seq + position, 'deleted_at': now}
+        for position, order_id in enumerate(ids)
+    ])
+
+    db.session.execute(delete(_items).where(_items.c.order_id.in_(ids)))
+    db.session.execute(delete(_orders).where(_orders.c.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+
+def archive_orders(cutoff, batch_size=500):
+    """Archive every settled order older than `cutoff`; returns how many moved"""
+    if cutoff > archive_cutoff():
+        # Reads assume nothing younger is archived (archive_needed)
+        raise ValueError(
+            f"Cannot archive orders settled less than ARCHIVE_AFTER_HOURS "
+            f"({current_app.config.get('ARCHIVE_AFTER_HOURS', 48)} h) ago; lower that setting instead"
+        )
+    moved = 0
+    while True:
+        batch = archive_batch(cutoff, batch_size)
+        moved += batch
+        if batch < batch_size:
+            return moved
+
+
+def find_order(order_id):
+    """Look an order up in the hot table, then in the archive"""
+    return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
+
+
+class OrderArchiver:
+    """Background thread that periodically archives settled orders"""
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self.stats = {'archived': 0, 'last_run': None, 'last_error': None}
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['order_archiver'] = self
+
+        if app.config.get('ARCHIVE_ENABLED', True):
+            # Started on the first request so that forked workers get their own thread
+            app.before_request(self.ensure_running)
+
+    def ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='order-archiver', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _reset_after_fork(self):
+        # Threads do not survive fork(); the child starts its own on first request
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def _run(self):
+        interval = self.app.config.get('ARCHIVE_INTERVAL', 300)
+        while not self._stopping:
+            self.run_once()
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def run_once(self):
+        """Archive everything that is due; returns how many orders moved"""
+        config = self.app.config
+        with self.app.app_context():
+            try:
+                moved = archive_orders(archive_cutoff(config), config.get('ARCHIVE_BATCH_SIZE', 500))
+                self.stats['archived'] += moved
+                self.stats['last_run'] = italy_now()
+                if moved:
+                    logger.info('Orders archived', extra={'count': moved})
+                return moved
+            except Exception as e:
+                db.session.rollback()
+                self.stats['last_error'] = str(e)
+                logger.exception('Archiver error')
+                return 0
+            finally:
+                db.session.remove()
+
+
+archiver = OrderArchiver()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=archiver._reset_after_fork)
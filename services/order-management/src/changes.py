@@ -0,0 +1,168 @@
+"""
+Change cursor for incremental order sync.
+
+Every write to an order (or to one of its items) stamps the order row with a
+fresh value taken from a single counter row, and deleting an order leaves a
+tombstone stamped the same way. No two rows share a value (unique indexes),
+so clients can page on it: they ask for everything above the last cursor
+they saw.
+
+Timestamps cannot serve as the cursor (ties, clock skew, and the raw-SQL
+paths write CURRENT_TIMESTAMP in UTC while the ORM writes Italian local
+time). A sequence has its own trap: values are handed out in one order but
+their transactions commit in another, and a reader that has moved past a
+value must never see it commit later. Readers are therefore bounded by the
+watermark, current_change_seq(), below which every value has either
+committed or been abandoned:
+
+    PostgreSQL   values are reserved in a short transaction of their own
+                 that also records a lease (change_leases); the write
+                 transaction deletes its lease when it commits, and the
+                 watermark stops below the oldest lease still open. The
+                 counter row is locked only for the reservation, so writers
+                 do not queue behind each other's transactions.
+    other        (SQLite, one writer at a time) the counter is bumped inside
+                 the write transaction and stays locked until it commits;
+                 the watermark is the counter itself.
+
+A lease whose transaction died without releasing it (a killed worker)
+expires after CHANGE_LEASE_SECONDS; writes must commit well within that.
+"""
+
+import logging
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import db, ChangeCounter
+from shared.statements import statements
+
+logger = logging.getLogger(__name__)
+
+ORDERS_CURSOR = 'orders'
+
+# Run by every write to an order (in-transaction counter)
+_NEXT_CHANGE_SEQ = statements.register('change_counters.next', text(
+    "UPDATE change_counters SET value = value + :count WHERE name = :name RETURNING value"
+))
+
+# Reservation transaction (PostgreSQL): bump the counter, record the lease
+# and drop leases that expired, in one round trip
+_RESERVE_CHANGE_SEQ = text("""
+    WITH expired AS (
+        DELETE FROM change_leases WHERE expires_at < clock_timestamp()
+    ), counter AS (
+        UPDATE change_counters SET value = value + :count WHERE name = :name RETURNING value
+    )
+    INSERT INTO change_leases (first_seq, last_seq, expires_at)
+    SELECT value - :count + 1, value, clock_timestamp() + make_interval(secs => :lease_seconds)
+    FROM counter
+    RETURNING last_seq
+""")
+
+# Run by the write transaction itself, so the lease ends when its rows commit
+_RELEASE_CHANGE_LEASE = statements.register('change_leases.release', text(
+    "DELETE FROM change_leases WHERE first_seq = :first_seq"
+))
+
+_WATERMARK = statements.register('change_counters.watermark', text("""
+    SELECT COALESCE(
+        (SELECT MIN(first_seq) - 1 FROM change_leases WHERE expires_at >= clock_timestamp()),
+        (SELECT value FROM change_counters WHERE name = :name),
+        0
+    )
+"""))
+
+
+def ensure_change_counter():
+    """Create the counter row if it does not exist yet"""
+    if db.session.get(ChangeCounter, ORDERS_CURSOR) is None:
+        db.session.add(ChangeCounter(name=ORDERS_CURSOR, value=0))
+        db.session.commit()
+
+
+def _leased():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def next_change_seq(count=1):
+    """
+    Reserve the next change sequence value for the current transaction.
+
+    Call this before touching any order row: without leases the counter row
+    stays locked until commit, and taking it first in every write path
+    means writers always lock in the same order and cannot deadlock each
+    other.
+
+    With count > 1 a range of values is reserved and the last one is
+    returned; the range starts at the returned value - count + 1.
+    """
+    db.session.info['orders_changed'] = True
+    if _leased():
+        return _reserve_leased(count)
+
+    row = statements.execute(_NEXT_CHANGE_SEQ, {'name': ORDERS_CURSOR, 'count': count}).fetchone()
+    if row is None:
+        # Counter missing (fresh database created outside create_app)
+        db.session.add(ChangeCounter(name=ORDERS_CURSOR, value=count))
+        db.session.flush()
+        return count
+
+    return row.value
+
+
+def _reserve_leased(count):
+    params = {
+        'name': ORDERS_CURSOR,
+        'count': count,
+        'lease_seconds': current_app.config.get('CHANGE_LEASE_SECONDS', 60)
+    }
+    with db.engine.begin() as connection:
+        # Safe to commit asynchronously: a write using the values commits
+        # later and its WAL flush covers the reservation too
+        connection.execute(text('SET LOCAL synchronous_commit TO OFF'))
+        last_seq = connection.execute(_RESERVE_CHANGE_SEQ, params).scalar()
+        if last_seq is None:
+            # Counter missing (fresh database created outside create_app)
+            connection.execute(text(
+                "INSERT INTO change_counters (name, value) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING"
+            ), params)
+            last_seq = connection.execute(_RESERVE_CHANGE_SEQ, params).scalar()
+
+    first_seq = last_seq - count + 1
+    db.session.info.setdefault('change_leases', []).append(first_seq)
+    statements.execute(_RELEASE_CHANGE_LEASE, {'first_seq': first_seq})
+    return last_seq
+
+
+def current_change_seq():
+    """Return the watermark: every change up to it has committed (or never will)"""
+    if _leased():
+        return statements.execute(_WATERMARK, {'name': ORDERS_CURSOR}).scalar()
+    counter = db.session.get(ChangeCounter, ORDERS_CURSOR)
+    return counter.value if counter else 0
+
+
+@event.listens_for(Session, 'after_commit')
+def _leases_committed(session):
+    # Released by the DELETEs that just committed
+    session.info.pop('change_leases', None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _release_abandoned_leases(session, transaction):
+    # Rolled back (or closed without commit): release now rather than hold
+    # the watermark back until the leases expire
+    if transaction.parent is not None:
+        return
+    leases = session.info.pop('change_leases', None)
+    if not leases:
+        return
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(text('DELETE FROM change_leases WHERE first_seq = ANY(:leases)'),
+                               {'leases': leases})
+    except Exception as e:
+        logger.warning('Could not release change leases; they expire on their own',
+                       extra={'leases': leases, 'error': str(e)})
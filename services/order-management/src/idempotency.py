@@ -0,0 +1,237 @@
+"""
+Idempotency-Key support for unsafe endpoints.
+
+A terminal that retries a request (gateway timeout, Wi-Fi drop) sends the
+same Idempotency-Key header again. The first request claims the key by
+inserting a row in idempotency_keys and committing it; the handler then
+runs, and its response is stored on the row. A retry is answered from the
+stored response without running the handler again. A retry that arrives
+while the first attempt is still running waits for it (polling the row)
+instead of racing it.
+
+Key states:
+    in_progress  claimed, handler running (taken over if older than the lease)
+    committed    the handler's transaction committed, response not stored yet
+                 (taken over if older than the lease)
+    completed    response stored, retries are replayed
+
+The 'committed' mark is written inside the handler's own transaction, so a
+claim left behind by a worker that died before committing is taken over
+with nothing to undo. One that died after committing but before storing
+the response has no response to replay; once IDEMPOTENCY_LEASE_SECONDS have
+passed since the commit it is taken over too, rather than answering 409
+until the key expires. The handler then runs again and meets the state its
+first run committed (a payment is refused as already payed; an order is
+created a second time), which that narrow window has to accept.
+Responses of 5xx errors are not stored; the key is released so the client
+can retry. Rows expire after IDEMPOTENCY_TTL_HOURS and are evicted in bulk.
+"""
+
+import hashlib
+import itertools
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, italy_now, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Expired keys are evicted once every this many claims
+EVICT_EVERY = 200
+
+_claims = itertools.count(1)
+_table = IdempotencyKey.__table__
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+@event.listens_for(Session, 'before_commit')
+def _mark_committed(session):
+    # Runs inside the handler's transaction: the claim and the changes it
+    # guards become durable together
+    key_hash = session.info.pop('idempotency_key', None)
+    if key_hash:
+        session.execute(
+            update(_table).where(_table.c.key_hash == key_hash).values(status='committed', created_at=italy_now())
+        )
+
+
+def _replay(row):
+    response = Response(row.response_body, status=row.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _conflict(message, status_code):
+    response = jsonify({'success': False, 'message': message})
+    response.status_code = status_code
+    if status_code == 409:
+        response.headers['Retry-After'] = '1'
+    return response
+
+
+def _try_insert(key_hash, scope, fingerprint, now):
+    try:
+        db.session.add(IdempotencyKey(
+            key_hash=key_hash,
+            scope=scope,
+            fingerprint=fingerprint,
+            status='in_progress',
+            created_at=now,
+            expires_at=now + timedelta(hours=current_app.config.get('IDEMPOTENCY_TTL_HOURS', 24))
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _claim(key_hash, scope, fingerprint):
+    """Claim the key; returns None when the caller should run the handler, else the response to send"""
+    config = current_app.config
+    lease = timedelta(seconds=config.get('IDEMPOTENCY_LEASE_SECONDS', 30))
+    deadline = time.monotonic() + config.get('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    delay = 0.05
+
+    if next(_claims) % EVICT_EVERY == 0:
+        evict_expired()
+
+    while True:
+        now = italy_now()
+        if _try_insert(key_hash, scope, fingerprint, now):
+            return None
+
+        row = db.session.execute(select(_table).where(_table.c.key_hash == key_hash)).fetchone()
+        db.session.rollback()  # End the read so the next poll sees fresh commits
+
+        if row is None:
+            continue  # Released in the meantime: claim it
+
+        if row.expires_at < now:
+            db.session.execute(delete(_table).where(
+                _table.c.key_hash == key_hash, _table.c.expires_at == row.expires_at
+            ))
+            db.session.commit()
+            continue
+
+        if row.fingerprint != fingerprint:
+            return _conflict(f'{HEADER} was already used for a different request', 422)
+
+        if row.status == 'completed':
+            return _replay(row)
+
+        if row.created_at < now - lease:
+            # The first attempt died before committing or before storing its
+            # response (the lease then counts from the commit): take over
+            if row.status == 'committed':
+                logger.warning('Idempotency key committed without a response, running the handler again',
+                               extra={'scope': scope})
+            taken = db.session.execute(
+                update(_table)
+                .where(_table.c.key_hash == key_hash,
+                       _table.c.status == row.status,
+                       _table.c.created_at == row.created_at)
+                .values(status='in_progress', created_at=now)
+            ).rowcount
+            db.session.commit()
+            if taken:
+                return None
+            continue
+
+        if time.monotonic() >= deadline:
+            return _conflict(f'A request with this {HEADER} is still being processed', 409)
+
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _complete(key_hash, response):
+    db.session.info.pop('idempotency_key', None)
+    db.session.rollback()  # Discard whatever the handler left uncommitted
+
+    if response.status_code >= 500:
+        # Nothing was committed: release the key so a retry runs again
+        released = db.session.execute(delete(_table).where(
+            _table.c.key_hash == key_hash, _table.c.status == 'in_progress'
+        )).rowcount
+        if released:
+            db.session.commit()
+            return
+
+    db.session.execute(
+        update(_table)
+        .where(_table.c.key_hash == key_hash)
+        .values(status='completed', status_code=response.status_code,
+                response_body=response.get_data(as_text=True))
+    )
+    db.session.commit()
+
+
+def _release(key_hash):
+    db.session.info.pop('idempotency_key', None)
+    db.session.rollback()
+    db.session.execute(delete(_table).where(
+        _table.c.key_hash == key_hash, _table.c.status == 'in_progress'
+    ))
+    db.session.commit()
+
+
+def evict_expired():
+    """Delete expired keys; returns how many were removed"""
+    try:
+        removed = db.session.execute(delete(_table).where(_table.c.expires_at < italy_now())).rowcount
+        db.session.commit()
+        return removed
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error evicting idempotency keys')
+        return 0
+
+
+def idempotent(scope):
+    """Honor the Idempotency-Key header on a view; `scope` keeps keys of different endpoints apart"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+
+            if len(key) > MAX_KEY_LENGTH:
+                return _conflict(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters', 400)
+
+            key_hash = _hash(scope, key)
+            fingerprint = _hash(request.method, request.path, request.get_data())
+
+            replay = _claim(key_hash, scope, fingerprint)
+            if replay is not None:
+                return replay
+
+            db.session.info['idempotency_key'] = key_hash
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                _release(key_hash)
+                raise
+
+            _complete(key_hash, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,264 @@
+"""
+Load-aware kitchen ETA scheduler.
+
+Every item of an active order (pending, confirmed or preparing) is a job
+whose duration is the item's preparation time from the menu. Jobs sit in a
+priority queue ordered by when they were ordered; the kitchen has
+KITCHEN_STATIONS parallel stations. An order's ETA is the time its last job
+finishes when jobs are handed, in order, to whichever station frees up
+first.
+
+Adding or completing a job is a heap push or a lazy delete, O(log n). The
+schedule keeps the stations' free times in a heap: a job appended behind
+every queued one (a new order, normally) is handed straight to the station
+that frees up first, O(log stations), and only its order's ETA changes.
+Removing jobs, or adding one ahead of queued ones, invalidates the
+schedule; it is rebuilt the next time someone asks for an ETA: the live
+jobs are sorted, O(n log n), and handed out the same way.
+
+The state is per worker process. It is loaded from the database on first
+use and then kept current through the order change cursor (see changes.py),
+so an item bumped in another worker is picked up on the next read here. A
+write in this worker feeds the rows it wrote straight into the queue
+(eta_after_write), so the ETA in a write response costs no query.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from changes import current_change_seq
+from models import db, italy_now, Order, OrderItem, OrderTombstone
+
+ACTIVE_ORDER_STATUSES = ('pending', 'confirmed', 'preparing')
+ACTIVE_ITEM_STATUSES = ('pending', 'preparing')
+
+
+class KitchenScheduler:
+    """Priority queue of active kitchen jobs with cached per-order ETAs"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._queue = []            # heap of (ordered_at, token, item_id)
+        self._jobs = {}             # item_id -> (order_id, ordered_at, minutes, token)
+        self._order_items = {}      # order_id -> set of item_ids
+        self._counter = itertools.count()
+        self._etas = {}
+        self._station_free = []     # heap of free times, one per station
+        self._tail = None           # ordered_at of the last job scheduled
+        self._dirty = True
+        self._seen_seq = None
+        self._stale = True
+        self._last_sync = 0.0
+
+    # -- configuration -----------------------------------------------------
+
+    @staticmethod
+    def _config(key, default):
+        return current_app.config.get(key, default)
+
+    def default_prep_time(self):
+        return self._config('KITCHEN_DEFAULT_PREP_TIME', 15)
+
+    # -- queue maintenance, O(log n) ---------------------------------------
+
+    def _add_job(self, order_id, item_id, ordered_at, minutes):
+        token = next(self._counter)
+        minutes = minutes or self.default_prep_time()
+        self._jobs[item_id] = (order_id, ordered_at, minutes, token)
+        self._order_items.setdefault(order_id, set()).add(item_id)
+        heapq.heappush(self._queue, (ordered_at, token, item_id))
+        # Tokens only grow, so a job ordered no earlier than the tail sorts last
+        if self._dirty or (self._tail is not None and ordered_at < self._tail):
+            self._dirty = True
+        else:
+            self._schedule(order_id, ordered_at, minutes)
+
+    def _is_live(self, entry):
+        # A re-added job gets a new token: its old heap entry is dead too
+        job = self._jobs.get(entry[2])
+        return job is not None and job[3] == entry[1]
+
+    def _remove_order(self, order_id):
+        # Heap entries are dropped lazily when they surface
+        item_ids = self._order_items.pop(order_id, ())
+        for item_id in item_ids:
+            self._jobs.pop(item_id, None)
+        self._etas.pop(order_id, None)
+        if item_ids:
+            self._dirty = True
+
+    def _compact(self):
+        # Rebuild the heap when lazily deleted entries dominate it
+        if len(self._queue) > 2 * len(self._jobs) + 64:
+            self._queue = [entry for entry in self._queue if self._is_live(entry)]
+            heapq.heapify(self._queue)
+
+    # -- synchronisation with the database ---------------------------------
+
+    def mark_stale(self):
+        self._stale = True
+
+    def sync(self):
+        """Catch up with order changes committed since the last sync"""
+        interval = self._config('KITCHEN_SYNC_INTERVAL', 1.0)
+        if not self._stale and time.monotonic() - self._last_sync < interval:
+            return
+
+        with self._lock:
+            latest = current_change_seq()
+            if self._seen_seq is None:
+                self._load_active(latest)
+            elif latest > self._seen_seq:
+                self._apply_changes(self._seen_seq, latest)
+            self._seen_seq = latest
+            self._stale = False
+            self._last_sync = time.monotonic()
+
+    def _load_active(self, latest):
+        orders = db.session.execute(
+            select(Order.id, Order.created_at)
+            .where(Order.status.in_(ACTIVE_ORDER_STATUSES), Order.change_seq <= latest)
+        ).all()
+        self._load_items({order.id: order.created_at for order in orders})
+
+    def _apply_changes(self, since, latest):
+        changed = db.session.execute(
+            select(Order.id, Order.status, Order.created_at)
+            .where(Order.change_seq > since, Order.change_seq <= latest)
+        ).all()
+        deleted = db.session.execute(
+            select(OrderTombstone.order_id)
+            .where(OrderTombstone.change_seq > since, OrderTombstone.change_seq <= latest)
+        ).scalars().all()
+
+        for order_id in deleted:
+            self._remove_order(order_id)
+        for order in changed:
+            self._remove_order(order.id)
+
+        self._load_items({
+            order.id: order.created_at for order in changed if order.status in ACTIVE_ORDER_STATUSES
+        })
+        self._compact()
+
+    def _load_items(self, ordered_at):
+        if not ordered_at:
+            return
+        items = db.session.execute(
+            select(OrderItem.id, OrderItem.order_id, OrderItem.preparation_time)
+            .where(OrderItem.order_id.in_(list(ordered_at)), OrderItem.status.in_(ACTIVE_ITEM_STATUSES))
+        ).all()
+        for item in items:
+            self._add_job(item.order_id, item.id, ordered_at[item.order_id], item.preparation_time)
+
+    # -- estimates ----------------------------------------------------------
+
+    def _schedule(self, order_id, ordered_at, minutes):
+        """Hand one job, queued behind every scheduled one, to the first free station"""
+        if not self._station_free:
+            self._station_free = [ordered_at] * self._config('KITCHEN_STATIONS', 4)
+        start = max(heapq.heappop(self._station_free), ordered_at)
+        finish = start + timedelta(minutes=minutes)
+        heapq.heappush(self._station_free, finish)
+        if order_id not in self._etas or finish > self._etas[order_id]:
+            self._etas[order_id] = finish
+        self._tail = ordered_at
+
+    def _recompute(self):
+        """List-schedule every queued job onto the stations, in queue order"""
+        self._etas = {}
+        self._station_free = []
+        self._tail = None
+        for ordered_at, _, item_id in sorted(entry for entry in self._queue if self._is_live(entry)):
+            order_id, _, minutes, _ = self._jobs[item_id]
+            self._schedule(order_id, ordered_at, minutes)
+        self._dirty = False
+
+    def eta_for(self, order_id):
+        """Live ETA of an active order, or None if the kitchen is done with it"""
+        self.sync()
+        with self._lock:
+            if self._dirty:
+                self._recompute()
+            eta = self._etas.get(order_id)
+        return self._not_overdue(eta)
+
+    def eta_after_write(self, order, minutes=None):
+        """
+        ETA of an order (dict with items) this worker has just written,
+        applied to the queue from the written rows instead of a resync.
+        `minutes` maps newly created item ids to their preparation time;
+        items already queued keep theirs.
+        """
+        if self._seen_seq is None:
+            return self.eta_for(order['id'])  # First use in this worker: load everything
+
+        active = []
+        if order['status'] in ACTIVE_ORDER_STATUSES:
+            active = [item['id'] for item in order['items'] if item['status'] in ACTIVE_ITEM_STATUSES]
+        with self._lock:
+            queued = self._order_items.get(order['id'], set())
+            known = {item_id: self._jobs[item_id][2] for item_id in queued}
+            known.update(minutes or {})
+            if all(item_id in known for item_id in active):
+                if set(active) != queued:
+                    # A new order is appended to the schedule; anything else rebuilds it
+                    self._remove_order(order['id'])
+                    for item_id in active:
+                        self._add_job(order['id'], item_id, order['created_at'], known[item_id])
+                    self._compact()
+                if self._dirty:
+                    self._recompute()
+                return self._not_overdue(self._etas.get(order['id']))
+
+        # An active item this worker never saw (e.g. its order came from another worker)
+        return self.eta_for(order['id'])
+
+    @staticmethod
+    def _not_overdue(eta):
+        if eta is None:
+            return None
+        # Overdue jobs are expected any moment now
+        return max(eta, italy_now())
+
+    def estimate_completion(self, items):
+        """ETA for a new order made of `items` (dicts with preparation_time), queued behind the current load"""
+        self.sync()
+        now = italy_now()
+        with self._lock:
+            if self._dirty:
+                self._recompute()
+            free = list(self._station_free) or [now] * self._config('KITCHEN_STATIONS', 4)
+
+        finish = now
+        for item in items:
+            start = max(heapq.heappop(free), now)
+            end = start + timedelta(minutes=item.get('preparation_time') or self.default_prep_time())
+            heapq.heappush(free, end)
+            finish = max(finish, end)
+        return finish
+
+
+scheduler = KitchenScheduler()
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_kitchen_stale(session):
+    # Writes from this worker are visible on the very next read
+    if session.info.pop('orders_changed', False):
+        scheduler.mark_stale()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=scheduler.reset)
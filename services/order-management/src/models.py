@@ -1,10 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import UUID
+from shared.replicas import RoutingSession
 import uuid
+import json
 from datetime import datetime
 import pytz
 
-db = SQLAlchemy()
+# Reads of @replica_read endpoints go to a replica (shared/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Bump together with a migration script that stamps the new version
+# (shared.startup.stamp_schema_version)
+SCHEMA_VERSION = 2
 
 # Timezone italiana
 ITALY_TZ = pytz.timezone('Europe/Rome')
@@ -31,27 +37,28 @@ class Order(db.Model):
     estimated_completion_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=italy_now)
     updated_at = db.Column(db.DateTime, default=italy_now, onupdate=italy_now)
+    change_seq = db.Column(db.BigInteger, nullable=False, unique=True, index=True)  # Delta sync cursor
     
     # Relationship with order items
     items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
-            'id': str(self.id),
+            'id': self.id,
             'order_number': self.order_number,
             'table_number': self.table_number,
             'customer_name': self.customer_name,
             'status': self.status,
             'order_type': self.order_type,
-            'total_amount': float(self.total_amount),
-            'tax_amount': float(self.tax_amount),
-            'discount_amount': float(self.discount_amount),
-            'final_amount': float(self.final_amount),
+            'total_amount': self.total_amount,
+            'tax_amount': self.tax_amount,
+            'discount_amount': self.discount_amount,
+            'final_amount': self.final_amount,
             'special_instructions': self.special_instructions,
-            'estimated_completion_time': self.estimated_completion_time.isoformat() if self.estimated_completion_time else None,
+            'estimated_completion_time': self.estimated_completion_time,
             'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class OrderItem(db.Model):
@@ -64,6 +71,7 @@ class OrderItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=1)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
+    preparation_time = db.Column(db.Integer)  # Minutes, cached from menu service for ETAs
     special_instructions = db.Column(db.Text)
     status = db.Column(db.Enum('pending', 'preparing', 'ready', 'served', 'cancelled', name='order_item_status'), 
                       default='pending', nullable=False)
@@ -72,14 +80,223 @@ class OrderItem(db.Model):
 
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'menu_item_id': str(self.menu_item_id),
+            'id': self.id,
+            'menu_item_id': self.menu_item_id,
             'menu_item_name': self.menu_item_name,
             'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
-            'total_price': float(self.total_price),
+            'unit_price': self.unit_price,
+            'total_price': self.total_price,
             'special_instructions': self.special_instructions,
             'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+def typed(statement, model):
+    """Give a raw text() statement returning `model` rows the model's column types"""
+    # Without them SQLite hands back timestamps as strings and amounts as floats or ints
+    return statement.columns(**{column.name: column.type for column in model.__table__.columns})
+
+
+def order_item_row_to_dict(row):
+    """Same shape as OrderItem.to_dict, built from a raw SQL row (see typed())"""
+    item = row._mapping
+    return {
+        'id': item['id'],
+        'menu_item_id': item['menu_item_id'],
+        'menu_item_name': item['menu_item_name'],
+        'quantity': item['quantity'],
+        'unit_price': item['unit_price'],
+        'total_price': item['total_price'],
+        'special_instructions': item['special_instructions'],
+        'status': item['status'],
+        'created_at': item['created_at'],
+        'updated_at': item['updated_at']
+    }
+
+
+def order_row_to_dict(row, item_rows):
+    """Same shape as Order.to_dict, built from raw SQL rows (see typed())"""
+    order = row._mapping
+    return {
+        'id': order['id'],
+        'order_number': order['order_number'],
+        'table_number': order['table_number'],
+        'customer_name': order['customer_name'],
+        'status': order['status'],
+        'order_type': order['order_type'],
+        'total_amount': order['total_amount'],
+        'tax_amount': order['tax_amount'],
+        'discount_amount': order['discount_amount'],
+        'final_amount': order['final_amount'],
+        'special_instructions': order['special_instructions'],
+        'estimated_completion_time': order['estimated_completion_time'],
+        'items': [order_item_row_to_dict(item) for item in item_rows],
+        'created_at': order['created_at'],
+        'updated_at': order['updated_at']
+    }
+
+
+class OrderTombstone(db.Model):
+    """Marker left behind by a deleted order so delta sync clients can drop it"""
+    __tablename__ = 'order_tombstones'
+
+    order_id = db.Column(db.String(36), primary_key=True)
+    order_number = db.Column(db.String(50))
+    change_seq = db.Column(db.BigInteger, nullable=False, unique=True, index=True)
+    deleted_at = db.Column(db.DateTime, default=italy_now)
+
+    def to_dict(self):
+        return {
+            'id': self.order_id,
+            'order_number': self.order_number,
+            'deleted_at': self.deleted_at
+        }
+
+
+class ChangeCounter(db.Model):
+    """Single-row monotonic counters (one row per named cursor)"""
+    __tablename__ = 'change_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class ChangeLease(db.Model):
+    """Change sequence values reserved by a write that has not committed yet (PostgreSQL, see changes.py)"""
+    __tablename__ = 'change_leases'
+
+    first_seq = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    last_seq = db.Column(db.BigInteger, nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
+class OrderNumberSequence(db.Model):
+    """Per-day order number sequence; workers reserve numbers from it in blocks"""
+    __tablename__ = 'order_number_sequences'
+
+    day = db.Column(db.String(8), primary_key=True)  # YYYYMMDD
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OutboxEvent(db.Model):
+    """Order event written in the same transaction as the change it describes"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.String(36), nullable=False)  # Order ID
+    payload = db.Column(db.Text, nullable=False)  # Stored as JSON string
+    created_at = db.Column(db.DateTime, default=italy_now)
+    dispatched_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+
+    # Partial index: the dispatcher only ever scans undelivered events
+    __table_args__ = (
+        db.Index('ix_outbox_events_pending', 'id',
+                 postgresql_where=db.text('dispatched_at IS NULL'),
+                 sqlite_where=db.text('dispatched_at IS NULL')),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'order_id': self.aggregate_id,
+            'payload': json.loads(self.payload),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class SalesHourlyItem(db.Model):
+    """Rollup: quantity and revenue per menu item per hour (by payment time)"""
+    __tablename__ = 'sales_hourly_items'
+
+    hour = db.Column(db.DateTime, primary_key=True)
+    menu_item_id = db.Column(db.String(36), primary_key=True)
+    menu_item_name = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class SalesDailyOrderType(db.Model):
+    """Rollup: paid and cancelled orders per order type per day"""
+    __tablename__ = 'sales_daily_order_types'
+
+    day = db.Column(db.Date, primary_key=True)
+    order_type = db.Column(db.String(20), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SalesDailyTable(db.Model):
+    """Rollup: paid orders per table per day (table 0 = no table)"""
+    __tablename__ = 'sales_daily_tables'
+
+    day = db.Column(db.Date, primary_key=True)
+    table_number = db.Column(db.Integer, primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a request sent with an Idempotency-Key header"""
+    __tablename__ = 'idempotency_keys'
+
+    key_hash = db.Column(db.String(64), primary_key=True)  # sha256(scope + key)
+    scope = db.Column(db.String(50), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of the request
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, committed, completed
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=italy_now)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class ArchivedOrder(db.Model):
+    """Paid or cancelled order moved out of the hot orders table (see archive.py)"""
+    __tablename__ = 'orders_archive'
+
+    id = db.Column(db.String(36), primary_key=True)
+    order_number = db.Column(db.String(50), unique=True, nullable=False)
+    table_number = db.Column(db.Integer)
+    customer_name = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False)
+    order_type = db.Column(db.String(20), nullable=False)
+    total_amount = db.Column(db.Numeric(10, 2), default=0)
+    tax_amount = db.Column(db.Numeric(10, 2), default=0)
+    discount_amount = db.Column(db.Numeric(10, 2), default=0)
+    final_amount = db.Column(db.Numeric(10, 2), default=0)
+    special_instructions = db.Column(db.Text)
+    estimated_completion_time = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    change_seq = db.Column(db.BigInteger, default=0, nullable=False)
+    archived_at = db.Column(db.DateTime, default=italy_now)
+
+    items = db.relationship('ArchivedOrderItem', backref='order', cascade='all, delete-orphan')
+
+    to_dict = Order.to_dict
+
+
+class ArchivedOrderItem(db.Model):
+    """Item of an archived order"""
+    __tablename__ = 'order_items_archive'
+
+    id = db.Column(db.String(36), primary_key=True)
+    order_id = db.Column(db.String(36), db.ForeignKey('orders_archive.id'), nullable=False, index=True)
+    menu_item_id = db.Column(db.String(36), nullable=False)
+    menu_item_name = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    total_price = db.Column(db.Numeric(10, 2), nullable=False)
+    preparation_time = db.Column(db.Integer)
+    special_instructions = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    to_dict = OrderItem.to_dict
@@ -0,0 +1,291 @@
+"""
+Transactional outbox for order events.
+
+Request handlers call record_event() inside the transaction that changes the
+order, so an event exists if and only if the change committed. A background
+dispatcher thread picks up undelivered events in batches, hands them to the
+configured sink and marks them dispatched. Delivery is at-least-once: an
+event is only marked after the sink accepted it, so a crash in between
+re-delivers it (consumers can de-duplicate on the event id).
+
+Since every change to an order records an event, the events also tell
+which cached orders (shared/cache.py, namespace 'orders') to drop once the
+transaction has committed.
+
+Sinks (OUTBOX_SINK):
+    log       log one line per batch (default, no broker needed)
+    rabbitmq  publish to a topic exchange, routing key = event type
+    memory    keep events in process memory (tests)
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import timedelta
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models import db, italy_now, OutboxEvent
+from shared.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(event_type, order_id, payload):
+    """Add an event to the current transaction; it is dispatched after commit"""
+    record_events([(event_type, order_id, payload)])
+
+
+def record_events(events):
+    """Add several (event_type, order_id, payload) events to the current transaction"""
+    db.session.add_all([
+        OutboxEvent(event_type=event_type, aggregate_id=order_id, payload=json.dumps(payload, default=str))
+        for event_type, order_id, payload in events
+    ])
+    db.session.info['outbox_pending'] = True
+    db.session.info.setdefault('changed_orders', set()).update(order_id for _, order_id, _ in events)
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher(session):
+    # Deliver right after commit instead of waiting for the next poll
+    if session.info.pop('outbox_pending', False):
+        dispatcher.wake()
+    changed_orders = session.info.pop('changed_orders', None)
+    if changed_orders:
+        cache.invalidate('orders', *changed_orders)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_pending(session):
+    session.info.pop('outbox_pending', None)
+    session.info.pop('changed_orders', None)
+
+
+class LogSink:
+    """Logs a summary of every batch"""
+
+    def publish(self, events):
+        logger.info('Outbox events dispatched', extra={
+            'count': len(events),
+            'events': [f"{e['event_type']}#{e['id']}" for e in events]
+        })
+
+    def close(self):
+        pass
+
+
+class MemorySink:
+    """Keeps the last delivered events in memory"""
+
+    def __init__(self, maxlen=10000):
+        self.events = deque(maxlen=maxlen)
+
+    def publish(self, events):
+        self.events.extend(events)
+
+    def close(self):
+        pass
+
+
+class RabbitMQSink:
+    """Publishes events to a durable topic exchange with publisher confirms"""
+
+    def __init__(self, url, exchange):
+        self.url = url
+        self.exchange = exchange
+        self._connection = None
+        self._channel = None
+
+    def _get_channel(self):
+        if self._channel is None or self._channel.is_closed:
+            import pika
+            self._connection = pika.BlockingConnection(pika.URLParameters(self.url))
+            self._channel = self._connection.channel()
+            self._channel.exchange_declare(exchange=self.exchange, exchange_type='topic', durable=True)
+            self._channel.confirm_delivery()
+        return self._channel
+
+    def publish(self, events):
+        import pika
+        try:
+            channel = self._get_channel()
+            for e in events:
+                channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key=e['event_type'],
+                    body=json.dumps(e),
+                    properties=pika.BasicProperties(
+                        content_type='application/json',
+                        delivery_mode=2,  # Persistent
+                        message_id=str(e['id'])
+                    ),
+                    mandatory=False
+                )
+        except Exception:
+            # Drop the connection so the next batch reconnects
+            self.close()
+            raise
+
+    def close(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+
+def create_sink(config):
+    sink_name = config.get('OUTBOX_SINK', 'log')
+    if sink_name == 'rabbitmq':
+        return RabbitMQSink(config['RABBITMQ_URL'], config.get('RABBITMQ_EXCHANGE', 'byteristo.orders'))
+    if sink_name == 'memory':
+        return MemorySink()
+    return LogSink()
+
+
+class OutboxDispatcher:
+    """Background thread that moves committed events from the outbox to the sink"""
+
+    # Dispatched events older than the retention are purged every N polls
+    PURGE_EVERY = 300
+
+    def __init__(self):
+        self.app = None
+        self.sink = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._polls = 0
+        self.stats = {'dispatched': 0, 'failed_batches': 0, 'last_error': None}
+
+    def init_app(self, app):
+        self.app = app
+        self.sink = create_sink(app.config)
+        app.extensions['outbox_dispatcher'] = self
+
+        if app.config.get('OUTBOX_DISPATCHER_ENABLED', True):
+            # Started on the first request so that forked workers get their own thread
+            app.before_request(self.ensure_running)
+
+    def ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.sink is not None:
+            self.sink.close()
+
+    def _reset_after_fork(self):
+        # Threads do not survive fork(); the child starts its own on first request
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def _run(self):
+        interval = self.app.config.get('OUTBOX_POLL_INTERVAL', 1.0)
+        backoff = interval
+        while not self._stopping:
+            try:
+                delivered = self.dispatch_once()
+                backoff = interval
+            except Exception as e:
+                delivered = 0
+                backoff = min(backoff * 2, 30)
+                logger.exception('Outbox dispatcher error', extra={'retry_in': backoff})
+
+            self._polls += 1
+            if self._polls % self.PURGE_EVERY == 0:
+                self._purge()
+
+            # A full batch means there is more waiting: go again immediately
+            if delivered < self.app.config.get('OUTBOX_BATCH_SIZE', 100):
+                self._wakeup.wait(backoff)
+                self._wakeup.clear()
+
+    def dispatch_once(self):
+        """Deliver one batch of pending events; returns how many were delivered"""
+        batch_size = self.app.config.get('OUTBOX_BATCH_SIZE', 100)
+        with self.app.app_context():
+            try:
+                # SKIP LOCKED lets several workers dispatch side by side on Postgres
+                # (SQLite ignores the locking clause; it has a single writer anyway)
+                events = (OutboxEvent.query
+                          .filter(OutboxEvent.dispatched_at.is_(None))
+                          .order_by(OutboxEvent.id)
+                          .limit(batch_size)
+                          .with_for_update(skip_locked=True)
+                          .all())
+                if not events:
+                    db.session.commit()
+                    return 0
+
+                ids = [e.id for e in events]
+                try:
+                    self.sink.publish([e.to_dict() for e in events])
+                except Exception as e:
+                    db.session.execute(
+                        update(OutboxEvent)
+                        .where(OutboxEvent.id.in_(ids))
+                        .values(attempts=OutboxEvent.attempts + 1, last_error=str(e)[:500])
+                    )
+                    db.session.commit()
+                    self.stats['failed_batches'] += 1
+                    self.stats['last_error'] = str(e)
+                    raise
+
+                db.session.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ids))
+                    .values(dispatched_at=italy_now())
+                )
+                db.session.commit()
+                self.stats['dispatched'] += len(ids)
+                return len(ids)
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+    def _purge(self):
+        hours = self.app.config.get('OUTBOX_RETENTION_HOURS', 24)
+        with self.app.app_context():
+            try:
+                OutboxEvent.query.filter(
+                    OutboxEvent.dispatched_at.isnot(None),
+                    OutboxEvent.dispatched_at < italy_now() - timedelta(hours=hours)
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception('Outbox purge error')
+            finally:
+                db.session.remove()
+
+    def pending_count(self):
+        return OutboxEvent.query.filter(OutboxEvent.dispatched_at.is_(None)).count()
+
+
+dispatcher = OutboxDispatcher()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispatcher._reset_after_fork)
@@ -0,0 +1,146 @@
+"""
+Incrementally maintained sales rollups.
+
+Paying or cancelling an order adds its contribution to three small tables
+(hourly x menu item, daily x order type, daily x table) with upserts inside
+the same transaction as the status change. Analytics endpoints then read
+these tables only, so their cost depends on the date range asked for, not
+on how many orders exist.
+
+Revenue is bucketed by payment time. backfill() rebuilds all three tables
+from the orders history, hot and archived (see backfill_rollups.py).
+"""
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import (db, Order, OrderItem, ArchivedOrder, ArchivedOrderItem,
+                    SalesHourlyItem, SalesDailyOrderType, SalesDailyTable)
+
+
+def _upsert(model, rows, keys, increments, replace=()):
+    """INSERT ... ON CONFLICT DO UPDATE adding `increments` to the existing row"""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+    stmt = insert(table)
+    set_ = {column: table.c[column] + stmt.excluded[column] for column in increments}
+    set_.update({column: stmt.excluded[column] for column in replace})
+    db.session.execute(stmt.on_conflict_do_update(index_elements=keys, set_=set_), rows)
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_payments(paid, paid_at):
+    """
+    Add paid orders to the rollups.
+
+    `paid` is a list of (order row, item rows) pairs as returned by the
+    transition engine; items are aggregated in memory first so each rollup
+    gets a single upsert statement.
+    """
+    hourly = {}
+    by_type = {}
+    by_table = {}
+    hour = _hour(paid_at)
+    day = paid_at.date()
+
+    for order, items in paid:
+        for item in items:
+            if item.status == 'cancelled':
+                continue
+            row = hourly.setdefault(item.menu_item_id, {
+                'hour': hour,
+                'menu_item_id': item.menu_item_id,
+                'menu_item_name': item.menu_item_name,
+                'quantity': 0,
+                'revenue': 0
+            })
+            row['quantity'] += item.quantity
+            row['revenue'] += float(item.total_price)
+
+        amount = float(order.final_amount or 0)
+        row = by_type.setdefault(order.order_type, {
+            'day': day, 'order_type': order.order_type, 'orders_count': 0, 'revenue': 0, 'cancelled_count': 0
+        })
+        row['orders_count'] += 1
+        row['revenue'] += amount
+
+        table_number = order.table_number or 0
+        row = by_table.setdefault(table_number, {
+            'day': day, 'table_number': table_number, 'orders_count': 0, 'revenue': 0
+        })
+        row['orders_count'] += 1
+        row['revenue'] += amount
+
+    _upsert(SalesHourlyItem, list(hourly.values()), ['hour', 'menu_item_id'],
+            ['quantity', 'revenue'], replace=['menu_item_name'])
+    _upsert(SalesDailyOrderType, list(by_type.values()), ['day', 'order_type'],
+            ['orders_count', 'revenue', 'cancelled_count'])
+    _upsert(SalesDailyTable, list(by_table.values()), ['day', 'table_number'],
+            ['orders_count', 'revenue'])
+
+
+def record_cancellation(order, cancelled_at):
+    """Count a cancelled order in the daily order type rollup"""
+    _upsert(SalesDailyOrderType, [{
+        'day': cancelled_at.date(),
+        'order_type': order.order_type,
+        'orders_count': 0,
+        'revenue': 0,
+        'cancelled_count': 1
+    }], ['day', 'order_type'], ['cancelled_count'])
+
+
+def backfill(batch_size=1000):
+    """Rebuild every rollup table from the orders history; returns the orders counted"""
+    SalesHourlyItem.query.delete()
+    SalesDailyOrderType.query.delete()
+    SalesDailyTable.query.delete()
+
+    counted = 0
+    for order_model, item_model in ((ArchivedOrder, ArchivedOrderItem), (Order, OrderItem)):
+        counted += _backfill_from(order_model, item_model, batch_size)
+
+    db.session.commit()
+    return counted
+
+
+def _backfill_from(order_model, item_model, batch_size):
+    # Payed and cancelled are final states, so updated_at is when it happened
+    orders = db.session.execute(
+        select(order_model.id, order_model.status, order_model.order_type, order_model.table_number,
+               order_model.final_amount, order_model.updated_at)
+        .where(order_model.status.in_(['payed', 'cancelled']))
+        .order_by(order_model.updated_at)
+        .execution_options(yield_per=batch_size)
+    )
+
+    counted = 0
+    for chunk in orders.partitions():
+        payed = {order.id: order for order in chunk if order.status == 'payed'}
+        for order in chunk:
+            if order.status == 'cancelled':
+                record_cancellation(order, order.updated_at)
+
+        items = {}
+        if payed:
+            for item in db.session.execute(
+                    select(item_model).where(item_model.order_id.in_(list(payed)))).scalars():
+                items.setdefault(item.order_id, []).append(item)
+
+        # Group by payment hour so every order lands in its own bucket
+        by_hour = {}
+        for order_id, order in payed.items():
+            by_hour.setdefault(_hour(order.updated_at), []).append((order, items.get(order_id, [])))
+        for paid_at, paid in by_hour.items():
+            record_payments(paid, paid_at)
+
+        counted += len(chunk)
+
+    return counted
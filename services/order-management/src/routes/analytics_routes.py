@@ -0,0 +1,230 @@
+from flask import Blueprint, request, jsonify
+from models import db, italy_now, SalesHourlyItem, SalesDailyOrderType, SalesDailyTable
+from shared.replicas import replica_read
+from sqlalchemy import func
+from datetime import datetime, timedelta
+import logging
+
+analytics_bp = Blueprint('analytics', __name__)
+logger = logging.getLogger(__name__)
+
+# Longest range a single analytics request may cover
+MAX_RANGE_DAYS = 366
+
+
+def parse_date_range():
+    """Read date_from/date_to (YYYY-MM-DD, inclusive) from the query string; defaults to today"""
+    today = italy_now().date()
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+
+    date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else today
+    date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else max(date_from, today)
+
+    if date_to < date_from:
+        raise ValueError('date_to must not be before date_from')
+    if (date_to - date_from).days > MAX_RANGE_DAYS:
+        raise ValueError(f'Date range cannot exceed {MAX_RANGE_DAYS} days')
+
+    return date_from, date_to
+
+
+def analytics_response(rows, date_from, date_to):
+    return jsonify({
+        'success': True,
+        'data': rows,
+        'count': len(rows),
+        'date_from': date_from,
+        'date_to': date_to
+    })
+
+
+def bad_range(e):
+    return jsonify({
+        'success': False,
+        'message': f'Invalid date range: {str(e)}'
+    }), 400
+
+
+@analytics_bp.route('/revenue/hourly', methods=['GET'])
+@replica_read
+def get_hourly_revenue():
+    """Get revenue and items sold per hour"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return bad_range(e)
+
+        start = datetime.combine(date_from, datetime.min.time())
+        end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+        rows = (db.session.query(
+                    SalesHourlyItem.hour,
+                    func.sum(SalesHourlyItem.quantity).label('quantity'),
+                    func.sum(SalesHourlyItem.revenue).label('revenue'))
+                .filter(SalesHourlyItem.hour >= start, SalesHourlyItem.hour < end)
+                .group_by(SalesHourlyItem.hour)
+                .order_by(SalesHourlyItem.hour)
+                .all())
+
+        return analytics_response([{
+            'hour': row.hour,
+            'quantity': int(row.quantity or 0),
+            'revenue': round(row.revenue or 0, 2)
+        } for row in rows], date_from, date_to)
+
+    except Exception as e:
+        logger.exception('Error in get_hourly_revenue')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching hourly revenue',
+            'error': str(e)
+        }), 500
+
+
+@analytics_bp.route('/revenue/items', methods=['GET'])
+@replica_read
+def get_item_revenue():
+    """Get quantity sold and revenue per menu item (best sellers first)"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return bad_range(e)
+
+        start = datetime.combine(date_from, datetime.min.time())
+        end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+        revenue = func.sum(SalesHourlyItem.revenue).label('revenue')
+        rows = (db.session.query(
+                    SalesHourlyItem.menu_item_id,
+                    func.max(SalesHourlyItem.menu_item_name).label('menu_item_name'),
+                    func.sum(SalesHourlyItem.quantity).label('quantity'),
+                    revenue)
+                .filter(SalesHourlyItem.hour >= start, SalesHourlyItem.hour < end)
+                .group_by(SalesHourlyItem.menu_item_id)
+                .order_by(revenue.desc())
+                .all())
+
+        return analytics_response([{
+            'menu_item_id': row.menu_item_id,
+            'menu_item_name': row.menu_item_name,
+            'quantity': int(row.quantity or 0),
+            'revenue': round(row.revenue or 0, 2)
+        } for row in rows], date_from, date_to)
+
+    except Exception as e:
+        logger.exception('Error in get_item_revenue')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching item revenue',
+            'error': str(e)
+        }), 500
+
+
+@analytics_bp.route('/revenue/tables', methods=['GET'])
+@replica_read
+def get_table_revenue():
+    """Get paid orders and revenue per table"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return bad_range(e)
+
+        rows = (db.session.query(
+                    SalesDailyTable.table_number,
+                    func.sum(SalesDailyTable.orders_count).label('orders_count'),
+                    func.sum(SalesDailyTable.revenue).label('revenue'))
+                .filter(SalesDailyTable.day >= date_from, SalesDailyTable.day <= date_to)
+                .group_by(SalesDailyTable.table_number)
+                .order_by(SalesDailyTable.table_number)
+                .all())
+
+        return analytics_response([{
+            'table_number': row.table_number or None,
+            'orders_count': int(row.orders_count or 0),
+            'revenue': round(row.revenue or 0, 2)
+        } for row in rows], date_from, date_to)
+
+    except Exception as e:
+        logger.exception('Error in get_table_revenue')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching table revenue',
+            'error': str(e)
+        }), 500
+
+
+@analytics_bp.route('/revenue/order-types', methods=['GET'])
+@replica_read
+def get_order_type_revenue():
+    """Get paid/cancelled orders and revenue per order type, per day"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return bad_range(e)
+
+        rows = (SalesDailyOrderType.query
+                .filter(SalesDailyOrderType.day >= date_from, SalesDailyOrderType.day <= date_to)
+                .order_by(SalesDailyOrderType.day, SalesDailyOrderType.order_type)
+                .all())
+
+        return analytics_response([{
+            'day': row.day,
+            'order_type': row.order_type,
+            'orders_count': row.orders_count,
+            'cancelled_count': row.cancelled_count,
+            'revenue': round(row.revenue or 0, 2)
+        } for row in rows], date_from, date_to)
+
+    except Exception as e:
+        logger.exception('Error in get_order_type_revenue')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching order type revenue',
+            'error': str(e)
+        }), 500
+
+
+@analytics_bp.route('/summary', methods=['GET'])
+@replica_read
+def get_sales_summary():
+    """Get total paid orders, cancellations, revenue and average ticket"""
+    try:
+        try:
+            date_from, date_to = parse_date_range()
+        except ValueError as e:
+            return bad_range(e)
+
+        row = (db.session.query(
+                   func.sum(SalesDailyOrderType.orders_count).label('orders_count'),
+                   func.sum(SalesDailyOrderType.cancelled_count).label('cancelled_count'),
+                   func.sum(SalesDailyOrderType.revenue).label('revenue'))
+               .filter(SalesDailyOrderType.day >= date_from, SalesDailyOrderType.day <= date_to)
+               .one())
+
+        orders_count = int(row.orders_count or 0)
+        revenue = round(row.revenue or 0, 2)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'orders_count': orders_count,
+                'cancelled_count': int(row.cancelled_count or 0),
+                'revenue': revenue,
+                'average_ticket': round(revenue / orders_count, 2) if orders_count else 0
+            },
+            'date_from': date_from,
+            'date_to': date_to
+        })
+
+    except Exception as e:
+        logger.exception('Error in get_sales_summary')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching sales summary',
+            'error': str(e)
+        }), 500
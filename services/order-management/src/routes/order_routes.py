@@ -1,14 +1,26 @@
-from flask import Blueprint, request, jsonify
-from models import db, Order, OrderItem
+from flask import Blueprint, request, jsonify, current_app
+from models import db, Order, OrderItem, OrderTombstone, ArchivedOrder
+from changes import next_change_seq, current_change_seq
+from order_numbers import allocator as order_number_allocator
+import transitions
+from kitchen import scheduler as kitchen_scheduler, ACTIVE_ORDER_STATUSES
+from outbox import record_event
+from idempotency import idempotent
+from archive import archive_needed, find_order
+from shared.tracing import tracer, KIND_CLIENT
+from shared.json_provider import JSON_MIMETYPE, MSGPACK_MIMETYPE, loads_body, msgpack
+from shared.cache import cache
+from shared.replicas import replica_read, router as replica_router
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from marshmallow import Schema, fields, ValidationError
 from datetime import datetime, timedelta
-import requests
+import logging
+import uuid
 
 order_bp = Blueprint('orders', __name__)
-
-# Configuration - URL del menu service
-MENU_SERVICE_URL = 'http://localhost:3001'
+logger = logging.getLogger(__name__)
 
 # Marshmallow schemas
 class OrderItemSchema(Schema):
@@ -36,26 +48,74 @@ class OrderSchema(Schema):
 order_schema = OrderSchema()
 order_items_schema = OrderItemSchema(many=True)
 
+# Upper bound for PATCH /items/status
+MAX_BULK_ITEMS = 200
+
+# Upper bound for POST /pay-batch
+MAX_BATCH_ORDERS = 50
+
 
 def generate_order_number():
-    """Generate a unique order number"""
-    import random
-    prefix = datetime.now().strftime("%Y%m%d")
-    suffix = random.randint(1000, 9999)
-    return f"ORD-{prefix}-{suffix}"
+    """Generate a unique order number from this worker's reserved block"""
+    return order_number_allocator.next_number()
 
 
 def calculate_estimated_completion_time(items):
-    """Calculate estimated completion time based on preparation times"""
-    from models import italy_now
-    # Get the maximum preparation time from all items
-    max_prep_time = max([item.get('preparation_time', 15) for item in items], default=15)
-    # Add 5 minutes buffer
-    estimated_minutes = max_prep_time + 5
-    return italy_now() + timedelta(minutes=estimated_minutes)
+    """Calculate estimated completion time from preparation times and the current kitchen load"""
+    return kitchen_scheduler.estimate_completion(items)
+
+
+def with_kitchen_eta(order_dict):
+    """Add the live kitchen ETA to an order response"""
+    eta = None
+    if order_dict['status'] in ACTIVE_ORDER_STATUSES:
+        eta = kitchen_scheduler.eta_for(order_dict['id'])
+    order_dict['kitchen_eta'] = eta
+    return order_dict
+
+
+def with_written_kitchen_eta(order_dict, minutes=None):
+    """Add the kitchen ETA to the response of a write, taken from the rows it wrote (no resync)"""
+    order_dict['kitchen_eta'] = kitchen_scheduler.eta_after_write(order_dict, minutes)
+    return order_dict
+
+
+def parse_date_filter(name, end_of_day=False):
+    """Read a YYYY-MM-DD (or ISO timestamp) query parameter; a bare date_to covers the whole day"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    if len(value) == 10:
+        parsed = datetime.strptime(value, '%Y-%m-%d')
+        return parsed + timedelta(days=1) if end_of_day else parsed
+    return datetime.fromisoformat(value)
+
+
+def filter_orders(model, statuses, table_number, order_type, date_from, date_to):
+    """Build the filtered list query against the hot (Order) or archive (ArchivedOrder) table"""
+    # Items in one extra SELECT instead of one per order
+    query = model.query.options(selectinload(model.items))
+    
+    if statuses is not None:
+        query = query.filter(model.status.in_(statuses))
+    
+    if table_number:
+        query = query.filter(model.table_number == int(table_number))
+    
+    if order_type:
+        query = query.filter(model.order_type == order_type)
+    
+    if date_from:
+        query = query.filter(model.created_at >= date_from)
+    
+    if date_to:
+        query = query.filter(model.created_at < date_to)
+    
+    return query.order_by(model.created_at.desc())
 
 
 @order_bp.route('/', methods=['GET'])
+@replica_read
 def get_all_orders():
     """Get all orders with optional filtering"""
     try:
@@ -64,33 +124,41 @@ def get_all_orders():
         table_number = request.args.get('table_number')
         order_type = request.args.get('order_type')
         
-        query = Order.query
+        try:
+            date_from = parse_date_filter('date_from')
+            date_to = parse_date_filter('date_to', end_of_day=True)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'date_from and date_to must be YYYY-MM-DD or ISO timestamps'
+            }), 400
         
-        # Apply filters
+        statuses = None
         if status:
             if status == 'active':
                 # Active orders are pending, confirmed, or preparing
-                query = query.filter(Order.status.in_(['pending', 'confirmed', 'preparing']))
+                statuses = ['pending', 'confirmed', 'preparing']
             else:
-                query = query.filter(Order.status == status)
-        
-        if table_number:
-            query = query.filter(Order.table_number == int(table_number))
+                statuses = [status]
         
-        if order_type:
-            query = query.filter(Order.order_type == order_type)
+        filters = (statuses, table_number, order_type, date_from, date_to)
         
         # Order by creation date (newest first)
-        orders = query.order_by(Order.created_at.desc()).all()
+        orders = filter_orders(Order, *filters).all()
+        
+        # Settled orders older than the archive horizon live in the archive
+        if archive_needed(date_from, date_to, statuses):
+            orders += filter_orders(ArchivedOrder, *filters).all()
+            orders.sort(key=lambda order: order.created_at, reverse=True)
         
         return jsonify({
             'success': True,
-            'data': [order.to_dict() for order in orders],
+            'data': [with_kitchen_eta(order.to_dict()) for order in orders],
             'count': len(orders)
         })
         
     except Exception as e:
-        print(f"Error in get_all_orders: {str(e)}")
+        logger.exception('Error in get_all_orders')
         return jsonify({
             'success': False,
             'message': 'Error fetching orders',
@@ -98,11 +166,196 @@ def get_all_orders():
         }), 500
 
 
+@order_bp.route('/changes', methods=['GET'])
+@replica_read
+def get_order_changes():
+    """Get orders changed after a cursor, plus tombstones for deleted orders"""
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+            limit = min(int(request.args.get('limit', 500)), 1000)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'since and limit must be integers'
+            }), 400
+        if limit < 1:
+            return jsonify({
+                'success': False,
+                'message': 'limit must be at least 1'
+            }), 400
+        
+        # Changes above the watermark may still be joined by an earlier value
+        # committing late (changes.py): they are returned on a later call.
+        # A cursor ahead of it means the database was reset: resync.
+        # A lagging replica may just not have the client's changes yet
+        latest = current_change_seq()
+        if replica_router.on_replica() and since > latest:
+            replica_router.use_primary()
+            latest = current_change_seq()
+        reset = since > latest
+        if reset:
+            since = 0
+        
+        # One row past `limit` per stream tells whether anything is left
+        orders = (Order.query
+                  .options(selectinload(Order.items))
+                  .filter(Order.change_seq > since, Order.change_seq <= latest)
+                  .order_by(Order.change_seq)
+                  .limit(limit + 1)
+                  .all())
+        tombstones = (OrderTombstone.query
+                      .filter(OrderTombstone.change_seq > since, OrderTombstone.change_seq <= latest)
+                      .order_by(OrderTombstone.change_seq)
+                      .limit(limit + 1)
+                      .all())
+        
+        # Merge both streams by sequence and keep the first `limit` changes
+        changes = sorted(orders + tombstones, key=lambda change: change.change_seq)[:limit]
+        next_cursor = changes[-1].change_seq if changes else since
+        
+        return jsonify({
+            'success': True,
+            'data': [with_kitchen_eta(change.to_dict()) for change in changes if isinstance(change, Order)],
+            'deleted': [change.to_dict() for change in changes if isinstance(change, OrderTombstone)],
+            'count': len(changes),
+            'next_cursor': next_cursor,
+            'has_more': len(orders) + len(tombstones) > len(changes),
+            'reset': reset
+        })
+        
+    except Exception as e:
+        logger.exception('Error in get_order_changes')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching order changes',
+            'error': str(e)
+        }), 500
+
+
+@order_bp.route('/tables', methods=['GET'])
+@replica_read
+def get_table_bills():
+    """Get open balance, order counts and item summary per table"""
+    try:
+        # status=payable restricts the bills to orders that can be paid right now
+        status = request.args.get('status', 'open')
+        if status not in ('open', 'payable'):
+            return jsonify({
+                'success': False,
+                'message': 'status must be open or payable'
+            }), 400
+        statuses = transitions.PAYABLE_STATUSES if status == 'payable' else transitions.OPEN_STATUSES
+        
+        filters = [Order.status.in_(statuses)]
+        table_number = request.args.get('table_number')
+        if table_number:
+            filters.append(Order.table_number == int(table_number))
+        
+        # Balances and payable ids are summed from the same order rows, and the
+        # item summary is read for exactly those orders: the bill agrees with
+        # itself even while orders are being placed and paid
+        orders = (db.session.query(Order.id, Order.table_number, Order.status, Order.final_amount, Order.created_at)
+                  .filter(*filters)
+                  .order_by(Order.table_number, Order.created_at)
+                  .all())
+        
+        tables = {}
+        for order in orders:
+            table = tables.get(order.table_number)
+            if table is None:
+                table = tables[order.table_number] = {
+                    'table_number': order.table_number,
+                    'orders_count': 0,
+                    'open_balance': 0,
+                    'payable_orders_count': 0,
+                    'payable_balance': 0,
+                    'payable_order_ids': [],
+                    'oldest_order_at': order.created_at,
+                    'items': []
+                }
+            amount = order.final_amount or 0
+            table['orders_count'] += 1
+            table['open_balance'] += amount
+            if order.status in transitions.PAYABLE_STATUSES:
+                table['payable_orders_count'] += 1
+                table['payable_balance'] += amount
+                table['payable_order_ids'].append(order.id)
+        
+        items = []
+        if orders:
+            items = (db.session.query(
+                         Order.table_number,
+                         OrderItem.menu_item_id,
+                         func.max(OrderItem.menu_item_name).label('menu_item_name'),
+                         func.sum(OrderItem.quantity).label('quantity'),
+                         func.sum(OrderItem.total_price).label('total_price'))
+                     .join(OrderItem, OrderItem.order_id == Order.id)
+                     .filter(Order.id.in_([order.id for order in orders]), OrderItem.status != 'cancelled')
+                     .group_by(Order.table_number, OrderItem.menu_item_id)
+                     .all())
+        for row in items:
+            tables[row.table_number]['items'].append({
+                'menu_item_id': row.menu_item_id,
+                'menu_item_name': row.menu_item_name,
+                'quantity': int(row.quantity or 0),
+                'total_price': round(row.total_price or 0, 2)
+            })
+        
+        data = list(tables.values())
+        for table in data:
+            table['open_balance'] = round(table['open_balance'], 2)
+            table['payable_balance'] = round(table['payable_balance'], 2)
+            table['items'].sort(key=lambda item: item['menu_item_name'])
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'count': len(data),
+            'total_open_balance': round(sum(table['open_balance'] for table in data), 2),
+            'total_payable_balance': round(sum(table['payable_balance'] for table in data), 2)
+        })
+        
+    except Exception as e:
+        logger.exception('Error in get_table_bills')
+        return jsonify({
+            'success': False,
+            'message': 'Error fetching table bills',
+            'error': str(e)
+        }), 500
+
+
+def load_order(order_id):
+    """One order (hot or archived) as a dict, or None when it does not exist"""
+    order = find_order(order_id)
+    if not order and replica_router.on_replica():
+        # Possibly created after the replica's last replayed commit
+        replica_router.use_primary()
+        order = find_order(order_id)
+    return order.to_dict() if order else None
+
+
+def fetch_available_menu_items():
+    """GET /api/menu/available from the menu service"""
+    import requests  # Deferred: ~50 ms of import time; warmed up before the service reports ready
+    
+    menu_url = f"{current_app.config['MENU_SERVICE_URL']}/api/menu/available"
+    headers = tracer.outgoing_headers()
+    if current_app.config.get('MENU_SERVICE_WIRE_FORMAT') == 'msgpack' and msgpack is not None:
+        headers['Accept'] = f'{MSGPACK_MIMETYPE}, {JSON_MIMETYPE};q=0.5'
+    with tracer.span('GET /api/menu/available', KIND_CLIENT, **{'http.method': 'GET', 'http.url': menu_url}):
+        menu_response = requests.get(menu_url, headers=headers, timeout=5)
+    menu_response.raise_for_status()
+    return loads_body(current_app, menu_response.content, menu_response.headers.get('Content-Type')).get('data', [])
+
+
 @order_bp.route('/<string:order_id>', methods=['GET'])
+@replica_read
 def get_order_by_id(order_id):
     """Get order by ID"""
     try:
-        order = Order.query.get(order_id)
+        # Dropped from the cache whenever the order changes (outbox.py)
+        order = cache.get_or_set('orders', order_id, lambda: load_order(order_id))
         
         if not order:
             return jsonify({
@@ -110,13 +363,14 @@ def get_order_by_id(order_id):
                 'message': 'Order not found'
             }), 404
         
+        # The ETA is live: add it to a copy, not to the cached order
         return jsonify({
             'success': True,
-            'data': order.to_dict()
+            'data': with_kitchen_eta(dict(order))
         })
         
     except Exception as e:
-        print(f"Error in get_order_by_id: {str(e)}")
+        logger.exception('Error in get_order_by_id')
         return jsonify({
             'success': False,
             'message': 'Error fetching order',
@@ -125,17 +379,19 @@ def get_order_by_id(order_id):
 
 
 @order_bp.route('/', methods=['POST'])
+@idempotent('orders.create')
 def create_order():
     """Create a new order"""
     try:
         data = request.json
-        print(f"Received order data: {data}")
+        logger.debug('Order received', extra={'payload': data})
         
         # Validate request data
         try:
-            validated_data = order_schema.load(data)
+            with tracer.span('validate'):
+                validated_data = order_schema.load(data)
         except ValidationError as err:
-            print(f"Validation error: {err.messages}")
+            logger.info('Order validation failed', extra={'errors': err.messages})
             return jsonify({
                 'success': False,
                 'message': 'Validation error',
@@ -145,24 +401,29 @@ def create_order():
         # Verify menu items availability with menu service
         menu_item_ids = [item['menu_item_id'] for item in validated_data['items']]
         try:
-            menu_response = requests.get(f"{MENU_SERVICE_URL}/api/menu/available", timeout=5)
-            if menu_response.ok:
-                available_items = {item['id']: item for item in menu_response.json().get('data', [])}
-                
-                # Check if all ordered items are available
-                unavailable_items = []
-                for item_id in menu_item_ids:
-                    if item_id not in available_items:
-                        unavailable_items.append(item_id)
-                
-                if unavailable_items:
-                    return jsonify({
-                        'success': False,
-                        'message': 'Some menu items are not available',
-                        'unavailable_items': unavailable_items
-                    }), 400
+            # The menu service fills and invalidates this entry too (shared cache tier)
+            menu_items = cache.get_or_set('menu', 'available', fetch_available_menu_items)
+            available_items = {item['id']: item for item in menu_items}
+            
+            # Preparation times drive the kitchen ETA
+            for item in validated_data['items']:
+                if item['menu_item_id'] in available_items:
+                    item['preparation_time'] = available_items[item['menu_item_id']].get('preparation_time')
+            
+            # Check if all ordered items are available
+            unavailable_items = []
+            for item_id in menu_item_ids:
+                if item_id not in available_items:
+                    unavailable_items.append(item_id)
+            
+            if unavailable_items:
+                return jsonify({
+                    'success': False,
+                    'message': 'Some menu items are not available',
+                    'unavailable_items': unavailable_items
+                }), 400
         except Exception as e:
-            print(f"Warning: Could not verify menu availability: {str(e)}")
+            logger.warning('Could not verify menu availability', extra={'error': str(e)})
             # Continue anyway - menu service might be temporarily unavailable
         
         # Calculate totals
@@ -171,9 +432,15 @@ def create_order():
         discount_amount = 0  # No discount for now
         final_amount = total_amount  # Final amount equals total amount without tax
         
-        # Create order
+        # Reserve the order number before the change cursor: a new block is
+        # reserved on a separate connection and must not wait on our own lock
+        order_number = generate_order_number()
+        estimated_completion_time = calculate_estimated_completion_time(validated_data['items'])
+        
+        # Create order (the change cursor is taken first, like every write path)
         order = Order(
-            order_number=generate_order_number(),
+            change_seq=next_change_seq(),
+            order_number=order_number,
             table_number=validated_data['table_number'],
             customer_name=validated_data.get('customer_name'),
             order_type=validated_data['order_type'],
@@ -183,7 +450,7 @@ def create_order():
             discount_amount=discount_amount,
             final_amount=final_amount,
             special_instructions=validated_data.get('special_instructions'),
-            estimated_completion_time=calculate_estimated_completion_time(validated_data['items'])
+            estimated_completion_time=estimated_completion_time
         )
         
         db.session.add(order)
@@ -198,24 +465,35 @@ def create_order():
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price'],
                 total_price=item_data['total_price'],
+                preparation_time=item_data.get('preparation_time'),
                 special_instructions=item_data.get('special_instructions'),
                 status='preparing'
             )
             db.session.add(order_item)
         
+        record_event('order.created', order.id, {
+            'order_number': order.order_number,
+            'table_number': order.table_number,
+            'order_type': order.order_type,
+            'final_amount': float(final_amount),
+            'item_count': len(validated_data['items'])
+        })
+        
         db.session.commit()
         
-        print(f"Order created successfully: {order.order_number}")
+        logger.info('Order created', extra={'order_id': order.id, 'order_number': order.order_number,
+                                            'items': len(validated_data['items'])})
         
+        order_dict = order.to_dict()
         return jsonify({
             'success': True,
             'message': 'Order created successfully',
-            'data': order.to_dict()
+            'data': with_written_kitchen_eta(order_dict, {item.id: item.preparation_time for item in order.items})
         }), 201
         
     except IntegrityError as e:
         db.session.rollback()
-        print(f"IntegrityError: {str(e)}")
+        logger.warning('Order integrity error', extra={'error': str(e)})
         return jsonify({
             'success': False,
             'message': 'Database integrity error',
@@ -223,9 +501,7 @@ def create_order():
         }), 400
     except Exception as e:
         db.session.rollback()
-        print(f"Error in create_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in create_order')
         return jsonify({
             'success': False,
             'message': 'Error creating order',
@@ -239,7 +515,6 @@ def update_order_status(order_id):
     try:
         # Validate UUID format
         try:
-            import uuid
             uuid.UUID(order_id)
         except ValueError:
             return jsonify({
@@ -247,20 +522,7 @@ def update_order_status(order_id):
                 'message': 'Invalid order ID format'
             }), 400
         
-        # Find order using raw SQL (SQLite compatible)
-        from sqlalchemy import text
-        result = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
-        
-        if not result:
-            return jsonify({
-                'success': False,
-                'message': 'Order not found'
-            }), 404
-        
-        data = request.json
+        data = request.json or {}
         new_status = data.get('status')
         
         if not new_status:
@@ -269,74 +531,28 @@ def update_order_status(order_id):
                 'message': 'Status is required'
             }), 400
         
-        # Validate status
-        valid_statuses = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'payed', 'cancelled']
-        if new_status not in valid_statuses:
+        try:
+            order_dict = transitions.change_order_status(order_id, new_status)
+        except transitions.TransitionError as e:
+            db.session.rollback()
             return jsonify({
                 'success': False,
-                'message': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
-            }), 400
-        
-        print(f"Updating order {order_id} status to {new_status}")
-        
-        # Update order status using raw SQL (SQLite compatible)
-        db.session.execute(
-            text("UPDATE orders SET status = :status, updated_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-            {'status': new_status, 'order_id': order_id}
-        )
-        
-        # Update all items status when order status changes
-        if new_status in ['preparing', 'ready', 'delivered']:
-            db.session.execute(
-                text("""
-                    UPDATE order_items 
-                    SET status = :item_status, updated_at = CURRENT_TIMESTAMP 
-                    WHERE order_id = :order_id AND status = 'pending'
-                """),
-                {'item_status': new_status if new_status != 'confirmed' else 'pending', 'order_id': order_id}
-            )
+                'message': e.message
+            }), e.status_code
         
         db.session.commit()
         
-        print(f"Order status updated successfully")
-        
-        # Get updated order data
-        updated_order = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
-        
-        # Get order items
-        items_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"),
-            {'order_id': order_id}
-        ).fetchall()
-        
-        # Convert to dict format
-        order_dict = dict(updated_order._mapping)
-        order_dict['id'] = str(order_dict['id'])
-        
-        items_dict = []
-        for item in items_result:
-            item_dict = dict(item._mapping)
-            item_dict['id'] = str(item_dict['id'])
-            item_dict['order_id'] = str(item_dict['order_id'])
-            item_dict['menu_item_id'] = str(item_dict['menu_item_id'])
-            items_dict.append(item_dict)
-        
-        order_dict['items'] = items_dict
+        logger.info('Order status updated', extra={'order_id': order_id, 'status': new_status})
         
         return jsonify({
             'success': True,
             'message': 'Order status updated successfully',
-            'data': order_dict
+            'data': with_written_kitchen_eta(order_dict)
         })
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_order_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in update_order_status')
         return jsonify({
             'success': False,
             'message': 'Error updating order status',
@@ -350,7 +566,6 @@ def update_order_item_status(order_id, item_id):
     try:
         # Validate UUID formats
         try:
-            import uuid
             uuid.UUID(order_id)
             uuid.UUID(item_id)
         except ValueError:
@@ -359,32 +574,7 @@ def update_order_item_status(order_id, item_id):
                 'message': 'Invalid ID format'
             }), 400
         
-        # Find order using raw SQL (SQLite compatible)
-        from sqlalchemy import text
-        order_result = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
-        
-        if not order_result:
-            return jsonify({
-                'success': False,
-                'message': 'Order not found'
-            }), 404
-        
-        # Find order item using raw SQL (SQLite compatible)
-        item_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE id = :item_id AND order_id = :order_id"),
-            {'item_id': item_id, 'order_id': order_id}
-        ).fetchone()
-        
-        if not item_result:
-            return jsonify({
-                'success': False,
-                'message': 'Order item not found'
-            }), 404
-        
-        data = request.json
+        data = request.json or {}
         new_status = data.get('status')
         
         if not new_status:
@@ -393,87 +583,90 @@ def update_order_item_status(order_id, item_id):
                 'message': 'Status is required'
             }), 400
         
-        # Validate status
-        valid_statuses = ['pending', 'preparing', 'ready', 'served', 'cancelled']
-        if new_status not in valid_statuses:
+        try:
+            order_dict = transitions.change_item_status(order_id, item_id, new_status)
+        except transitions.TransitionError as e:
+            db.session.rollback()
             return jsonify({
                 'success': False,
-                'message': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
-            }), 400
-        
-        print(f"Updating item {item_id} status to {new_status}")
+                'message': e.message
+            }), e.status_code
         
-        # Update order item status using raw SQL (SQLite compatible)
-        db.session.execute(
-            text("""
-                UPDATE order_items 
-                SET status = :status, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = :item_id AND order_id = :order_id
-            """),
-            {'status': new_status, 'item_id': item_id, 'order_id': order_id}
-        )
+        db.session.commit()
         
-        # Check if all items are ready and update order status
-        all_items_result = db.session.execute(
-            text("""
-                SELECT COUNT(*) as total_count,
-                       COUNT(CASE WHEN status IN ('ready', 'served') THEN 1 END) as ready_count
-                FROM order_items 
-                WHERE order_id = :order_id
-            """),
-            {'order_id': order_id}
-        ).fetchone()
-        
-        if all_items_result.total_count == all_items_result.ready_count and order_result.status != 'ready':
-            db.session.execute(
-                text("UPDATE orders SET status = 'ready', updated_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-                {'order_id': order_id}
-            )
+        logger.info('Order item status updated', extra={'order_id': order_id, 'item_id': item_id,
+                                                        'status': new_status})
         
-        db.session.commit()
+        return jsonify({
+            'success': True,
+            'message': 'Order item status updated successfully',
+            'data': with_written_kitchen_eta(order_dict)
+        })
         
-        print(f"Order item status updated successfully")
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error in update_order_item_status')
+        return jsonify({
+            'success': False,
+            'message': 'Error updating order item status',
+            'error': str(e)
+        }), 500
+
+
+@order_bp.route('/items/status', methods=['PATCH'])
+def update_order_items_status():
+    """Update the status of many order items at once (kitchen batch bump)"""
+    try:
+        data = request.json or {}
+        updates = data.get('items')
         
-        # Get updated order data
-        updated_order = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
+        if not isinstance(updates, list) or not updates:
+            return jsonify({
+                'success': False,
+                'message': 'items must be a non-empty list of {order_id, item_id, status}'
+            }), 400
         
-        # Get order items
-        items_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"),
-            {'order_id': order_id}
-        ).fetchall()
+        if len(updates) > MAX_BULK_ITEMS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BULK_ITEMS} items per request'
+            }), 400
         
-        # Convert to dict format
-        order_dict = dict(updated_order._mapping)
-        order_dict['id'] = str(order_dict['id'])
+        # Validate UUID formats
+        try:
+            tuples = [
+                (str(uuid.UUID(update['order_id'])), str(uuid.UUID(update['item_id'])), update.get('status'))
+                for update in updates
+            ]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({
+                'success': False,
+                'message': 'Each item needs a valid order_id and item_id'
+            }), 400
         
-        items_dict = []
-        for item in items_result:
-            item_dict = dict(item._mapping)
-            item_dict['id'] = str(item_dict['id'])
-            item_dict['order_id'] = str(item_dict['order_id'])
-            item_dict['menu_item_id'] = str(item_dict['menu_item_id'])
-            items_dict.append(item_dict)
+        item_results, order_results = transitions.change_item_statuses(tuples)
+        db.session.commit()
         
-        order_dict['items'] = items_dict
+        updated = sum(1 for result in item_results if result['success'])
+        logger.info('Item statuses updated', extra={'updated': updated, 'requested': len(item_results)})
         
         return jsonify({
             'success': True,
-            'message': 'Order item status updated successfully',
-            'data': order_dict
+            'message': 'Order items status updated',
+            'data': {
+                'items': item_results,
+                'orders': order_results
+            },
+            'updated': updated,
+            'failed': len(item_results) - updated
         })
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_order_item_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in update_order_items_status')
         return jsonify({
             'success': False,
-            'message': 'Error updating order item status',
+            'message': 'Error updating order items status',
             'error': str(e)
         }), 500
 
@@ -497,12 +690,19 @@ def delete_order(order_id):
                 'message': 'Can only delete pending or cancelled orders'
             }), 400
         
-        print(f"Deleting order: {order.order_number}")
-        
+        db.session.add(OrderTombstone(
+            order_id=order.id,
+            order_number=order.order_number,
+            change_seq=next_change_seq()
+        ))
         db.session.delete(order)
+        record_event('order.deleted', order.id, {
+            'order_number': order.order_number,
+            'table_number': order.table_number
+        })
         db.session.commit()
         
-        print(f"Order deleted successfully: {order.order_number}")
+        logger.info('Order deleted', extra={'order_id': order.id, 'order_number': order.order_number})
         
         return jsonify({
             'success': True,
@@ -511,9 +711,7 @@ def delete_order(order_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in delete_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in delete_order')
         return jsonify({
             'success': False,
             'message': 'Error deleting order',
@@ -522,12 +720,12 @@ def delete_order(order_id):
 
 
 @order_bp.route('/<string:order_id>/pay', methods=['POST'])
+@idempotent('orders.pay')
 def pay_order(order_id):
     """Mark order as paid"""
     try:
         # Validate UUID format
         try:
-            import uuid
             uuid.UUID(order_id)
         except ValueError:
             return jsonify({
@@ -535,26 +733,6 @@ def pay_order(order_id):
                 'message': 'Invalid order ID format'
             }), 400
         
-        # Find order using raw SQL (SQLite compatible)
-        from sqlalchemy import text
-        result = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
-        
-        if not result:
-            return jsonify({
-                'success': False,
-                'message': 'Order not found'
-            }), 404
-        
-        # Check if order is in a payable status (ready or delivered)
-        if result.status not in ['ready', 'delivered']:
-            return jsonify({
-                'success': False,
-                'message': f'Order must be ready or delivered to be paid. Current status: {result.status}'
-            }), 400
-        
         data = request.json or {}
         payment_method = data.get('payment_method', 'cash')  # cash, card, or other
         payment_amount = data.get('payment_amount')
@@ -563,73 +741,164 @@ def pay_order(order_id):
         if payment_amount is not None:
             try:
                 payment_amount = float(payment_amount)
-                if payment_amount < float(result.final_amount):
-                    return jsonify({
-                        'success': False,
-                        'message': f'Payment amount (€{payment_amount}) is less than order total (€{result.final_amount})'
-                    }), 400
             except ValueError:
                 return jsonify({
                     'success': False,
                     'message': 'Invalid payment amount'
                 }), 400
         
-        print(f"Processing payment for order {order_id} - Method: {payment_method}, Amount: €{result.final_amount}")
-        
-        # Update order status to payed
-        db.session.execute(
-            text("UPDATE orders SET status = 'payed', updated_at = CURRENT_TIMESTAMP WHERE id = :order_id"),
-            {'order_id': order_id}
-        )
+        try:
+            order_dict = transitions.pay_order(order_id, payment_amount, payment_method)
+        except transitions.TransitionError as e:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': e.message
+            }), e.status_code
         
         db.session.commit()
         
-        print(f"Order marked as payed successfully")
+        logger.info('Order payed', extra={'order_id': order_id, 'payment_method': payment_method})
         
-        # Get updated order data
-        updated_order = db.session.execute(
-            text("SELECT * FROM orders WHERE id = :order_id"),
-            {'order_id': order_id}
-        ).fetchone()
+        final_amount = order_dict['final_amount']
+        return jsonify({
+            'success': True,
+            'message': 'Payment processed successfully',
+            'data': order_dict,
+            'payment_info': {
+                'method': payment_method,
+                'amount': final_amount,
+                'change': payment_amount - float(final_amount) if payment_amount else 0
+            }
+        })
         
-        # Get order items
-        items_result = db.session.execute(
-            text("SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"),
-            {'order_id': order_id}
-        ).fetchall()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error in pay_order')
+        return jsonify({
+            'success': False,
+            'message': 'Error processing payment',
+            'error': str(e)
+        }), 500
+
+
+def build_receipt(orders):
+    """Consolidate paid orders into one receipt: item lines merged by menu item, amounts summed"""
+    lines = {}
+    for order in orders:
+        for item in order['items']:
+            if item['status'] == 'cancelled':
+                continue
+            line = lines.setdefault((item['menu_item_id'], item['unit_price']), {
+                'menu_item_id': item['menu_item_id'],
+                'menu_item_name': item['menu_item_name'],
+                'unit_price': item['unit_price'],
+                'quantity': 0,
+                'total_price': 0
+            })
+            line['quantity'] += item['quantity']
+            line['total_price'] = round(line['total_price'] + item['total_price'], 2)
+    
+    def total(field):
+        return round(sum(order[field] for order in orders), 2)
+    
+    return {
+        'order_numbers': [order['order_number'] for order in orders],
+        'table_numbers': sorted({order['table_number'] for order in orders if order['table_number'] is not None}),
+        'items': sorted(lines.values(), key=lambda line: line['menu_item_name']),
+        'total_amount': total('total_amount'),
+        'tax_amount': total('tax_amount'),
+        'discount_amount': total('discount_amount'),
+        'final_amount': total('final_amount')
+    }
+
+
+@order_bp.route('/pay-batch', methods=['POST'])
+@idempotent('orders.pay_batch')
+def pay_orders_batch():
+    """Settle several orders (a list of ids or a whole table) in one transaction"""
+    try:
+        data = request.json or {}
+        order_ids = data.get('order_ids')
+        table_number = data.get('table_number')
+        payment_method = data.get('payment_method', 'cash')  # cash, card, or other
+        payment_amount = data.get('payment_amount')
         
-        # Convert to dict format
-        order_dict = dict(updated_order._mapping)
-        order_dict['id'] = str(order_dict['id'])
+        if (order_ids is None) == (table_number is None):
+            return jsonify({
+                'success': False,
+                'message': 'Provide either order_ids or table_number'
+            }), 400
         
-        items_dict = []
-        for item in items_result:
-            item_dict = dict(item._mapping)
-            item_dict['id'] = str(item_dict['id'])
-            item_dict['order_id'] = str(item_dict['order_id'])
-            item_dict['menu_item_id'] = str(item_dict['menu_item_id'])
-            items_dict.append(item_dict)
+        if order_ids is not None:
+            if not isinstance(order_ids, list) or not order_ids:
+                return jsonify({
+                    'success': False,
+                    'message': 'order_ids must be a non-empty list'
+                }), 400
+            if len(order_ids) > MAX_BATCH_ORDERS:
+                return jsonify({
+                    'success': False,
+                    'message': f'Cannot pay more than {MAX_BATCH_ORDERS} orders at once'
+                }), 400
+            try:
+                order_ids = [str(uuid.UUID(str(order_id))) for order_id in order_ids]
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid order ID format'
+                }), 400
+        else:
+            try:
+                table_number = int(table_number)
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'table_number must be an integer'
+                }), 400
+        
+        if payment_amount is not None:
+            try:
+                payment_amount = float(payment_amount)
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid payment amount'
+                }), 400
         
-        order_dict['items'] = items_dict
+        try:
+            orders = transitions.pay_orders(order_ids, table_number, payment_amount, payment_method)
+        except transitions.TransitionError as e:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': e.message
+            }), e.status_code
+        
+        db.session.commit()
         
+        logger.info('Orders payed', extra={'order_ids': [order['id'] for order in orders],
+                                           'table_number': table_number, 'payment_method': payment_method})
+        
+        receipt = build_receipt(orders)
         return jsonify({
             'success': True,
             'message': 'Payment processed successfully',
-            'data': order_dict,
+            'data': orders,
+            'count': len(orders),
+            'receipt': receipt,
             'payment_info': {
                 'method': payment_method,
-                'amount': float(result.final_amount),
-                'change': payment_amount - float(result.final_amount) if payment_amount else 0
+                'amount': receipt['final_amount'],
+                'change': round(payment_amount - float(receipt['final_amount']), 2) if payment_amount else 0
             }
         })
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in pay_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in pay_orders_batch')
         return jsonify({
             'success': False,
-            'message': 'Error processing payment',
+            'message': 'Error processing batch payment',
             'error': str(e)
         }), 500
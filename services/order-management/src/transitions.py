@@ -0,0 +1,498 @@
+"""
+Order and order item state machine.
+
+Status changes are applied with conditional UPDATE ... RETURNING statements:
+the WHERE clause only matches rows whose current status may move to the new
+one, so validation and the write happen in a single round trip and two
+concurrent requests cannot both win. The response is built from the returned
+rows. Only when nothing matched is a second query run, to tell "not found"
+apart from "not allowed".
+
+The statements are registered with shared/statements.py, so PostgreSQL
+parses and plans each of them once per connection.
+
+Functions here never commit; the caller owns the transaction. Every applied
+change also records an outbox event in that same transaction, and payments
+and cancellations update the sales rollups.
+"""
+
+from sqlalchemy import bindparam, text, tuple_, update
+
+from changes import next_change_seq
+from models import db, italy_now, order_row_to_dict, typed, Order, OrderItem
+from outbox import record_event, record_events
+from shared.statements import statements
+import rollups
+
+# Allowed moves: current status -> statuses it may change to
+ORDER_TRANSITIONS = {
+    'pending': {'confirmed', 'preparing', 'cancelled'},
+    'confirmed': {'pending', 'preparing', 'ready', 'cancelled'},
+    'preparing': {'ready', 'cancelled'},
+    'ready': {'preparing', 'delivered', 'payed', 'cancelled'},
+    'delivered': {'payed'},
+    'payed': set(),
+    'cancelled': set()
+}
+
+ITEM_TRANSITIONS = {
+    'pending': {'preparing', 'ready', 'served', 'cancelled'},
+    'preparing': {'pending', 'ready', 'served', 'cancelled'},
+    'ready': {'preparing', 'served', 'cancelled'},
+    'served': set(),
+    'cancelled': set()
+}
+
+# Order status -> (item status, item statuses that follow it)
+ITEM_CASCADE = {
+    'preparing': ('preparing', ['pending']),
+    'ready': ('ready', ['pending', 'preparing']),
+    'delivered': ('served', ['pending', 'preparing', 'ready']),
+    'cancelled': ('cancelled', ['pending', 'preparing', 'ready'])
+}
+
+PAYABLE_STATUSES = ['ready', 'delivered']
+
+# Orders that still have something to settle
+OPEN_STATUSES = ['pending', 'confirmed', 'preparing', 'ready', 'delivered']
+
+# Order statuses that become 'ready' on their own once every item is done
+AUTO_READY_STATUSES = ('pending', 'confirmed', 'preparing')
+
+# Item statuses that count as done
+FINISHED_ITEM_STATUSES = ('ready', 'served')
+
+
+class TransitionError(Exception):
+    """A status change that cannot be applied"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def allowed_sources(transitions, target):
+    """Statuses from which `target` can be reached"""
+    return sorted(status for status, targets in transitions.items() if target in targets)
+
+
+_UPDATE_ORDER_STATUS = statements.register('orders.update_status', typed(text("""
+    UPDATE orders
+    SET status = :status, updated_at = :now, change_seq = :change_seq
+    WHERE id = :order_id AND status IN :allowed
+    RETURNING *
+""").bindparams(bindparam('allowed', expanding=True)), Order))
+
+# The item statements below return every item of the order, changed or not,
+# so the response (and readiness) needs no further SELECT. All the order's
+# item rows stay locked until commit, which also serializes concurrent taps
+# on one order: the last item done always sees the others done.
+_CASCADE_ITEM_STATUS = statements.register('order_items.cascade_status', typed(text("""
+    UPDATE order_items
+    SET status = CASE WHEN status IN :sources THEN :status ELSE status END,
+        updated_at = CASE WHEN status IN :sources THEN :now ELSE updated_at END
+    WHERE order_id = :order_id
+    RETURNING *
+""").bindparams(bindparam('sources', expanding=True)), OrderItem))
+
+_UPDATE_ITEM_STATUS = statements.register('order_items.update_status', typed(text("""
+    UPDATE order_items
+    SET status = CASE WHEN id = :item_id AND status IN :allowed THEN :status ELSE status END,
+        updated_at = CASE WHEN id = :item_id AND status IN :allowed THEN :now ELSE updated_at END
+    WHERE order_id = :order_id
+    RETURNING *
+""").bindparams(bindparam('allowed', expanding=True)), OrderItem))
+
+# Set-based writes to several orders reserve a change_seq for every order they
+# may touch and hand them out by the order's rank among :order_ids, so no two
+# orders share a cursor value (/changes pages on it)
+_BATCH_CHANGE_SEQ = """change_seq = :first_seq + (
+            SELECT COUNT(*) FROM orders AS earlier
+            WHERE earlier.id IN :order_ids AND earlier.id < orders.id
+        )"""
+
+# Touches the parent order after an item change: advances the change cursor
+# and flips it to 'ready' when no unfinished item is left
+_READINESS_SET_CLAUSE = f"""
+    SET status = CASE
+            WHEN status IN :auto_ready AND NOT EXISTS (
+                SELECT 1 FROM order_items
+                WHERE order_items.order_id = orders.id AND order_items.status NOT IN :finished
+            ) THEN 'ready'
+            ELSE status
+        END,
+        updated_at = :now,
+        {_BATCH_CHANGE_SEQ}
+"""
+
+# Same for a single tap, whose items were just returned by _UPDATE_ITEM_STATUS
+_REFRESH_ORDER_READINESS = statements.register('orders.refresh_readiness', typed(text("""
+    UPDATE orders
+    SET status = CASE WHEN status IN :auto_ready AND :items_done THEN 'ready' ELSE status END,
+        updated_at = :now,
+        change_seq = :change_seq
+    WHERE id = :order_id
+    RETURNING *
+""").bindparams(bindparam('auto_ready', expanding=True)), Order))
+
+_REFRESH_ORDERS_READINESS = statements.register('orders.refresh_readiness_many', text(f"""
+    UPDATE orders
+    {_READINESS_SET_CLAUSE}
+    WHERE id IN :order_ids
+    RETURNING id, status
+""").bindparams(bindparam('order_ids', expanding=True), bindparam('auto_ready', expanding=True),
+               bindparam('finished', expanding=True)))
+
+_PAY_ORDER = statements.register('orders.pay', typed(text("""
+    UPDATE orders
+    SET status = 'payed', updated_at = :now, change_seq = :change_seq
+    WHERE id = :order_id AND status IN :allowed
+    RETURNING *
+""").bindparams(bindparam('allowed', expanding=True)), Order))
+
+_PAY_ORDER_WITH_AMOUNT = statements.register('orders.pay_with_amount', typed(text("""
+    UPDATE orders
+    SET status = 'payed', updated_at = :now, change_seq = :change_seq
+    WHERE id = :order_id AND status IN :allowed AND final_amount <= :payment_amount
+    RETURNING *
+""").bindparams(bindparam('allowed', expanding=True)), Order))
+
+_PAY_ORDERS = statements.register('orders.pay_many', typed(text(f"""
+    UPDATE orders
+    SET status = 'payed', updated_at = :now, {_BATCH_CHANGE_SEQ}
+    WHERE id IN :order_ids AND status IN :allowed
+    RETURNING *
+""").bindparams(bindparam('order_ids', expanding=True), bindparam('allowed', expanding=True)), Order))
+
+_SELECT_PAYABLE_TABLE_ORDERS = statements.register('orders.payable_by_table', text("""
+    SELECT id FROM orders WHERE table_number = :table_number AND status IN :allowed
+""").bindparams(bindparam('allowed', expanding=True)))
+
+_SELECT_ORDER = statements.register('orders.by_id', typed(text(
+    "SELECT * FROM orders WHERE id = :order_id"
+), Order))
+
+_SELECT_ORDERS_STATUS = statements.register('orders.status_many', text("""
+    SELECT id, order_number, status FROM orders WHERE id IN :order_ids
+""").bindparams(bindparam('order_ids', expanding=True)))
+
+_SELECT_ITEMS = statements.register('order_items.by_order', typed(text(
+    "SELECT * FROM order_items WHERE order_id = :order_id ORDER BY created_at"
+), OrderItem))
+
+_SELECT_ITEMS_OF_ORDERS = statements.register('order_items.by_orders', typed(text("""
+    SELECT * FROM order_items WHERE order_id IN :order_ids ORDER BY created_at
+""").bindparams(bindparam('order_ids', expanding=True)), OrderItem))
+
+
+def _fetch_items(order_id):
+    return statements.execute(_SELECT_ITEMS, {'order_id': order_id}).fetchall()
+
+
+def _by_creation(items):
+    # RETURNING gives no order guarantee
+    return sorted(items, key=lambda item: item.created_at)
+
+
+def change_order_status(order_id, new_status):
+    """Apply an order status change and cascade it to the items; returns the order dict"""
+    if new_status not in ORDER_TRANSITIONS:
+        raise TransitionError(f'Invalid status. Must be one of: {", ".join(ORDER_TRANSITIONS)}')
+
+    now = italy_now()
+    order = statements.execute(_UPDATE_ORDER_STATUS, {
+        'status': new_status,
+        'now': now,
+        'change_seq': next_change_seq(),
+        'order_id': order_id,
+        'allowed': allowed_sources(ORDER_TRANSITIONS, new_status)
+    }).fetchone()
+
+    if order is None:
+        current = statements.execute(_SELECT_ORDER, {'order_id': order_id}).fetchone()
+        if current is None:
+            raise TransitionError('Order not found', 404)
+        if current.status == new_status:
+            # Already there (a repeated request): nothing to change
+            return order_row_to_dict(current, _fetch_items(order_id))
+        raise TransitionError(f'Cannot change order status from {current.status} to {new_status}')
+
+    if new_status in ITEM_CASCADE:
+        item_status, sources = ITEM_CASCADE[new_status]
+        items = _by_creation(statements.execute(_CASCADE_ITEM_STATUS, {
+            'status': item_status,
+            'now': now,
+            'order_id': order_id,
+            'sources': sources
+        }))
+    else:
+        items = _fetch_items(order_id)
+    if new_status == 'payed':
+        rollups.record_payments([(order, items)], now)
+    elif new_status == 'cancelled':
+        rollups.record_cancellation(order, now)
+
+    record_event('order.status_changed', order_id, {
+        'order_number': order.order_number,
+        'table_number': order.table_number,
+        'status': new_status
+    })
+
+    return order_row_to_dict(order, items)
+
+
+def change_item_status(order_id, item_id, new_status):
+    """Apply an item status change and refresh the order's readiness; returns the order dict"""
+    if new_status not in ITEM_TRANSITIONS:
+        raise TransitionError(f'Invalid status. Must be one of: {", ".join(ITEM_TRANSITIONS)}')
+
+    now = italy_now()
+    change_seq = next_change_seq()
+    items = _by_creation(statements.execute(_UPDATE_ITEM_STATUS, {
+        'status': new_status,
+        'now': now,
+        'item_id': item_id,
+        'order_id': order_id,
+        'allowed': allowed_sources(ITEM_TRANSITIONS, new_status)
+    }))
+
+    item = next((row for row in items if row.id == item_id), None)
+    if item is None:
+        if not items and statements.execute(_SELECT_ORDER, {'order_id': order_id}).fetchone() is None:
+            raise TransitionError('Order not found', 404)
+        raise TransitionError('Order item not found', 404)
+    if item.status != new_status:
+        raise TransitionError(f'Cannot change item status from {item.status} to {new_status}')
+    if item.updated_at != now:
+        # Already there (a double tap on the kitchen screen): nothing to change
+        order = statements.execute(_SELECT_ORDER, {'order_id': order_id}).fetchone()
+        return order_row_to_dict(order, items)
+
+    order = statements.execute(_REFRESH_ORDER_READINESS, {
+        'items_done': all(row.status in FINISHED_ITEM_STATUSES for row in items),
+        'auto_ready': AUTO_READY_STATUSES,
+        'now': now,
+        'change_seq': change_seq,
+        'order_id': order_id
+    }).fetchone()
+
+    record_event('order_item.status_changed', order_id, {
+        'item_id': item_id,
+        'status': new_status,
+        'order_status': order.status
+    })
+
+    return order_row_to_dict(order, items)
+
+
+def pay_order(order_id, payment_amount=None, payment_method=None):
+    """Mark a ready or delivered order as payed; returns the order dict"""
+    now = italy_now()
+    params = {
+        'now': now,
+        'change_seq': next_change_seq(),
+        'order_id': order_id,
+        'allowed': PAYABLE_STATUSES
+    }
+    if payment_amount is None:
+        order = statements.execute(_PAY_ORDER, params).fetchone()
+    else:
+        order = statements.execute(_PAY_ORDER_WITH_AMOUNT, {**params, 'payment_amount': payment_amount}).fetchone()
+
+    if order is None:
+        current = statements.execute(_SELECT_ORDER, {'order_id': order_id}).fetchone()
+        if current is None:
+            raise TransitionError('Order not found', 404)
+        if current.status not in PAYABLE_STATUSES:
+            raise TransitionError(f'Order must be ready or delivered to be paid. Current status: {current.status}')
+        raise TransitionError(
+            f'Payment amount (€{payment_amount}) is less than order total (€{current.final_amount})'
+        )
+
+    items = _fetch_items(order_id)
+    rollups.record_payments([(order, items)], now)
+
+    record_event('order.payed', order_id, {
+        'order_number': order.order_number,
+        'table_number': order.table_number,
+        'final_amount': float(order.final_amount or 0),
+        'payment_method': payment_method
+    })
+
+    return order_row_to_dict(order, items)
+
+
+def pay_orders(order_ids=None, table_number=None, payment_amount=None, payment_method=None):
+    """
+    Settle several orders at once (one table's bill); returns the order dicts.
+
+    Either `order_ids` or `table_number` selects the orders. They are all
+    marked payed by a single UPDATE whose WHERE clause re-checks that each
+    one is still payable, so two cashiers settling the same orders cannot
+    both succeed. It is all or nothing: if any listed order is missing or
+    not payable, or `payment_amount` does not cover the total, nothing is
+    paid (the caller rolls back on TransitionError).
+    """
+    now = italy_now()
+    by_table = order_ids is None
+    if by_table:
+        # The UPDATE below re-checks the status, so an order paid meanwhile is skipped
+        order_ids = statements.execute(_SELECT_PAYABLE_TABLE_ORDERS, {
+            'table_number': table_number,
+            'allowed': PAYABLE_STATUSES
+        }).scalars().all()
+        if not order_ids:
+            raise TransitionError(f'No orders ready to be paid for table {table_number}', 404)
+    else:
+        order_ids = list(dict.fromkeys(order_ids))
+
+    paid = statements.execute(_PAY_ORDERS, {
+        'now': now,
+        'first_seq': next_change_seq(len(order_ids)) - len(order_ids) + 1,
+        'order_ids': order_ids,
+        'allowed': PAYABLE_STATUSES
+    }).fetchall()
+    if by_table and not paid:
+        raise TransitionError(f'No orders ready to be paid for table {table_number}', 404)
+    if not by_table and len(paid) < len(order_ids):
+        _explain_unpaid(order_ids, {order.id for order in paid})
+
+    total = sum(float(order.final_amount or 0) for order in paid)
+    if payment_amount is not None and payment_amount < round(total, 2):
+        raise TransitionError(f'Payment amount (€{payment_amount}) is less than orders total (€{total:.2f})')
+
+    items = {}
+    for item in statements.execute(_SELECT_ITEMS_OF_ORDERS, {'order_ids': [order.id for order in paid]}):
+        items.setdefault(item.order_id, []).append(item)
+
+    paid = sorted(paid, key=lambda order: order.created_at)
+    rollups.record_payments([(order, items.get(order.id, [])) for order in paid], now)
+
+    record_events([
+        ('order.payed', order.id, {
+            'order_number': order.order_number,
+            'table_number': order.table_number,
+            'final_amount': float(order.final_amount or 0),
+            'payment_method': payment_method
+        })
+        for order in paid
+    ])
+
+    return [order_row_to_dict(order, items.get(order.id, [])) for order in paid]
+
+
+def _explain_unpaid(order_ids, paid_ids):
+    current = {
+        row.id: row
+        for row in statements.execute(_SELECT_ORDERS_STATUS, {'order_ids': order_ids})
+    }
+    missing = [order_id for order_id in order_ids if order_id not in current]
+    if missing:
+        raise TransitionError(f'Orders not found: {", ".join(missing)}', 404)
+    blocked = [current[order_id] for order_id in order_ids if order_id not in paid_ids]
+    raise TransitionError(
+        'Orders must be ready or delivered to be paid: ' +
+        ', '.join(f'{row.order_number} ({row.status})' for row in blocked)
+    )
+
+
+def change_item_statuses(updates):
+    """
+    Apply many item status changes at once (kitchen batch bump).
+
+    `updates` is a list of (order_id, item_id, status) tuples; when an item
+    appears more than once the last entry wins. Items are updated with one
+    set-based UPDATE per target status and every affected order has its
+    readiness recomputed once. Returns (item results, order results); items
+    that could not change are reported, not raised, so one stale ticket does
+    not block the rest of the batch.
+    """
+    requested = {}
+    for order_id, item_id, new_status in updates:
+        requested[(item_id, order_id)] = new_status
+
+    results = {}
+    changed = set()
+    by_status = {}
+    for key, new_status in requested.items():
+        if new_status in ITEM_TRANSITIONS:
+            by_status.setdefault(new_status, []).append(key)
+        else:
+            results[key] = {'success': False, 'status': None, 'message': f'Invalid status: {new_status}'}
+
+    if not by_status:
+        return _item_results(requested, results), []
+
+    # One change_seq per order that may change (see _BATCH_CHANGE_SEQ)
+    order_count = len({order_id for keys in by_status.values() for (_, order_id) in keys})
+    first_seq = next_change_seq(order_count) - order_count + 1
+    now = italy_now()
+    table = OrderItem.__table__
+
+    for new_status, keys in by_status.items():
+        updated = db.session.execute(
+            update(table)
+            .where(tuple_(table.c.id, table.c.order_id).in_(keys))
+            .where(table.c.status.in_(allowed_sources(ITEM_TRANSITIONS, new_status)))
+            .values(status=new_status, updated_at=now)
+            .returning(table.c.id, table.c.order_id)
+        ).fetchall()
+        for row in updated:
+            results[(row.id, row.order_id)] = {'success': True, 'status': new_status}
+            changed.add((row.id, row.order_id))
+
+    # Explain the items that did not match, in one query
+    unmatched = [key for key in requested if key not in results]
+    if unmatched:
+        current = dict(
+            ((row.id, row.order_id), row.status)
+            for row in db.session.execute(
+                db.select(table.c.id, table.c.order_id, table.c.status)
+                .where(tuple_(table.c.id, table.c.order_id).in_(unmatched))
+            )
+        )
+        for key in unmatched:
+            if key not in current:
+                results[key] = {'success': False, 'status': None, 'message': 'Order item not found'}
+            elif current[key] == requested[key]:
+                # Already there (bumped twice): nothing to change
+                results[key] = {'success': True, 'status': current[key]}
+            else:
+                results[key] = {
+                    'success': False,
+                    'status': current[key],
+                    'message': f'Cannot change item status from {current[key]} to {requested[key]}'
+                }
+
+    affected_orders = sorted({order_id for (_, order_id) in changed})
+    orders = []
+    if affected_orders:
+        orders = [
+            {'id': row.id, 'status': row.status}
+            for row in statements.execute(_REFRESH_ORDERS_READINESS, {
+                'now': now,
+                'first_seq': first_seq,
+                'order_ids': affected_orders,
+                'auto_ready': AUTO_READY_STATUSES,
+                'finished': FINISHED_ITEM_STATUSES
+            })
+        ]
+        order_status = {order['id']: order['status'] for order in orders}
+        record_events([
+            ('order_item.status_changed', order_id, {
+                'item_id': item_id,
+                'status': result['status'],
+                'order_status': order_status.get(order_id)
+            })
+            for (item_id, order_id), result in results.items() if (item_id, order_id) in changed
+        ])
+
+    return _item_results(requested, results), orders
+
+
+def _item_results(requested, results):
+    item_results = []
+    for (item_id, order_id) in requested:
+        item_results.append({'order_id': order_id, 'item_id': item_id, **results[(item_id, order_id)]})
+    return item_results
@@ -0,0 +1,7 @@
+"""WSGI entry point for production servers: gunicorn --config gunicorn.conf.py wsgi:app"""
+
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_ENV', 'production'))
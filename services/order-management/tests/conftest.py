@@ -0,0 +1,62 @@
+"""
+Fixtures for the order service tests: a fresh app on in-memory SQLite for
+every test (TestConfig: blocking startup, memory outbox sink, background
+threads off).
+
+The services share module names (app, models, config), so run one service
+per pytest invocation, from its directory:
+
+    cd services/order-management && python -m pytest
+"""
+
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(SERVICE_DIR, 'src'), os.path.dirname(SERVICE_DIR)]  # The service, then shared/
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def new_order(client):
+    """Create an order through the API; returns its JSON"""
+    def create(table_number=3, items=1, **fields):
+        body = {
+            'table_number': table_number,
+            'order_type': 'dine_in',
+            'items': [{'menu_item_id': f'm{i}', 'menu_item_name': f'Pizza {i}', 'quantity': 1,
+                       'unit_price': 7.5, 'total_price': 7.5} for i in range(items)],
+            **fields
+        }
+        response = client.post('/api/orders/', json=body)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['data']
+    return create
+
+
+@pytest.fixture
+def ready_order(client, new_order):
+    """Create an order and take it to 'ready' (payable)"""
+    def create(table_number=3, items=1):
+        order = new_order(table_number, items)
+        response = client.put(f"/api/orders/{order['id']}/status", json={'status': 'ready'})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['data']
+    return create
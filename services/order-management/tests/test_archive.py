@@ -0,0 +1,48 @@
+"""Archival (archive.py): a settled order leaves the hot tables, leaves a tombstone and stays readable"""
+
+from datetime import timedelta
+
+import pytest
+
+from archive import archive_orders, archiver
+from models import db, italy_now, ArchivedOrder, Order, OrderTombstone
+
+
+def settle(client, order_id, days_ago):
+    assert client.post(f'/api/orders/{order_id}/pay', json={}).status_code == 200
+    db.session.execute(Order.__table__.update()
+                       .where(Order.__table__.c.id == order_id)
+                       .values(updated_at=italy_now() - timedelta(days=days_ago)))
+    db.session.commit()
+
+
+def test_archived_order_readable(client, ready_order):
+    order_id = ready_order(9)['id']
+    settle(client, order_id, days_ago=3)  # Older than ARCHIVE_AFTER_HOURS
+
+    assert archiver.run_once() == 1
+    assert db.session.get(Order, order_id) is None
+    assert db.session.get(ArchivedOrder, order_id) is not None
+    assert OrderTombstone.query.filter_by(order_id=order_id).count() == 1
+
+    response = client.get(f'/api/orders/{order_id}')
+    assert response.status_code == 200
+    order = response.get_json()['data']
+    assert order['status'] == 'payed' and len(order['items']) == 1
+
+
+def test_recent_orders_stay_hot(client, ready_order):
+    order_id = ready_order()['id']
+    settle(client, order_id, days_ago=1)
+    assert archiver.run_once() == 0
+    assert db.session.get(Order, order_id) is not None
+
+
+def test_younger_than_horizon_refused(client, ready_order):
+    order_id = ready_order()['id']
+    settle(client, order_id, days_ago=1)
+
+    # Reads filtered on the last day would not look in the archive for it
+    with pytest.raises(ValueError):
+        archive_orders(italy_now() - timedelta(hours=12))
+    assert db.session.get(Order, order_id) is not None
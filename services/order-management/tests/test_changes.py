@@ -0,0 +1,59 @@
+"""The /changes cursor (changes.py): every change is seen once, whatever the page size"""
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Order
+
+
+def page_through(client, since, limit):
+    """Follow /changes from `since` in pages of `limit`; returns the order ids seen, in order"""
+    seen = []
+    while True:
+        body = client.get(f'/api/orders/changes?since={since}&limit={limit}').get_json()
+        seen += [order['id'] for order in body['data']]
+        since = body['next_cursor']
+        if not body['has_more']:
+            return seen
+
+
+def cursor(client):
+    return client.get('/api/orders/changes?limit=1000').get_json()['next_cursor']
+
+
+@pytest.mark.parametrize('by_table', [False, True])
+def test_batch_payment_paged(client, ready_order, by_table):
+    orders = [ready_order(table_number=4) for _ in range(3)]
+    since = cursor(client)
+
+    body = {'table_number': 4} if by_table else {'order_ids': [order['id'] for order in orders]}
+    response = client.post('/api/orders/pay-batch', json=body)
+    assert response.status_code == 200, response.get_json()
+
+    seen = page_through(client, since, limit=2)
+    assert sorted(seen) == sorted(order['id'] for order in orders)
+
+
+def test_kitchen_bump_paged(client, new_order):
+    orders = [new_order(items=2) for _ in range(3)]
+    since = cursor(client)
+
+    # Finishing every item also flips each order to 'ready'
+    updates = [{'order_id': order['id'], 'item_id': item['id'], 'status': 'ready'}
+               for order in orders for item in order['items']]
+    response = client.patch('/api/orders/items/status', json={'items': updates})
+    assert response.status_code == 200, response.get_json()
+
+    seen = page_through(client, since, limit=2)
+    assert sorted(seen) == sorted(order['id'] for order in orders)
+
+
+def test_cursor_values_unique(new_order):
+    first, second = new_order(), new_order()
+
+    with pytest.raises(IntegrityError):
+        db.session.execute(update(Order).where(Order.id == second['id']).values(
+            change_seq=db.session.get(Order, first['id']).change_seq
+        ))
+    db.session.rollback()
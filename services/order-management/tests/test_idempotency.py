@@ -0,0 +1,67 @@
+"""Idempotency-Key on order creation and payment (idempotency.py)"""
+
+from datetime import timedelta
+
+from idempotency import _hash
+from models import db, italy_now, IdempotencyKey, Order
+
+ITEMS = [{'menu_item_id': 'm1', 'menu_item_name': 'Margherita', 'quantity': 1, 'unit_price': 7.5, 'total_price': 7.5}]
+
+
+def create(client, key, table_number):
+    return client.post('/api/orders/', headers={'Idempotency-Key': key},
+                       json={'table_number': table_number, 'order_type': 'dine_in', 'items': ITEMS})
+
+
+def test_retry_replayed(client):
+    first = create(client, 'retry-1', 12)
+    retry = create(client, 'retry-1', 12)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert Order.query.count() == 1
+
+
+def test_other_body_refused(client):
+    assert create(client, 'retry-2', 13).status_code == 201
+    reused = create(client, 'retry-2', 14)
+    assert reused.status_code == 422
+    assert Order.query.count() == 1
+
+
+def test_payment_retry_replayed(client, ready_order):
+    order_id = ready_order()['id']
+    first = client.post(f'/api/orders/{order_id}/pay', headers={'Idempotency-Key': 'pay-1'}, json={})
+    retry = client.post(f'/api/orders/{order_id}/pay', headers={'Idempotency-Key': 'pay-1'}, json={})
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_json() == first.get_json()
+    # Without the key the order is already payed
+    assert client.post(f'/api/orders/{order_id}/pay', json={}).status_code == 400
+
+
+def abandon_after_commit(key_hash, seconds_ago):
+    """Leave the key as a worker that died between its commit and storing the response would"""
+    db.session.execute(IdempotencyKey.__table__.update()
+                       .where(IdempotencyKey.__table__.c.key_hash == key_hash)
+                       .values(status='committed', status_code=None, response_body=None,
+                               created_at=italy_now() - timedelta(seconds=seconds_ago)))
+    db.session.commit()
+
+
+def test_committed_claim_waits_for_lease(app, client):
+    app.config['IDEMPOTENCY_WAIT_TIMEOUT'] = 0.1
+    assert create(client, 'retry-3', 15).status_code == 201
+    abandon_after_commit(_hash('orders.create', 'retry-3'), seconds_ago=1)
+
+    assert create(client, 'retry-3', 15).status_code == 409
+
+
+def test_abandoned_committed_claim_taken_over(app, client):
+    assert create(client, 'retry-4', 16).status_code == 201
+    lease = app.config['IDEMPOTENCY_LEASE_SECONDS']
+    abandon_after_commit(_hash('orders.create', 'retry-4'), seconds_ago=lease + 1)
+
+    # No response to replay: the handler runs again instead of a 409 until the key expires
+    retry = create(client, 'retry-4', 16)
+    assert retry.status_code == 201 and 'Idempotent-Replayed' not in retry.headers
+    assert create(client, 'retry-4', 16).headers['Idempotent-Replayed'] == 'true'
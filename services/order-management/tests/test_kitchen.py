@@ -0,0 +1,60 @@
+"""Kitchen ETA scheduler (kitchen.py) against schedules worked out by hand"""
+
+from datetime import timedelta
+
+import pytest
+
+from kitchen import KitchenScheduler
+from models import italy_now
+
+
+@pytest.fixture
+def kitchen(app):
+    app.config['KITCHEN_STATIONS'] = 2
+    return KitchenScheduler()
+
+
+@pytest.fixture
+def t0():
+    # In the future, so no ETA is clamped to now
+    return italy_now().replace(second=0, microsecond=0) + timedelta(days=1)
+
+
+def add_order(kitchen, order_id, ordered_at, *minutes):
+    for number, duration in enumerate(minutes):
+        kitchen._add_job(order_id, f'{order_id}{number}', ordered_at, duration)
+
+
+def etas(kitchen, t0, *order_ids):
+    """Minutes from t0 to each order's ETA"""
+    return [(kitchen.eta_for(order_id) - t0) / timedelta(minutes=1) for order_id in order_ids]
+
+
+def test_schedule(kitchen, t0):
+    kitchen.eta_for('none')  # Load the (empty) database first
+    add_order(kitchen, 'A', t0, 10, 5)
+    add_order(kitchen, 'B', t0 + timedelta(minutes=1), 8)
+    add_order(kitchen, 'C', t0 + timedelta(minutes=2), 3, 4)
+
+    # A0 0-10 and A1 0-5; B0 5-13; C0 10-13, C1 13-17. Appended, not rebuilt
+    assert not kitchen._dirty
+    assert etas(kitchen, t0, 'A', 'B', 'C') == [10, 13, 17]
+
+    # D is ordered ahead of B and C: D0 5-7, B0 7-15, C0 10-13, C1 13-17
+    add_order(kitchen, 'D', t0 + timedelta(seconds=30), 2)
+    assert kitchen._dirty
+    assert etas(kitchen, t0, 'A', 'D', 'B', 'C') == [10, 7, 15, 17]
+
+    # A is done: D0 0.5-2.5, B0 1-9, C0 2.5-5.5, C1 5.5-9.5
+    kitchen._remove_order('A')
+    assert kitchen.eta_for('A') is None
+    assert etas(kitchen, t0, 'D', 'B', 'C') == [2.5, 9, 9.5]
+
+
+def test_new_order_queued_behind_load(kitchen, t0):
+    kitchen.eta_for('none')
+    add_order(kitchen, 'A', t0, 10, 5)
+
+    # Both stations busy until 5 and 10: 6 + 6 minutes end at 11 and 16
+    estimate = kitchen.estimate_completion([{'preparation_time': 6}, {'preparation_time': 6}])
+    assert (estimate - t0) / timedelta(minutes=1) == 16
@@ -0,0 +1,60 @@
+"""The available menu is fetched in MessagePack and read in whatever format the menu service answers"""
+
+import json
+
+import pytest
+import requests
+
+from shared.json_provider import JSON_MIMETYPE, MSGPACK_MIMETYPE, msgpack, packb
+
+MENU = {'success': True, 'data': [{'id': 'm0', 'name': 'Pizza 0', 'preparation_time': 12}]}
+
+
+class MenuResponse:
+    def __init__(self, content, content_type):
+        self.content = content
+        self.headers = {'Content-Type': content_type}
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def menu_service(monkeypatch):
+    """Answer GET /api/menu/available in the given format; returns the Accept headers received"""
+    received = []
+
+    def serve(wire_format):
+        def get(url, headers=None, timeout=None):
+            received.append(headers.get('Accept'))
+            if wire_format == 'msgpack':
+                return MenuResponse(packb(MENU), MSGPACK_MIMETYPE)
+            return MenuResponse(json.dumps(MENU).encode(), f'{JSON_MIMETYPE}; charset=utf-8')
+        monkeypatch.setattr(requests, 'get', get)
+        return received
+
+    return serve
+
+
+def order(client, menu_item_id):
+    return client.post('/api/orders/', json={'table_number': 2, 'order_type': 'dine_in', 'items': [
+        {'menu_item_id': menu_item_id, 'menu_item_name': 'Pizza', 'quantity': 1, 'unit_price': 7.5,
+         'total_price': 7.5}]})
+
+
+@pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+@pytest.mark.parametrize('wire_format', ['msgpack', 'json'])
+def test_menu_read_in_either_format(client, menu_service, wire_format):
+    received = menu_service(wire_format)
+
+    assert order(client, 'm0').status_code == 201
+    assert order(client, 'm9').get_json()['unavailable_items'] == ['m9']
+    assert received[0] == f'{MSGPACK_MIMETYPE}, {JSON_MIMETYPE};q=0.5'
+
+
+def test_json_asked_when_configured(app, client, menu_service):
+    app.config['MENU_SERVICE_WIRE_FORMAT'] = 'json'
+    received = menu_service('json')
+
+    assert order(client, 'm9').status_code == 400
+    assert received == [None]
@@ -0,0 +1,40 @@
+"""Order numbers (order_numbers.py): blocks reserved per worker, never shared, restarted every day"""
+
+from datetime import datetime
+
+import order_numbers
+from order_numbers import OrderNumberAllocator
+
+
+def test_workers_never_share_numbers(app):
+    app.config['ORDER_NUMBER_BLOCK_SIZE'] = 3
+    first, second = OrderNumberAllocator(), OrderNumberAllocator()  # Two worker processes
+
+    numbers = [allocator.next_number() for _ in range(4) for allocator in (first, second)]
+
+    assert len(set(numbers)) == 8
+    # Blocks of 3: the first worker holds 1-3 and 7-9, the second 4-6 and 10-12
+    assert [int(number[-4:]) for number in numbers] == [1, 4, 2, 5, 3, 6, 7, 10]
+
+
+def test_numbers_restart_every_day(app, monkeypatch):
+    day = {'now': datetime(2026, 3, 14, 23, 59)}
+    monkeypatch.setattr(order_numbers, 'italy_now', lambda: day['now'])
+    allocator = OrderNumberAllocator()
+
+    assert [allocator.next_number() for _ in range(2)] == ['ORD-20260314-0001', 'ORD-20260314-0002']
+    day['now'] = datetime(2026, 3, 15, 0, 1)
+    assert allocator.next_number() == 'ORD-20260315-0001'
+
+
+def test_forked_worker_reserves_its_own_block(app):
+    app.config['ORDER_NUMBER_BLOCK_SIZE'] = 5
+    allocator = OrderNumberAllocator()
+    allocator.next_number()
+    allocator.reset()  # After fork the child must not hand out the parent's block
+    assert allocator.next_number().endswith('-0006')
+
+
+def test_created_orders_numbered(new_order):
+    numbers = [new_order(table_number)['order_number'] for table_number in (1, 2, 3)]
+    assert len(set(numbers)) == 3 and all(number.startswith('ORD-') for number in numbers)
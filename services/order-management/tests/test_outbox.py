@@ -0,0 +1,33 @@
+"""Order events go through the outbox (outbox.py): written with the order, delivered by the dispatcher"""
+
+from models import db, OutboxEvent
+from outbox import dispatcher
+
+
+def test_event_dispatched_and_marked(new_order):
+    order_id = new_order(7)['id']
+
+    event = OutboxEvent.query.filter_by(aggregate_id=order_id).one()
+    assert event.event_type == 'order.created' and event.dispatched_at is None
+
+    assert dispatcher.dispatch_once() == 1
+    assert [e['event_type'] for e in dispatcher.sink.events if e['order_id'] == order_id] == ['order.created']
+    db.session.refresh(event)  # Dispatched in the dispatcher's own session
+    assert event.dispatched_at is not None
+    assert dispatcher.dispatch_once() == 0
+
+
+def test_failed_delivery_kept_for_retry(new_order, monkeypatch):
+    order_id = new_order()['id']
+
+    def unreachable(events):
+        raise ConnectionError('broker down')
+    monkeypatch.setattr(dispatcher.sink, 'publish', unreachable)
+    try:
+        dispatcher.dispatch_once()
+    except ConnectionError:
+        pass
+
+    event = OutboxEvent.query.filter_by(aggregate_id=order_id).one()
+    db.session.refresh(event)
+    assert event.dispatched_at is None and event.attempts == 1 and 'broker down' in event.last_error
@@ -0,0 +1,58 @@
+"""Sales rollups (rollups.py): kept up to date by payments and cancellations, rebuilt by backfill()"""
+
+import pytest
+
+from rollups import backfill
+
+
+def analytics(client, path):
+    response = client.get(f'/api/analytics/{path}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+@pytest.fixture
+def evening(client, new_order, ready_order):
+    """Two orders paid one by one, a table of two paid together, one cancelled; returns the amount paid"""
+    paid = []
+    for table_number in (1, 2):
+        order = ready_order(table_number, items=2)
+        response = client.post(f"/api/orders/{order['id']}/pay", json={})
+        paid.append(response.get_json()['data']['final_amount'])
+
+    for _ in range(2):
+        ready_order(7)
+    response = client.post('/api/orders/pay-batch', json={'table_number': 7})
+    assert response.status_code == 200, response.get_json()
+    paid.extend(order['final_amount'] for order in response.get_json()['data'])
+
+    cancelled = new_order(9)
+    assert client.put(f"/api/orders/{cancelled['id']}/status", json={'status': 'cancelled'}).status_code == 200
+    return round(sum(paid), 2)
+
+
+def test_payments_and_cancellations_counted(client, evening):
+    summary = analytics(client, 'summary')
+    assert summary['orders_count'] == 4 and summary['cancelled_count'] == 1
+    assert summary['revenue'] == evening
+    assert summary['average_ticket'] == round(evening / 4, 2)
+
+    tables = {row['table_number']: row['orders_count'] for row in analytics(client, 'revenue/tables')}
+    assert tables == {1: 1, 2: 1, 7: 2}
+
+    # The orders of tables 1 and 2 hold items m0 and m1, those of table 7 only m0
+    items = {row['menu_item_id']: row['quantity'] for row in analytics(client, 'revenue/items')}
+    assert items == {'m0': 4, 'm1': 2}
+
+
+def test_backfill_matches_incremental(client, evening):
+    incremental = [analytics(client, path) for path in ('summary', 'revenue/items', 'revenue/tables',
+                                                         'revenue/order-types', 'revenue/hourly')]
+    assert backfill(batch_size=2) == 5
+    assert [analytics(client, path) for path in ('summary', 'revenue/items', 'revenue/tables',
+                                                  'revenue/order-types', 'revenue/hourly')] == incremental
+
+
+def test_range_validated(client):
+    response = client.get('/api/analytics/summary?date_from=2026-03-02&date_to=2026-03-01')
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+"""Startup schema check (shared/startup.py) against a database from before schema versioning"""
+
+from sqlalchemy import select, text
+
+from models import db, SCHEMA_VERSION
+from shared.startup import schema_version_table, stamp_schema_version, UNVERSIONED_SCHEMA
+
+
+def restart(app):
+    """Run the startup sequence again, as a new worker would"""
+    readiness = app.extensions['readiness']
+    readiness._reset_state()
+    return readiness.warm_up(), readiness.schema
+
+
+def drop_versioning():
+    db.session.execute(text('DROP TABLE schema_version'))
+    db.session.commit()
+
+
+def stamps():
+    table = schema_version_table(db.metadata)
+    return db.session.execute(select(table.c.version, table.c.description).order_by(table.c.version)).all()
+
+
+def test_preversioning_schema_adopted(app, client):
+    drop_versioning()
+
+    # Adopted at the first version; the later ones still need their migrations
+    ready, schema = restart(app)
+    assert stamps() == [(UNVERSIONED_SCHEMA, 'adopted')]
+    assert not ready and schema['status'] == 'outdated' and schema['version'] == UNVERSIONED_SCHEMA
+
+    stamp_schema_version(db.session.connection(), SCHEMA_VERSION, 'migrated')
+    db.session.commit()
+    ready, schema = restart(app)
+    assert ready and schema == {'status': 'current', 'version': SCHEMA_VERSION}
+    assert client.get('/readyz').status_code == 200
+
+
+def test_preversioning_schema_migrated_first(app, client):
+    # The migrations ran before this code first started: their stamps count
+    drop_versioning()
+    stamp_schema_version(db.session.connection(), SCHEMA_VERSION, 'migrated')
+    db.session.commit()
+
+    ready, schema = restart(app)
+    assert ready and schema == {'status': 'current', 'version': SCHEMA_VERSION}
+    assert stamps() == [(UNVERSIONED_SCHEMA, 'adopted'), (SCHEMA_VERSION, 'migrated')]
+
+
+def test_preversioning_schema_missing_columns(app, client):
+    drop_versioning()
+    db.session.execute(text('ALTER TABLE order_items DROP COLUMN preparation_time'))
+    db.session.commit()
+
+    ready, schema = restart(app)
+    assert not ready and schema['status'] == 'outdated'
+    assert schema['missing_columns'] == ['order_items.preparation_time']
+    assert client.get('/readyz').status_code == 503
+
+    # The migrations add the column; the next attempt adopts the database
+    db.session.execute(text('ALTER TABLE order_items ADD COLUMN preparation_time INTEGER'))
+    stamp_schema_version(db.session.connection(), SCHEMA_VERSION, 'migrated')
+    db.session.commit()
+    assert app.extensions['readiness'].warm_up()
@@ -0,0 +1,45 @@
+"""Per-table bills (GET /api/orders/tables)"""
+
+
+def bills(client, query=''):
+    response = client.get(f'/api/orders/tables{query}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_bill_per_table(client, new_order, ready_order):
+    payable = ready_order(4, items=2)
+    waiting = new_order(4, items=1)  # Confirmed: open, not payable yet
+    extra = new_order(4, items=2)
+    assert client.put(f"/api/orders/{extra['id']}/items/{extra['items'][1]['id']}/status",
+                      json={'status': 'cancelled'}).status_code == 200
+    paid = ready_order(5)
+    assert client.post(f"/api/orders/{paid['id']}/pay", json={}).status_code == 200
+
+    body = bills(client)
+    assert body['count'] == 1  # Table 5 has nothing left to pay
+    table = body['data'][0]
+    assert table['table_number'] == 4
+    assert table['orders_count'] == 3
+    assert table['payable_order_ids'] == [payable['id']]
+    assert table['payable_balance'] == payable['final_amount']
+    assert body['total_payable_balance'] == table['payable_balance']
+    open_orders = [client.get(f"/api/orders/{order['id']}").get_json()['data'] for order in (payable, waiting, extra)]
+    assert table['open_balance'] == round(sum(order['final_amount'] for order in open_orders), 2)
+
+    # The cancelled item is left off the summary
+    assert {item['menu_item_id']: item['quantity'] for item in table['items']} == {'m0': 3, 'm1': 1}
+
+
+def test_payable_only(client, new_order, ready_order):
+    payable = ready_order(4)
+    new_order(6)
+
+    body = bills(client, '?status=payable')
+    assert [table['table_number'] for table in body['data']] == [4]
+    assert body['data'][0]['payable_order_ids'] == [payable['id']]
+    assert bills(client, '?table_number=6')['data'][0]['payable_orders_count'] == 0
+
+
+def test_unknown_status_refused(client):
+    assert client.get('/api/orders/tables?status=payed').status_code == 400
@@ -0,0 +1,38 @@
+"""Status changes written with raw SQL (transitions.py)"""
+
+import pytest
+
+import transitions
+
+
+def tap(client, order, item, status):
+    response = client.put(f"/api/orders/{order['id']}/items/{item['id']}/status", json={'status': status})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def test_written_order_shaped_like_read_one(client, new_order):
+    order = new_order(items=2)
+    written = tap(client, order, order['items'][0], 'preparing')  # order_row_to_dict
+    read = client.get(f"/api/orders/{order['id']}").get_json()['data']  # Order.to_dict
+
+    assert written.keys() == read.keys()
+    assert [item.keys() for item in written['items']] == [item.keys() for item in read['items']]
+
+
+@pytest.mark.parametrize('auto_ready', [('confirmed',), ('pending', 'confirmed', 'preparing')])
+def test_last_item_done_makes_order_ready(client, new_order, monkeypatch, auto_ready):
+    monkeypatch.setattr(transitions, 'AUTO_READY_STATUSES', auto_ready)
+    order = new_order(items=2)
+
+    assert tap(client, order, order['items'][0], 'ready')['status'] == order['status']
+    assert tap(client, order, order['items'][1], 'ready')['status'] == 'ready'
+
+
+def test_kitchen_bump_makes_orders_ready(client, new_order, monkeypatch):
+    monkeypatch.setattr(transitions, 'FINISHED_ITEM_STATUSES', ('ready',))
+    orders = [new_order(), new_order()]
+    updates = [{'order_id': order['id'], 'item_id': order['items'][0]['id'], 'status': 'ready'} for order in orders]
+
+    response = client.patch('/api/orders/items/status', json={'items': updates})
+    assert {order['status'] for order in response.get_json()['data']['orders']} == {'ready'}
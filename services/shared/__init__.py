@@ -0,0 +1 @@
+"""Code shared by the ByteRisto services (copied into each image as the `shared` package)"""
@@ -0,0 +1,99 @@
+"""
+Bounded queue written out in batches by a background thread.
+
+Used where the request path hands off work that must never make it wait:
+finished spans (tracing.py) and recorded gateway traffic
+(api-gateway/src/recorder.py). submit() does not block; when the queue is
+full the item is refused and the caller counts it as dropped. A daemon
+thread, started on first use, takes up to batch_size items, or whatever
+arrives within flush_interval of the first one, and passes them to the
+subclass's write():
+
+    class SpanExporter(BatchWriter):
+        thread_name = 'span-exporter'
+
+        def write(self, spans):
+            ...
+
+Threads do not survive fork(): the owning module registers
+_reset_after_fork, and the child starts with an empty queue and starts its
+own thread on its first submit().
+"""
+
+import abc
+import queue
+import threading
+import time
+
+
+class BatchWriter(abc.ABC):
+    """Non-blocking bounded queue drained in batches by one background thread"""
+
+    thread_name = 'batch-writer'
+
+    def __init__(self, max_queue=10000, flush_interval=1.0, batch_size=512):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def set_max_queue(self, max_queue):
+        """Start over with an empty queue of this size (at configuration time)"""
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    def submit(self, item):
+        """Queue an item for the writer thread; False when the queue is full and it was not taken"""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        self._ensure_running()
+        return True
+
+    @abc.abstractmethod
+    def write(self, batch):
+        """Write a batch out; runs on the writer thread and must handle its own errors"""
+
+    def flush(self):
+        """Write whatever is queued right now (used by tests and at shutdown)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write(batch)
+
+    def _reset_after_fork(self):
+        # Items queued by the parent are not the child's
+        self._thread = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
@@ -0,0 +1,491 @@
+"""
+Two-tier cache shared by the services.
+
+Values are looked up in a small in-process LRU first, then in the shared
+tier (Redis, so every worker and replica of every service sees the same
+entries), and only then loaded from the database or another service:
+
+    data = cache.get_or_set('menu', 'available', load_available_items)
+
+Keys are versioned. Each namespace has a version number in the shared tier
+and every key embeds it, together with KEY_FORMAT (bump it when the shape
+of cached values changes), so invalidating a whole namespace is a single
+INCR and old entries simply expire:
+
+    cache.invalidate_namespace('menu')       # every menu key
+    cache.invalidate('orders', order_id)     # single keys
+
+Invalidations are published on a Redis channel; every process drops the
+affected entries from its LRU when the message arrives. Local entries also
+expire after CACHE_LOCAL_TTL seconds, which bounds staleness if a message
+is lost (the subscriber drops its whole LRU after reconnecting).
+
+Stampede protection: concurrent misses for one key in a process wait for a
+single load, and across processes a short lock in the shared tier lets one
+process load while the others poll for its result (for at most
+CACHE_LOCK_TIMEOUT seconds before loading themselves). Shared TTLs get a
+random jitter so entries written together do not expire together.
+
+Backends (CACHE_BACKEND):
+    redis   shared Redis tier at CACHE_REDIS_URL
+    memory  in-process stand-in for Redis (one process only: tests, benchmarks)
+    none    caching disabled: every lookup calls the loader
+
+Cache errors never fail a request: the shared tier is skipped and the
+value is loaded as if it were not cached.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from shared.json_provider import encode_default
+from shared.replicas import router as replica_router
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the standard library encoder is used
+    orjson = None
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - only the memory backend is available
+    redis = None
+
+# Part of every key: bump it when the shape of cached values changes
+KEY_FORMAT = 1
+
+TTL_JITTER = 0.1  # Shared TTLs vary by up to +/- 10%
+LOCK_POLL_INTERVAL = 0.02  # Seconds between checks for another process's load
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=encode_default).encode()
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class MemoryBackend:
+    """Shared tier kept in this process: the Redis commands the cache uses, with the same semantics"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            return entry[0] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        """Set `key` only if it does not exist; returns whether it was set"""
+        with self._lock:
+            now = time.monotonic()
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = (value, now + ttl if ttl else None)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            value = int(entry[0]) + 1 if entry is not None else 1
+            self._data[key] = (str(value).encode(), entry[1] if entry is not None else None)
+            return value
+
+    def publish(self, channel, message):
+        for callback in list(self._subscribers.get(channel, ())):
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def close(self):
+        pass
+
+
+class RedisBackend:
+    """Shared tier in Redis; invalidations arrive through a subscriber thread"""
+
+    def __init__(self, url, socket_timeout=0.5):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis needs the redis package')
+        self.client = redis.Redis.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+        # The subscriber blocks between messages, so its connection has no read timeout
+        self._subscriber = redis.Redis.from_url(url, socket_connect_timeout=socket_timeout, socket_keepalive=True,
+                                                health_check_interval=30)
+        self._subscriptions = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel, callback):
+        self._subscriptions.append((channel, callback))
+        self.ensure_running()
+
+    def ensure_running(self):
+        if not self._subscriptions or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._listen, name='cache-invalidations', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        callbacks = dict(self._subscriptions)
+        backoff = 0.5
+        while not self._stopping:
+            pubsub = self._subscriber.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(*callbacks)
+                # Messages may have been missed while disconnected
+                for callback in callbacks.values():
+                    callback(None)
+                backoff = 0.5
+                for message in pubsub.listen():
+                    if self._stopping:
+                        break
+                    callbacks[message['channel'].decode()](message['data'])
+            except Exception as e:
+                if not self._stopping:
+                    logger.warning('Cache invalidation channel lost, reconnecting', extra={'error': str(e)})
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+            finally:
+                pubsub.close()
+
+    def close(self):
+        self._stopping = True
+        self.client.close()
+        self._subscriber.close()
+
+    def _reset_after_fork(self):
+        # The subscriber thread did not survive fork(); redis-py replaces the
+        # pooled connections itself when it notices the new pid
+        self._thread = None
+        self._lock = threading.Lock()
+
+
+class LocalLRU:
+    """Bounded in-process tier of encoded values (callers get their own copy); entries expire after a short TTL"""
+
+    def __init__(self, max_items=1000):
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Cache:
+    """The local LRU over the shared tier, with versioned keys and invalidation messages"""
+
+    def __init__(self):
+        self.backend = None
+        self.prefix = f'byteristo:{KEY_FORMAT}'
+        self.default_ttl = 60
+        self.local_ttl = 5
+        self.lock_timeout = 5
+        self.local = LocalLRU()
+        self._versions = {}
+        self._instance = uuid.uuid4().hex
+        self._reset_state()
+
+    def _reset_state(self):
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._generation = 0  # Bumped by every invalidation seen by this process
+        self._failing = False
+        self.counts = {
+            'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'loads': 0,
+            'stampede_waits': 0, 'invalidations': 0, 'errors': 0
+        }
+
+    def init_app(self, app):
+        config = app.config
+        app.extensions['cache'] = self
+        name = config.get('CACHE_BACKEND', 'none')
+        if name == 'redis':
+            backend = RedisBackend(config['CACHE_REDIS_URL'], config.get('CACHE_SOCKET_TIMEOUT', 0.5))
+        elif name == 'memory':
+            backend = MemoryBackend()
+        else:
+            backend = None
+        self.configure(
+            backend,
+            prefix=f"{config.get('CACHE_PREFIX', 'byteristo')}:{KEY_FORMAT}",
+            default_ttl=config.get('CACHE_DEFAULT_TTL', 60),
+            local_ttl=config.get('CACHE_LOCAL_TTL', 5),
+            local_max_items=config.get('CACHE_LOCAL_MAX_ITEMS', 1000),
+            lock_timeout=config.get('CACHE_LOCK_TIMEOUT', 5)
+        )
+        if isinstance(backend, RedisBackend):
+            # Started on the first request so that forked workers get their own subscriber
+            app.before_request(backend.ensure_running)
+
+    def configure(self, backend, prefix=None, default_ttl=None, local_ttl=None, local_max_items=None, lock_timeout=None):
+        """Switch to `backend` (None disables caching) and start listening for invalidations"""
+        if self.backend is not None:
+            self.backend.close()
+        self.backend = backend
+        self.prefix = prefix or self.prefix
+        self.default_ttl = default_ttl if default_ttl is not None else self.default_ttl
+        self.local_ttl = local_ttl if local_ttl is not None else self.local_ttl
+        self.lock_timeout = lock_timeout if lock_timeout is not None else self.lock_timeout
+        self.local = LocalLRU(local_max_items if local_max_items is not None else self.local.max_items)
+        self._versions = {}
+        self._reset_state()
+        if backend is not None:
+            backend.subscribe(self.channel, self._on_message)
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @property
+    def channel(self):
+        return f'{self.prefix}:invalidations'
+
+    @property
+    def stats(self):
+        return {**self.counts, 'enabled': self.enabled, 'local_size': len(self.local)}
+
+    # -- lookups -----------------------------------------------------------
+
+    def get_or_set(self, namespace, key, loader, ttl=None):
+        """The cached value of `key`, or the result of loader() (then cached); values must be JSON-encodable"""
+        if self.backend is None:
+            return loader()
+        full_key = self._key(namespace, key)
+
+        entry = self.local.get(full_key)
+        if entry is not None:
+            self.counts['local_hits'] += 1
+            return _loads(entry[0])
+
+        # One load per key per process; the other threads wait for it
+        with self._inflight_lock:
+            done = self._inflight.get(full_key)
+            leader = done is None
+            if leader:
+                done = self._inflight[full_key] = threading.Event()
+        if not leader:
+            self.counts['stampede_waits'] += 1
+            done.wait(self.lock_timeout)
+            entry = self.local.get(full_key)
+            if entry is not None:
+                return _loads(entry[0])
+            return self._load(full_key, loader, ttl)
+
+        try:
+            return self._load(full_key, loader, ttl)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(full_key, None)
+            done.set()
+
+    def _load(self, full_key, loader, ttl):
+        data = self._shared(self.backend.get, full_key)
+        if data is not None:
+            self.counts['shared_hits'] += 1
+            self.local.set(full_key, data, self.local_ttl)
+            return _loads(data)
+
+        self.counts['misses'] += 1
+        lock_key = f'{full_key}:lock'
+        locked = self._shared(self.backend.add, lock_key, b'1', self.lock_timeout)
+        if locked is False:
+            # Another process is loading this key: use its result when it lands
+            self.counts['stampede_waits'] += 1
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                data = self._shared(self.backend.get, full_key)
+                if data is not None:
+                    self.local.set(full_key, data, self.local_ttl)
+                    return _loads(data)
+
+        try:
+            self.counts['loads'] += 1
+            generation = self._generation
+            # Fill from the primary: a lagging replica could bring back what an invalidation just dropped
+            replica_router.use_primary('cache_fill')
+            data = _dumps(loader())
+            # An invalidation during the load may have made this value obsolete: return it, do not cache it
+            if self._generation == generation:
+                ttl = ttl or self.default_ttl
+                self._shared(self.backend.set, full_key, data, ttl * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER))
+                self.local.set(full_key, data, min(self.local_ttl, ttl))
+            return _loads(data)  # Callers get the same types from a miss as from a hit
+        finally:
+            if locked:
+                self._shared(self.backend.delete, lock_key)
+
+    # -- invalidation ------------------------------------------------------
+
+    def invalidate(self, namespace, *keys):
+        """Drop single keys everywhere"""
+        if self.backend is None or not keys:
+            return
+        full_keys = [self._key(namespace, key) for key in keys]
+        self._generation += 1
+        self.local.delete(*full_keys)
+        self.counts['invalidations'] += len(keys)
+        self._shared(self.backend.delete, *full_keys)
+        self._publish({'keys': full_keys})
+
+    def invalidate_namespace(self, namespace):
+        """Drop every key of `namespace` everywhere, by moving it to a new version"""
+        if self.backend is None:
+            return
+        self.counts['invalidations'] += 1
+        self._generation += 1
+        version = self._shared(self.backend.incr, self._version_key(namespace))
+        if version is None:
+            self._versions.pop(namespace, None)
+            return
+        self._versions[namespace] = (version, time.monotonic() + self.local_ttl)
+        self._publish({'namespace': namespace, 'version': version})
+
+    def _publish(self, message):
+        self._shared(self.backend.publish, self.channel, _dumps({**message, 'origin': self._instance}))
+
+    def _on_message(self, data):
+        self._generation += 1
+        if data is None:
+            # Resubscribed after a disconnect: anything may have changed meanwhile
+            self.local.clear()
+            self._versions = {}
+            return
+        message = _loads(data)
+        if message.get('origin') == self._instance:
+            return
+        if 'keys' in message:
+            self.local.delete(*message['keys'])
+        if 'namespace' in message:
+            self._versions[message['namespace']] = (message['version'], time.monotonic() + self.local_ttl)
+
+    # -- keys --------------------------------------------------------------
+
+    def _version_key(self, namespace):
+        return f'{self.prefix}:{namespace}:version'
+
+    def _version(self, namespace):
+        cached = self._versions.get(namespace)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        data = self._shared(self.backend.get, self._version_key(namespace))
+        version = int(data) if data is not None else 0
+        self._versions[namespace] = (version, time.monotonic() + self.local_ttl)
+        return version
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}:{namespace}:v{self._version(namespace)}:{key}'
+
+    def _shared(self, command, *args):
+        """Run a shared-tier command; errors are counted and logged once, and return None"""
+        try:
+            result = command(*args)
+            if self._failing:
+                self._failing = False
+                logger.info('Shared cache reachable again')
+            return result
+        except Exception as e:
+            self.counts['errors'] += 1
+            if not self._failing:
+                self._failing = True
+                logger.warning('Shared cache unavailable, loading without it', extra={'error': str(e)})
+            return None
+
+    def _reset_after_fork(self):
+        # Threads and their locks do not survive fork(); entries cached by the
+        # parent are still valid but may miss invalidations sent meanwhile
+        self.local.clear()
+        self._versions = {}
+        self._reset_state()
+        if isinstance(self.backend, RedisBackend):
+            self.backend._reset_after_fork()
+
+
+cache = Cache()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=cache._reset_after_fork)
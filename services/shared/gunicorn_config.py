@@ -0,0 +1,80 @@
+"""
+Gunicorn settings shared by the services.
+
+Each service's gunicorn.conf.py loads them with its own defaults and adds
+its post_fork hook:
+
+    globals().update(settings(port=3001, threads=4))
+
+Every setting can be overridden with an environment variable:
+
+    GUNICORN_WORKERS       worker processes (default: 2 x CPUs + 1)
+    GUNICORN_WORKER_CLASS  sync, gthread (default) or, where the service allows
+                           it, gevent
+    GUNICORN_THREADS       threads per gthread worker (default: per service)
+    GUNICORN_WORKER_CONNECTIONS  connections per gevent worker (default: 1000)
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests (default: 1000, 0 = never)
+    GUNICORN_TIMEOUT       seconds before a silent worker is killed and restarted (default: 30)
+    GUNICORN_PRELOAD       import the app once in the master before forking (default: true)
+
+The app is preloaded in the master so workers start fast and share its
+memory pages. Each worker warms up in post_worker_init.
+
+Reloading:
+    kill -HUP <master>   restart the workers gracefully (picks up config changes)
+    kill -USR2 <master>  start a new master with the new code, then
+                         kill -TERM <old master> once it is serving
+"""
+
+import multiprocessing
+import os
+
+WORKER_CLASSES = ('sync', 'gthread')
+
+
+def settings(port, threads, worker_classes=WORKER_CLASSES):
+    """The gunicorn settings for a service listening on `port` by default"""
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    if worker_class not in worker_classes:
+        raise ValueError(f"GUNICORN_WORKER_CLASS={worker_class} is not supported here "
+                         f"(one of: {', '.join(worker_classes)})")
+
+    max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+    return {
+        'bind': f"0.0.0.0:{os.environ.get('PORT', port)}",
+        'worker_class': worker_class,
+        'workers': int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)),
+        'threads': int(os.environ.get('GUNICORN_THREADS', threads)),
+        'worker_connections': int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000)),  # gevent only
+        # Recycle workers now and then to bound slow memory growth; the
+        # jitter keeps them from all restarting at the same moment
+        'max_requests': max_requests,
+        'max_requests_jitter': int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)),
+        'timeout': int(os.environ.get('GUNICORN_TIMEOUT', 30)),
+        'graceful_timeout': int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30)),
+        'keepalive': int(os.environ.get('GUNICORN_KEEPALIVE', 5)),
+        'preload_app': os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true',
+        'accesslog': os.environ.get('GUNICORN_ACCESS_LOG') or None,  # e.g. '-' for stdout
+        'errorlog': '-',
+        'loglevel': os.environ.get('GUNICORN_LOG_LEVEL', 'info'),
+    }
+
+
+def dispose_database_pool(server, worker):
+    """post_fork hook of the services with a database"""
+    # Connections the master may have opened while preloading (STARTUP_BLOCKING)
+    # must not be reused by the children: drop them from the pool without
+    # closing the parent's sockets
+    from models import db
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Warm up (schema check, caches) right away rather than on the first
+    # request; /readyz turns 200 once it is done (shared/startup.py)
+    from shared.startup import readiness
+
+    readiness.ensure_running()
@@ -0,0 +1,168 @@
+"""
+Flask JSON providers shared by the services.
+
+Both providers encode the values the models and raw rows hold directly, so
+to_dict() and the handlers return them as they are:
+
+    Decimal          number
+    datetime, date   ISO 8601 string
+    time             ISO 8601 string
+    UUID             string
+
+json_provider(app) picks OrjsonProvider when orjson is installed and
+JSONProvider (standard library) otherwise. Response bodies are identical
+except for whitespace; keys keep the order the dicts were built in.
+
+MessagePack is negotiated when msgpack is installed. JSON stays the default:
+
+    Accept: application/msgpack        jsonify() answers in MessagePack
+    Content-Type: application/msgpack  request.json decodes a MessagePack body
+                                       (with app.request_class = WireRequest)
+
+The same values go on the wire either way (encode_default). Other services
+decode a response by its Content-Type with loads_body().
+"""
+
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import Request, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the standard library encoder is used
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - JSON only
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def encode_default(value):
+    """Encoding of the non-JSON types the services hand out"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def packb(obj):
+    """MessagePack encoding of a response or request body"""
+    return msgpack.packb(obj, default=encode_default, use_bin_type=True)
+
+
+def unpackb(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def wants_msgpack():
+    """Whether the current request's Accept header prefers MessagePack to JSON"""
+    if msgpack is None or not has_request_context():
+        return False
+    return request.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES
+
+
+def loads_body(app, content, content_type):
+    """Decode another service's response body, MessagePack or JSON by its Content-Type"""
+    if msgpack is not None and (content_type or '').split(';')[0].strip() in MSGPACK_MIMETYPES:
+        return unpackb(content)
+    return app.json.loads(content)
+
+
+class WireRequest(Request):
+    """Request whose get_json() (and request.json) also reads MessagePack bodies"""
+
+    def get_json(self, force=False, silent=False, cache=True):
+        if msgpack is None or self.mimetype not in MSGPACK_MIMETYPES:
+            return super().get_json(force=force, silent=silent, cache=cache)
+        try:
+            return unpackb(self.get_data(cache=cache))
+        except ValueError as e:  # msgpack's decoding errors are ValueErrors
+            if silent:
+                return None
+            return self.on_json_loading_failed(e)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Standard library encoder with Decimal, datetime and UUID support"""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', encode_default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def _negotiated(self, obj):
+        """The MessagePack response when the client asked for it, else None"""
+        if not wants_msgpack():
+            return None
+        return self._vary(self._app.response_class(packb(obj), mimetype=MSGPACK_MIMETYPE))
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        response = self._negotiated(obj)
+        if response is not None:
+            return response
+        body = self.dumps(obj, indent=2) if self._pretty() else self.dumps(obj, separators=(',', ':'))
+        return self._vary(self._app.response_class(f'{body}\n', mimetype=self.mimetype))
+
+    def _vary(self, response):
+        # Caches must key on Accept once the body depends on it
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson encoder and decoder; anything orjson rejects goes through the standard library"""
+
+    def dumps_bytes(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=encode_default, option=option)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, for one
+            return JSONProvider.dumps(self, obj, indent=2 if indent else None).encode()
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        response = self._negotiated(obj)
+        if response is not None:
+            return response
+        return self._vary(self._app.response_class(self.dumps_bytes(obj, self._pretty()) + b'\n',
+                                                   mimetype=self.mimetype))
+
+
+def json_provider(app):
+    """The fastest JSON provider available for `app`"""
+    return (OrjsonProvider if orjson is not None else JSONProvider)(app)
@@ -0,0 +1,299 @@
+"""
+Structured, non-blocking logging for the services.
+
+setup_logging() routes every logger through a QueueHandler: the calling
+thread only captures the record (message, request and trace IDs, extra
+fields) and puts it on a bounded queue. A background QueueListener thread
+redacts, truncates, encodes and writes it to stdout. When the queue is
+full the record is dropped and counted; a request never waits on log I/O.
+
+Output is one JSON object per line (LOG_FORMAT=json, the default) or a
+readable line for development (LOG_FORMAT=text):
+
+    {"ts": "2025-01-18T19:02:11.532Z", "level": "info", "service": "order-service",
+     "logger": "routes.order_routes", "message": "Order created",
+     "request_id": "9f2c...", "trace_id": "4bf9...", "order_number": "ORD-20250118-0042"}
+
+Fields passed with `extra={...}` become top-level keys. Values under keys
+that look sensitive (LOG_REDACT_KEYS, matched word by word: `card` hides
+card_number and cardHolder but not discard_count) are replaced, long
+strings and lists are cut to LOG_MAX_FIELD_LENGTH / LOG_MAX_LIST_ITEMS.
+LOG_SAMPLE_RATES keeps only a share of the records per level (e.g.
+`debug=0.01,info=0.5`); warnings and errors are kept unless listed.
+
+Extra fields are encoded on the logging thread: pass values that the
+handler will not mutate afterwards.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import traceback
+from datetime import datetime, timezone
+
+from shared.tracing import tracer
+
+# Keys whose values never reach the logs (matched case-insensitively, as whole
+# words of the key; a trailing 's' is allowed, so 'cookie' also hides 'cookies')
+DEFAULT_REDACT_KEYS = ('password', 'secret', 'token', 'authorization', 'api_key', 'apikey', 'cookie',
+                       'card', 'cvv', 'iban', 'email', 'phone', 'customer_name')
+
+REDACTED = '[redacted]'
+MAX_DEPTH = 6
+
+# Words of a key: snake_case, kebab-case, camelCase and ACRONYMCase all split
+_WORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'trace_id', 'span_id'
+}
+
+
+def _words(key):
+    return tuple(word.lower() for word in _WORD.findall(str(key)))
+
+
+def parse_sample_rates(value):
+    """'debug=0.01,info=0.5' -> {10: 0.01, 20: 0.5}"""
+    rates = {}
+    for part in (value or '').split(','):
+        if '=' not in part:
+            continue
+        level, rate = part.split('=', 1)
+        level_number = logging.getLevelName(level.strip().upper())
+        if isinstance(level_number, int):
+            rates[level_number] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+class Sanitizer:
+    """Redacts sensitive keys and truncates long values in extra fields"""
+
+    def __init__(self, redact_keys=DEFAULT_REDACT_KEYS, max_length=512, max_items=20):
+        self.redact_keys = tuple(words for words in map(_words, redact_keys) if words)
+        self.max_length = max_length
+        self.max_items = max_items
+
+    def is_sensitive(self, key):
+        words = _words(key)
+        for pattern in self.redact_keys:
+            size = len(pattern)
+            for start in range(len(words) - size + 1):
+                window = words[start:start + size]
+                if window[:-1] == pattern[:-1] and window[-1] in (pattern[-1], pattern[-1] + 's'):
+                    return True
+        return False
+
+    def clean(self, value, depth=0):
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if depth >= MAX_DEPTH:
+            return '...'
+        if isinstance(value, dict):
+            cleaned = {}
+            for position, (key, item) in enumerate(value.items()):
+                if position >= self.max_items:
+                    cleaned['...'] = f'{len(value) - self.max_items} more keys'
+                    break
+                cleaned[str(key)] = REDACTED if self.is_sensitive(key) else self.clean(item, depth + 1)
+            return cleaned
+        if isinstance(value, (list, tuple, set)):
+            items = list(value)
+            cleaned = [self.clean(item, depth + 1) for item in items[:self.max_items]]
+            if len(items) > self.max_items:
+                cleaned.append(f'... {len(items) - self.max_items} more items')
+            return cleaned
+        text = value if isinstance(value, str) else str(value)
+        if len(text) > self.max_length:
+            return f'{text[:self.max_length]}... ({len(text) - self.max_length} more chars)'
+        return text
+
+    def fields(self, record):
+        return {
+            key: REDACTED if self.is_sensitive(key) else self.clean(value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_')
+        }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def __init__(self, service_name, sanitizer):
+        super().__init__()
+        self.service_name = service_name
+        self.sanitizer = sanitizer
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds')
+                  .replace('+00:00', 'Z'),
+            'level': record.levelname.lower(),
+            'service': self.service_name,
+            'logger': record.name,
+            'message': record.message
+        }
+        for key in ('request_id', 'trace_id', 'span_id'):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        entry.update(self.sanitizer.fields(record))
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(JsonFormatter):
+    """Readable single line for development: time level logger [request] message key=value"""
+
+    def format(self, record):
+        fields = ' '.join(f'{key}={json.dumps(value, default=str, ensure_ascii=False)}'
+                          for key, value in self.sanitizer.fields(record).items())
+        request_id = f' [{record.request_id[:8]}]' if getattr(record, 'request_id', None) else ''
+        line = (f"{datetime.fromtimestamp(record.created).strftime('%H:%M:%S.%f')[:-3]} "
+                f"{record.levelname:<7} {record.name}{request_id} {record.message}"
+                f"{' ' + fields if fields else ''}")
+        if record.exc_info:
+            line += '\n' + ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        return line
+
+
+class _SamplingFilter(logging.Filter):
+    def __init__(self, rates, counters):
+        super().__init__()
+        self.rates = rates
+        self.counters = counters
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is None or (rate > 0 and random.random() < rate):
+            return True
+        self.counters['sampled_out'] += 1
+        return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: captures context, enqueues, drops when full"""
+
+    def __init__(self, log_queue, counters):
+        super().__init__(log_queue)
+        self.counters = counters
+
+    def prepare(self, record):
+        # Runs on the calling thread: render the message and grab the context
+        # variables, which the listener thread cannot see
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        record.request_id = tracer.request_id()
+        span = tracer.current_span
+        if span is not None:
+            record.trace_id, record.span_id = span.trace_id, span.span_id
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.counters['dropped'] += 1
+
+
+class LogPipeline:
+    """Queue, queue handler and listener thread behind the root logger"""
+
+    def __init__(self):
+        self.output = None
+        self.handler = None
+        self.listener = None
+        self.queue_size = 10000
+        self.sample_rates = {}
+        self.counters = {'dropped': 0, 'sampled_out': 0}
+        self._lock = threading.Lock()
+
+    def install(self, service_name, level='INFO', log_format='json', sample_rates=None, queue_size=10000,
+                redact_keys=DEFAULT_REDACT_KEYS, max_length=512, max_items=20, stream=None):
+        with self._lock:
+            self.stop()
+            sanitizer = Sanitizer(redact_keys, max_length, max_items)
+            formatter_class = TextFormatter if log_format == 'text' else JsonFormatter
+            self.output = logging.StreamHandler(stream or sys.stdout)
+            self.output.setFormatter(formatter_class(service_name, sanitizer))
+            self.queue_size = queue_size
+            self.sample_rates = sample_rates or {}
+            self._start()
+
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                if isinstance(handler, _DroppingQueueHandler):
+                    root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel(level)
+
+    def _start(self):
+        log_queue = queue.Queue(maxsize=self.queue_size)
+        handler = _DroppingQueueHandler(log_queue, self.counters)
+        handler.addFilter(_SamplingFilter(self.sample_rates, self.counters))
+        if self.handler is not None:
+            root = logging.getLogger()
+            if self.handler in root.handlers:
+                root.removeHandler(self.handler)
+                root.addHandler(handler)
+        self.handler = handler
+        self.listener = logging.handlers.QueueListener(log_queue, self.output, respect_handler_level=True)
+        self.listener.start()
+
+    @property
+    def stats(self):
+        queued = self.handler.queue.qsize() if self.handler is not None else 0
+        return dict(self.counters, queued=queued, queue_size=self.queue_size)
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self.listener is not None:
+            try:
+                self.listener.stop()
+            except Exception:
+                pass
+            self.listener = None
+
+    def _reset_after_fork(self):
+        # The listener thread (and any lock it held) did not survive fork()
+        if self.listener is None:
+            return
+        self._lock = threading.Lock()
+        self.listener = None
+        self._start()
+
+
+pipeline = LogPipeline()
+
+
+def setup_logging(app, service_name):
+    """Send this process's logging through the non-blocking JSON pipeline"""
+    config = app.config
+    redact_keys = DEFAULT_REDACT_KEYS + tuple(
+        key.strip() for key in config.get('LOG_REDACT_KEYS', '').split(',') if key.strip()
+    )
+    pipeline.install(
+        service_name,
+        level=config.get('LOG_LEVEL', 'INFO').upper(),
+        log_format=config.get('LOG_FORMAT', 'json'),
+        sample_rates=parse_sample_rates(config.get('LOG_SAMPLE_RATES', '')),
+        queue_size=int(config.get('LOG_QUEUE_SIZE', 10000)),
+        redact_keys=redact_keys,
+        max_length=int(config.get('LOG_MAX_FIELD_LENGTH', 512)),
+        max_items=int(config.get('LOG_MAX_LIST_ITEMS', 20))
+    )
+    app.extensions['log_pipeline'] = pipeline
+
+
+atexit.register(pipeline.stop)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=pipeline._reset_after_fork)
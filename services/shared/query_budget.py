@@ -0,0 +1,243 @@
+"""
+Per-request query budgets for the services.
+
+SQLAlchemy event hooks count, for every request, the SQL statements run,
+the time spent in them and the time spent waiting for a pooled connection.
+Queries from background threads (outbox, archive, kitchen) are not
+counted. Totals per endpoint are in /health under 'queries'.
+
+A request over its endpoint's budget (QUERY_BUDGETS, else
+QUERY_BUDGET_DEFAULT statements; QUERY_TIME_BUDGET_MS of database time)
+logs a warning with its most repeated statement, which is usually the N+1.
+With QUERY_BUDGET_ACTION = 'raise' (the test config) it raises
+QueryBudgetExceeded instead, so a test that hits the endpoint fails.
+
+With QUERY_DEBUG_HEADERS (development) every response carries:
+
+    X-DB-Queries     statements run
+    X-DB-Time        milliseconds spent in them
+    X-DB-Pool-Wait   milliseconds spent waiting for a connection
+"""
+
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from shared.replicas import router as replica_router
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENT_LENGTH = 200  # Of the repeated statement in the warning
+
+_current = ContextVar('byteristo_request_queries', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised at the end of a request over budget when QUERY_BUDGET_ACTION is 'raise'"""
+
+
+def parse_budgets(value):
+    """'order.create_order=30,menu.get_all_menu_items=5' -> {'order.create_order': 30, ...}"""
+    budgets = {}
+    for part in (value or '').split(','):
+        if '=' in part:
+            endpoint, budget = part.split('=', 1)
+            budgets[endpoint.strip()] = int(budget)
+    return budgets
+
+
+class RequestQueries:
+    """What one request asked of the database"""
+
+    __slots__ = ('queries', 'db_time', 'pool_wait', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.statements = {}
+
+    def most_repeated(self):
+        statement, times = max(self.statements.items(), key=lambda item: item[1], default=(None, 0))
+        return (statement or '')[:MAX_STATEMENT_LENGTH], times
+
+
+class QueryBudget:
+    """Counts the statements of each request and checks them against the endpoint's budget"""
+
+    def __init__(self):
+        self.app = None
+        self.budgets = {}
+        self.default_budget = 0
+        self.time_budget_ms = 0
+        self.action = 'warn'
+        self.debug_headers = False
+        self._instrumented = False
+        self._reset_state()
+
+    def _reset_state(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def init_app(self, app, db):
+        self.app = app
+        config = app.config
+        self.budgets = parse_budgets(config.get('QUERY_BUDGETS', ''))
+        self.default_budget = int(config.get('QUERY_BUDGET_DEFAULT', 20))
+        self.time_budget_ms = float(config.get('QUERY_TIME_BUDGET_MS', 0))
+        self.action = config.get('QUERY_BUDGET_ACTION', 'warn')
+        self.debug_headers = config.get('QUERY_DEBUG_HEADERS', False)
+        self._reset_state()
+        app.extensions['query_budget'] = self
+
+        self.instrument()
+        with app.app_context():
+            engines = list(db.engines.values())
+        engines += [replica.engine for replica in replica_router.replicas]
+        for engine in engines:
+            time_checkouts(engine)
+
+        # First before_request hook, so queries made by the other hooks count too
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._end_request)
+
+    def budget_for(self, endpoint):
+        return self.budgets.get(endpoint, self.default_budget)
+
+    @property
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, totals in sorted(self.endpoints.items()):
+                requests = totals['requests']
+                endpoints[endpoint] = {
+                    'requests': requests,
+                    'budget': self.budget_for(endpoint),
+                    'over_budget': totals['over_budget'],
+                    'avg_queries': round(totals['queries'] / requests, 1),
+                    'max_queries': totals['max_queries'],
+                    'avg_db_ms': round(totals['db_time'] * 1000 / requests, 2),
+                    'avg_pool_wait_ms': round(totals['pool_wait'] * 1000 / requests, 2),
+                    'max_pool_wait_ms': round(totals['max_pool_wait'] * 1000, 2)
+                }
+        return {'default_budget': self.default_budget, 'action': self.action, 'endpoints': endpoints}
+
+    # -- request hooks -----------------------------------------------------
+
+    def _start_request(self):
+        g.query_budget_token = _current.set(RequestQueries())
+
+    def _finish_request(self, response):
+        current = _current.get()
+        endpoint = request.endpoint
+        if current is None or endpoint is None:
+            return response
+        self._add(endpoint, current)
+        if self.debug_headers:
+            response.headers['X-DB-Queries'] = str(current.queries)
+            response.headers['X-DB-Time'] = f'{current.db_time * 1000:.2f}'
+            response.headers['X-DB-Pool-Wait'] = f'{current.pool_wait * 1000:.2f}'
+
+        budget = self.budget_for(endpoint)
+        db_ms = current.db_time * 1000
+        over_count = budget and current.queries > budget
+        over_time = self.time_budget_ms and db_ms > self.time_budget_ms
+        if over_count or over_time:
+            with self._lock:
+                self.endpoints[endpoint]['over_budget'] += 1
+            statement, times = current.most_repeated()
+            details = {
+                'endpoint': endpoint,
+                'queries': current.queries,
+                'budget': budget,
+                'db_ms': round(db_ms, 2),
+                'time_budget_ms': self.time_budget_ms or None,
+                'repeated_statement': statement,
+                'repeated_times': times
+            }
+            if self.action == 'raise':
+                raise QueryBudgetExceeded(f'{endpoint} ran {current.queries} queries ({db_ms:.1f} ms), '
+                                          f'budget {budget}; {times}x: {statement}')
+            logger.warning('Query budget exceeded', extra=details)
+        return response
+
+    def _end_request(self, error=None):
+        token = g.pop('query_budget_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    def _add(self, endpoint, current):
+        with self._lock:
+            totals = self.endpoints.get(endpoint)
+            if totals is None:
+                totals = self.endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0,
+                    'pool_wait': 0.0, 'max_pool_wait': 0.0, 'over_budget': 0
+                }
+            totals['requests'] += 1
+            totals['queries'] += current.queries
+            totals['max_queries'] = max(totals['max_queries'], current.queries)
+            totals['db_time'] += current.db_time
+            totals['pool_wait'] += current.pool_wait
+            totals['max_pool_wait'] = max(totals['max_pool_wait'], current.pool_wait)
+
+    def current(self):
+        """The current request's RequestQueries, or None outside a request"""
+        return _current.get()
+
+    # -- SQLAlchemy hooks --------------------------------------------------
+
+    def instrument(self):
+        if self._instrumented:
+            return
+        self._instrumented = True
+
+        def before(conn, cursor, statement, parameters, context, executemany):
+            if _current.get() is not None and context is not None:
+                context._budget_started = time.perf_counter()
+
+        def after(conn, cursor, statement, parameters, context, executemany):
+            current = _current.get()
+            started = getattr(context, '_budget_started', None)
+            if current is None or started is None:
+                return
+            current.queries += 1
+            current.db_time += time.perf_counter() - started
+            current.statements[statement] = current.statements.get(statement, 0) + 1
+
+        event.listen(Engine, 'before_cursor_execute', before)
+        event.listen(Engine, 'after_cursor_execute', after)
+        # dispose() (e.g. after fork) replaces the pool
+        event.listen(Engine, 'engine_disposed', time_checkouts)
+
+
+def time_checkouts(engine):
+    """Add the time spent getting a connection from `engine`'s pool to the current request"""
+    pool = engine.pool
+    get_connection = pool._do_get
+    if getattr(get_connection, 'timed', False):
+        return
+
+    def timed_get_connection():
+        started = time.perf_counter()
+        try:
+            return get_connection()
+        finally:
+            current = _current.get()
+            if current is not None:
+                current.pool_wait += time.perf_counter() - started
+    timed_get_connection.timed = True
+    pool._do_get = timed_get_connection
+
+
+query_budget = QueryBudget()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=query_budget._reset_state)
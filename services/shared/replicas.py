@@ -0,0 +1,273 @@
+"""
+Read replicas for the services.
+
+Endpoints decorated with @replica_read run their SELECTs on a replica
+from SQLALCHEMY_REPLICA_URIS. Everything else stays on the primary
+(SQLALCHEMY_DATABASE_URI): other endpoints, flushes and DML, background
+threads. Only healthy replicas are used; a background thread checks their lag
+every REPLICA_CHECK_INTERVAL seconds and skips those more than
+REPLICA_MAX_LAG_SECONDS behind. Without a usable replica reads go to the
+primary.
+
+Read-your-writes: successful write responses carry an X-Last-Write header
+(epoch seconds). A read that sends it back is served by the primary until
+a replica has caught up with that moment, for at most
+REPLICA_READ_YOUR_WRITES_SECONDS. `X-Read-Consistency: primary` always
+reads from the primary.
+
+The session class must be RoutingSession:
+
+    db = SQLAlchemy(session_options={'class_': RoutingSession})
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from shared.tracing import tracer
+
+LAST_WRITE_HEADER = 'X-Last-Write'
+CONSISTENCY_HEADER = 'X-Read-Consistency'
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Seconds the replica is behind the primary: 0 when it has replayed
+# everything it received, else the age of the last replayed transaction
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of a @replica_read request to the chosen replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('_read_replica')
+            if replica is not None and not getattr(clause, 'is_dml', False):
+                return replica.engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replica:
+    """One replica engine and its last health check"""
+
+    def __init__(self, url, engine_options):
+        self.url = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_engine(url, **engine_options)
+        self.reads = 0
+        self.reset()
+
+    def reset(self):
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.error = None
+
+    def check(self):
+        with self.engine.connect() as connection:
+            if self.engine.dialect.name == 'postgresql':
+                lag = connection.execute(POSTGRES_LAG_QUERY).scalar()
+            else:
+                connection.execute(text('SELECT 1'))
+                lag = 0  # No replication to measure (e.g. a SQLite copy in development)
+        self.lag = float(lag) if lag is not None else None
+        self.checked_at = time.time()
+        self.healthy = self.lag is not None
+        self.error = None if self.healthy else 'not replicating'
+
+    def caught_up_to(self):
+        """Epoch seconds up to which this replica has every commit of the primary"""
+        return self.checked_at - self.lag
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'lag_s': round(self.lag, 3) if self.lag is not None else None,
+            'checked_at': self.checked_at,
+            'reads': self.reads,
+            'error': self.error
+        }
+
+
+class ReplicaRouter:
+    """Picks the engine of each @replica_read request and keeps the replicas' lag up to date"""
+
+    def __init__(self):
+        self.app = None
+        self.replicas = []
+        self._next = itertools.count()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self.counts = {'primary': 0, 'replica': 0}
+        self.fallbacks = {'forced': 0, 'read_your_writes': 0, 'no_replica': 0, 'replica_miss': 0, 'cache_fill': 0}
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['replica_router'] = self
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        self.replicas = [Replica(url, options) for url in app.config.get('SQLALCHEMY_REPLICA_URIS', [])]
+        if not self.replicas:
+            return
+
+        # Started on the first request so that forked workers get their own thread
+        app.before_request(self.ensure_running)
+        app.after_request(self._stamp_write)
+        logger.info('Read replicas configured', extra={'replicas': [replica.url for replica in self.replicas]})
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    @property
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'reads': dict(self.counts),
+            'primary_fallbacks': dict(self.fallbacks),
+            'replicas': [replica.to_dict() for replica in self.replicas]
+        }
+
+    # -- routing -----------------------------------------------------------
+
+    def choose(self):
+        """The replica for the current request, or None for the primary"""
+        if not self.replicas:
+            return None
+        if request.headers.get(CONSISTENCY_HEADER, '').lower() == 'primary':
+            return self._primary('forced')
+
+        config = self.app.config
+        now = time.time()
+        fresh_after = now - max(3 * config.get('REPLICA_CHECK_INTERVAL', 1.0), 5)
+        max_lag = config.get('REPLICA_MAX_LAG_SECONDS', 5.0)
+        candidates = [replica for replica in self.replicas
+                      if replica.healthy and replica.checked_at >= fresh_after and replica.lag <= max_lag]
+        if not candidates:
+            return self._primary('no_replica')
+
+        last_write = _parse_timestamp(request.headers.get(LAST_WRITE_HEADER))
+        if last_write is not None and now - last_write < config.get('REPLICA_READ_YOUR_WRITES_SECONDS', 10.0):
+            candidates = [replica for replica in candidates if replica.caught_up_to() >= last_write]
+            if not candidates:
+                return self._primary('read_your_writes')
+
+        replica = candidates[next(self._next) % len(candidates)]
+        replica.reads += 1
+        self.counts['replica'] += 1
+        return replica
+
+    def _primary(self, reason):
+        self.fallbacks[reason] += 1
+        self.counts['primary'] += 1
+        return None
+
+    def route(self):
+        """Send the rest of the current request's reads to the chosen replica"""
+        replica = self.choose()
+        g._read_replica = replica
+        span = tracer.current_span
+        if span is not None and self.replicas:
+            span.set_attribute('db.read_source', replica.url if replica is not None else 'primary')
+
+    def on_replica(self):
+        """Whether the current request reads from a replica"""
+        return has_app_context() and g.get('_read_replica') is not None
+
+    def use_primary(self, reason='replica_miss'):
+        """Send the rest of the current request's reads to the primary (e.g. a replica missed a row)"""
+        replica = g.pop('_read_replica', None) if has_app_context() else None
+        if replica is not None:
+            replica.reads -= 1
+            self.counts['replica'] -= 1
+            self._primary(reason)
+
+    def _stamp_write(self, response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            response.headers[LAST_WRITE_HEADER] = f'{time.time():.3f}'
+        return response
+
+    # -- lag checks --------------------------------------------------------
+
+    def ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='replica-checker', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        interval = self.app.config.get('REPLICA_CHECK_INTERVAL', 1.0)
+        while not self._stopping:
+            self.check_once()
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def check_once(self):
+        max_lag = self.app.config.get('REPLICA_MAX_LAG_SECONDS', 5.0)
+        for replica in self.replicas:
+            was_usable = replica.healthy and replica.lag <= max_lag
+            try:
+                replica.check()
+            except Exception as e:
+                replica.healthy = False
+                replica.error = str(e)
+            usable = replica.healthy and replica.lag <= max_lag
+            if was_usable and not usable:
+                logger.warning('Replica skipped', extra={'replica': replica.url, 'lag_s': replica.lag, 'error': replica.error})
+            elif usable and not was_usable:
+                logger.info('Replica in use', extra={'replica': replica.url, 'lag_s': replica.lag})
+
+    def _reset_after_fork(self):
+        # Threads and pooled connections do not survive fork(); the child
+        # checks the replicas again before reading from them
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        for replica in self.replicas:
+            replica.engine.dispose(close=False)
+            replica.reset()
+
+
+def _parse_timestamp(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+router = ReplicaRouter()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=router._reset_after_fork)
+
+
+def replica_read(view):
+    """Serve this read-only endpoint from a replica when one is up to date"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        router.route()
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,434 @@
+"""
+Cold start and readiness for the services.
+
+create_app() does no database I/O. Each process (every gunicorn worker)
+runs a startup thread that:
+
+1. waits for the database (SELECT 1, retried with backoff);
+2. checks the schema version stamped in the `schema_version` table instead
+   of running DDL:
+       no baseline      (no create_all or adopted stamp) empty database:
+                        create_all(), run the service's bootstrap hook,
+                        stamp SCHEMA_VERSION; a database from before
+                        versioning (the service's tables exist) is adopted
+                        at UNVERSIONED_SCHEMA once it has every model
+                        column (see below)
+       older            not ready until the migrations have run
+       equal or newer   ready (newer: a rolling deploy still running old code)
+3. runs the service's warm-up steps (deferred imports, caches, hot queries).
+
+Probes:
+
+    GET /livez   the process is up; no I/O
+    GET /readyz  database reachable, schema current, warm-up done;
+                 503 with the failing checks otherwise
+
+Until the process is ready, other requests wait up to STARTUP_GATE_TIMEOUT
+seconds for it and then get a 503 with Retry-After. STARTUP_BLOCKING runs
+the whole sequence inside create_app() instead (tests, one-off scripts).
+
+Every step is timed; /readyz reports the profile and a warning is logged
+when a cold start takes longer than STARTUP_BUDGET_SECONDS. For a full
+profile of one service (imports included):
+
+    cd services && python -m shared.startup order-management --budget 3 --cprofile startup.prof
+
+A database from before versioning is adopted on startup when it already
+has every column of the models: the tables added since are created, the
+bootstrap hook runs and UNVERSIONED_SCHEMA is stamped, after which the
+usual version check applies, counting any version its migrate_*.py
+scripts stamped before this code first started. Until then it is reported
+outdated with the columns it lacks; the startup thread retries, so it
+adopts the database as soon as the migrations have run.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import jsonify, request
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_TABLE = 'schema_version'
+
+# Version stamped on a database from before versioning: the schema the
+# services had when versioning was introduced
+UNVERSIONED_SCHEMA = 1
+
+# Descriptions of the versions stamped by startup rather than by a migration
+BASELINE_STAMPS = ('create_all', 'adopted')
+
+# Requests answered while the process is still starting
+PROBE_PATHS = ('/livez', '/readyz', '/health')
+
+
+def schema_version_table(metadata):
+    """One row per applied schema version; the highest one is current"""
+    if SCHEMA_TABLE in metadata.tables:
+        return metadata.tables[SCHEMA_TABLE]
+    return Table(
+        SCHEMA_TABLE, metadata,
+        Column('version', Integer, primary_key=True, autoincrement=False),
+        Column('description', String(200)),
+        Column('applied_at', DateTime, nullable=False, default=datetime.utcnow)
+    )
+
+
+def stamp_schema_version(connection, version, description):
+    """Record `version` as applied (for migration scripts)"""
+    table = schema_version_table(MetaData())
+    table.create(connection, checkfirst=True)
+    connection.execute(table.insert().values(version=version, description=description, applied_at=datetime.utcnow()))
+
+
+def missing_columns(connection, metadata):
+    """'table.column' for every model column the database's existing tables lack"""
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for name, table in metadata.tables.items():
+        if name in existing:
+            present = {column['name'] for column in inspector.get_columns(name)}
+            missing += [f'{name}.{column.name}' for column in table.columns if column.name not in present]
+    return missing
+
+
+def process_age():
+    """Seconds since this process started (Linux), or None"""
+    try:
+        with open('/proc/self/stat') as stat_file:
+            started_ticks = int(stat_file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return uptime - started_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """Durations of the startup steps of one process"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.before_app = process_age()  # Interpreter start and imports, before create_app()
+        self.steps = {}
+        self.ready_after = None
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+
+    def cold_start(self):
+        """Seconds from process start (or create_app) until ready"""
+        if self.ready_after is None:
+            return None
+        return self.ready_after + (self.before_app or 0)
+
+    def to_dict(self):
+        cold_start = self.cold_start()
+        return {
+            'before_app_ms': round(self.before_app * 1000, 1) if self.before_app is not None else None,
+            'steps_ms': dict(self.steps),
+            'ready_after_ms': round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+            'cold_start_ms': round(cold_start * 1000, 1) if cold_start is not None else None
+        }
+
+
+class Readiness:
+    """Schema gate, warm-up thread and the /livez and /readyz probes of one service"""
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.schema_version = None
+        self.bootstrap = None
+        self.warmups = []
+        self.profile = StartupProfile()
+        self._reset_state()
+
+    def _reset_state(self):
+        self.schema = {'status': 'unchecked'}
+        self.warmed = []
+        self.last_error = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._attempt_lock = threading.Lock()
+
+    def begin(self):
+        """Start timing a cold start: the first thing create_app() does"""
+        self.profile.reset()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def init_app(self, app, db=None, schema_version=None, bootstrap=None, warmups=()):
+        """
+        Register the probes and the request gate.
+
+        `db` is None for services without a database. `bootstrap()` fills a
+        freshly created schema (it also runs on an adopted one, so it must
+        leave existing rows alone); `warmups` are (name, function) pairs run
+        in an app context before the process reports ready.
+        """
+        self.app = app
+        self.db = db
+        self.schema_version = schema_version
+        self.bootstrap = bootstrap
+        self.warmups = list(warmups)
+        self._reset_state()
+        self.profile.steps['create_app'] = round((time.perf_counter() - self.profile.started) * 1000, 1)
+        if db is not None:
+            schema_version_table(db.metadata)
+        app.extensions['readiness'] = self
+
+        app.add_url_rule('/livez', 'livez', self.livez)
+        app.add_url_rule('/readyz', 'readyz', self.readyz)
+        app.before_request(self._gate)
+
+        if app.config.get('STARTUP_BLOCKING', False):
+            self.warm_up()
+
+    # -- startup sequence ----------------------------------------------------
+
+    def ensure_running(self):
+        if self.ready or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if not self.ready and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='startup', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        backoff = 0.5
+        while not self.warm_up():
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def warm_up(self):
+        """One attempt at the startup sequence; returns True once the process is ready"""
+        with self._attempt_lock:
+            if self.ready:
+                return True
+            with self.app.app_context():
+                try:
+                    if self.db is not None:
+                        with self.profile.step('database'):
+                            self.db.session.execute(text('SELECT 1'))
+                        if self.schema['status'] not in ('current', 'newer'):
+                            with self.profile.step('schema'):
+                                self._check_schema()
+                            if self.schema['status'] not in ('current', 'newer'):
+                                return False
+                    for name, function in self.warmups:
+                        if name not in self.warmed:
+                            with self.profile.step(f'warmup.{name}'):
+                                function()
+                            self.warmed.append(name)
+                    self.last_error = None
+                except Exception as e:
+                    if self.db is not None:
+                        self.db.session.rollback()
+                    if self.last_error != str(e):
+                        logger.warning('Startup not complete, retrying', extra={'error': str(e)})
+                    self.last_error = str(e)
+                    return False
+                finally:
+                    if self.db is not None:
+                        self.db.session.remove()
+
+            self.profile.mark_ready()
+            self._ready.set()
+            self._report()
+            return True
+
+    def _check_schema(self):
+        table = schema_version_table(self.db.metadata)
+        connection = self.db.session.connection()
+        tables = set(inspect(connection).get_table_names())
+        if not self._has_baseline(table, tables):
+            if tables & (set(self.db.metadata.tables) - {SCHEMA_TABLE}):
+                # From before versioning: create_all() would skip the columns added since
+                missing = missing_columns(connection, self.db.metadata)
+                if missing:
+                    self.schema = {'status': 'outdated', 'version': None, 'expected': self.schema_version,
+                                   'missing_columns': missing, 'action': 'run the migrate_*.py scripts'}
+                    logger.error('Database schema predates versioning; run the migrations', extra=self.schema)
+                    return
+                logger.info('Adopting database schema from before versioning', extra={'version': UNVERSIONED_SCHEMA})
+                self._create_schema(table, UNVERSIONED_SCHEMA, 'adopted')
+            elif not self.app.config.get('SCHEMA_AUTO_CREATE', True):
+                self.schema = {'status': 'missing', 'expected': self.schema_version}
+                return
+            else:
+                logger.info('Creating database schema', extra={'version': self.schema_version})
+                self._create_schema(table, self.schema_version, 'create_all')
+
+        version = self.db.session.execute(select(func.max(table.c.version))).scalar()
+        if version is None or version < self.schema_version:
+            self.schema = {'status': 'outdated', 'version': version, 'expected': self.schema_version}
+            logger.error('Database schema is older than the code; run the migrations', extra=self.schema)
+        elif version > self.schema_version:
+            self.schema = {'status': 'newer', 'version': version, 'expected': self.schema_version}
+            logger.warning('Database schema is newer than the code', extra=self.schema)
+        else:
+            self.schema = {'status': 'current', 'version': version}
+
+    def _has_baseline(self, table, tables):
+        # Migration scripts stamp their own versions; the baseline they build
+        # on is stamped here. Without it the schema predates versioning (its
+        # migrations may have run before this code first started)
+        if SCHEMA_TABLE not in tables:
+            return False
+        return self.db.session.execute(
+            select(func.count()).select_from(table).where(table.c.description.in_(BASELINE_STAMPS))
+        ).scalar() > 0
+
+    def _create_schema(self, table, version, description):
+        """Create the tables that do not exist yet, bootstrap them and stamp `version`"""
+        self.db.session.commit()
+        self.db.create_all()
+        if self.bootstrap is not None:
+            self.bootstrap()
+        self.db.session.execute(table.insert().values(
+            version=version, description=description, applied_at=datetime.utcnow()
+        ))
+        self.db.session.commit()
+
+    def _report(self):
+        profile = self.profile.to_dict()
+        budget = self.app.config.get('STARTUP_BUDGET_SECONDS')
+        cold_start = self.profile.cold_start()
+        if budget and cold_start is not None and cold_start > budget:
+            logger.warning('Cold start over budget', extra={'budget_s': budget, **profile})
+        else:
+            logger.info('Ready', extra=profile)
+
+    # -- probes ------------------------------------------------------------
+
+    def livez(self):
+        return jsonify({'status': 'alive'})
+
+    def readyz(self):
+        self.ensure_running()
+        checks = {}
+        if self.db is not None:
+            checks['database'] = self._ping()
+            checks['schema'] = self.schema
+        checks['warmup'] = {
+            'done': list(self.warmed),
+            'pending': [name for name, _ in self.warmups if name not in self.warmed]
+        }
+        ready = self.ready and checks.get('database', {}).get('ok', True)
+        body = {
+            'status': 'ready' if ready else 'not_ready',
+            'checks': checks,
+            'startup': self.profile.to_dict()
+        }
+        if self.last_error:
+            body['last_error'] = self.last_error
+        return jsonify(body), 200 if ready else 503
+
+    def _ping(self):
+        started = time.perf_counter()
+        try:
+            self.db.session.execute(text('SELECT 1'))
+            return {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as e:
+            self.db.session.rollback()
+            return {'ok': False, 'error': str(e)}
+
+    def _gate(self):
+        if self.ready or request.path in PROBE_PATHS:
+            return None
+        self.ensure_running()
+        if self._ready.wait(self.app.config.get('STARTUP_GATE_TIMEOUT', 10)):
+            return None
+        response = jsonify({'success': False, 'message': 'Service is starting', 'error': self.last_error})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+    def _reset_after_fork(self):
+        # Each worker warms its own caches and pools; the thread did not survive fork()
+        ready_in_parent = self.ready
+        schema = self.schema
+        self._reset_state()
+        if ready_in_parent:
+            self.schema = schema  # Checked by the parent (STARTUP_BLOCKING); caches are not inherited
+        self.profile.reset()
+
+
+readiness = Readiness()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=readiness._reset_after_fork)
+
+
+def main(argv=None):
+    """Profile one service's cold start: imports, create_app() and the startup sequence"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('service', help='service directory under services/, e.g. order-management')
+    parser.add_argument('--config', default='production', help='config name (default: %(default)s)')
+    parser.add_argument('--budget', type=float, help='exit with status 1 when the cold start takes longer (seconds)')
+    parser.add_argument('--cprofile', metavar='FILE', help='write cProfile stats of the whole cold start to FILE')
+    args = parser.parse_args(argv)
+
+    services_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    source_dir = os.path.join(services_dir, args.service, 'src')
+    sys.path[:0] = [source_dir, services_dir]
+    os.chdir(source_dir)
+
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    started = time.perf_counter()
+    import app as app_module
+    imported = time.perf_counter()
+    app = app_module.create_app(args.config)
+    service_readiness = app.extensions['readiness']
+    while not service_readiness.warm_up():
+        if time.perf_counter() - started > 60:
+            print(f'not ready after 60 s: {service_readiness.last_error or service_readiness.schema}')
+            return 1
+        time.sleep(0.5)
+    ready = time.perf_counter()
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+
+    total = ready - started
+    print(f"{'imports':<24}{(imported - started) * 1000:>10.1f} ms")
+    for step, duration in service_readiness.profile.steps.items():
+        print(f'{step:<24}{duration:>10.1f} ms')
+    print(f"{'total':<24}{total * 1000:>10.1f} ms")
+    if args.budget is not None and total > args.budget:
+        print(f'over budget: {total:.2f} s > {args.budget:.2f} s')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Named hot statements, prepared server-side on PostgreSQL.
+
+The fixed SQL run on every order or menu request is registered once, at
+import time, and then run through the registry instead of
+db.session.execute():
+
+    SELECT_ITEMS = statements.register('order_items.by_order', text(...))
+    rows = statements.execute(SELECT_ITEMS, {'order_id': order_id}).fetchall()
+
+On PostgreSQL each pooled connection PREPAREs a statement the first time it
+runs it and from then on sends only EXECUTE name(...): the server parses and
+plans it once per connection instead of on every call. Expanding parameters
+(`status IN :allowed`) are prepared as `status = ANY(:allowed)` and sent as
+array literals ('{"ready","delivered"}'), not as ARRAY[...]: psycopg2's
+ARRAY[...] is text[], which the server cannot compare with an enum column
+(order_status), while a literal takes the type the server inferred for the
+parameter when preparing (order_status[]). Rows come back as the driver types them; the typed() column types
+only matter on SQLite. On SQLite, or with PREPARED_STATEMENTS off (e.g.
+behind a transaction-pooling PgBouncer, where a session's prepared
+statements are not kept), statements are executed as before.
+
+Calls, errors and latency per statement are in /health under 'statements'.
+"""
+
+import os
+import re
+import threading
+import time
+
+# Bind parameters the way sqlalchemy.text() finds them
+BIND_PARAM = re.compile(r'(?<![:\w\\]):(\w+)(?!:)')
+
+PREPARED_KEY = 'byteristo_prepared'  # Connection info: server names prepared on the connection
+
+
+def postgres_array(values):
+    """PostgreSQL array literal of `values`, typed by the server like any untyped parameter"""
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        else:
+            items.append('"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(items) + '}'
+
+
+def postgres_forms(server_name, statement):
+    """(PREPARE sql, EXECUTE sql) of a text() statement, or (None, None) when it cannot be prepared"""
+    clause = getattr(statement, 'element', statement)  # typed() wraps the text() clause
+    sql = clause.text
+    for bind in clause._bindparams.values():
+        if bind.expanding:
+            key = re.escape(bind.key)
+            sql = re.sub(rf'\bNOT\s+IN\s+:{key}\b', f'<> ALL(:{bind.key})', sql, flags=re.IGNORECASE)
+            sql, found = re.subn(rf'\bIN\s+:{key}\b', f'= ANY(:{bind.key})', sql, flags=re.IGNORECASE)
+            if not found and f'ALL(:{bind.key})' not in sql:
+                return None, None
+
+    positions = {}
+
+    def number(match):
+        return f'${positions.setdefault(match.group(1), len(positions) + 1)}'
+    body = BIND_PARAM.sub(number, sql)
+    execute = f'EXECUTE {server_name}'
+    if positions:
+        execute += '(' + ', '.join(f'%({key})s' for key in positions) + ')'
+    return f'PREPARE {server_name} AS {body}', execute
+
+
+class NamedStatement:
+    """A registered statement, its PostgreSQL forms and its counters"""
+
+    def __init__(self, name, statement):
+        self.name = name
+        self.statement = statement
+        self.server_name = 'byteristo_' + re.sub(r'\W', '_', name)
+        self.prepare_sql, self.execute_sql = postgres_forms(self.server_name, statement)
+        clause = getattr(statement, 'element', statement)
+        self.array_keys = [bind.key for bind in clause._bindparams.values() if bind.expanding]
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.prepared_calls = 0
+        self.prepares = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def to_dict(self):
+        return {
+            'preparable': self.execute_sql is not None,
+            'calls': self.calls,
+            'prepared_calls': self.prepared_calls,
+            'prepares': self.prepares,
+            'errors': self.errors,
+            'avg_ms': round(self.total_time * 1000 / self.calls, 3) if self.calls else 0,
+            'max_ms': round(self.max_time * 1000, 3)
+        }
+
+
+class StatementRegistry:
+    """The service's named hot statements; runs them prepared where the database allows it"""
+
+    def __init__(self):
+        self.db = None
+        self.enabled = True
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.db = db
+        with app.app_context():
+            dialects = {engine.dialect.name for engine in db.engines.values()}
+        self.enabled = app.config.get('PREPARED_STATEMENTS', True) and 'postgresql' in dialects
+        self._reset_state()
+        app.extensions['statements'] = self
+
+    def _reset_state(self):
+        self._lock = threading.Lock()
+        for statement in self.statements.values():
+            statement.reset()
+
+    def register(self, name, statement):
+        """Register a text() statement (or a typed() one) under `name`; returns the handle to execute"""
+        named = NamedStatement(name, statement)
+        self.statements[name] = named
+        return named
+
+    @property
+    def stats(self):
+        with self._lock:
+            statements = {name: statement.to_dict() for name, statement in sorted(self.statements.items())}
+        return {'enabled': self.enabled, 'statements': statements}
+
+    def execute(self, statement, params=None):
+        """Run a registered statement in the current session; returns what db.session.execute() would"""
+        session = self.db.session
+        params = params or {}
+        prepared = False
+        if self.enabled and statement.execute_sql is not None:
+            bind = session.get_bind(clause=statement.statement)  # The primary or this request's replica
+            prepared = bind.dialect.name == 'postgresql'
+        started = time.perf_counter()
+        try:
+            if prepared:
+                connection = session.connection(bind_arguments={'bind': bind})
+                self._prepare(connection, statement)
+                if statement.array_keys:
+                    params = {**params, **{key: postgres_array(params[key]) for key in statement.array_keys}}
+                result = connection.exec_driver_sql(statement.execute_sql, params)
+            else:
+                result = session.execute(statement.statement, params)
+        except Exception:
+            with self._lock:
+                statement.errors += 1
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            statement.calls += 1
+            statement.prepared_calls += prepared
+            statement.total_time += elapsed
+            statement.max_time = max(statement.max_time, elapsed)
+        return result
+
+    def _prepare(self, connection, statement):
+        # Kept with the pooled connection: a new or recycled connection starts empty
+        prepared = connection.connection.info.setdefault(PREPARED_KEY, set())
+        if statement.server_name in prepared:
+            return
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(statement.prepare_sql)
+        finally:
+            cursor.close()
+        prepared.add(statement.server_name)
+        with self._lock:
+            statement.prepares += 1
+
+
+statements = StatementRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=statements._reset_state)
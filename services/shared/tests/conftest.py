@@ -0,0 +1,23 @@
+"""
+Fixtures for the tests of the shared package: a bare Flask app, without a
+service's models or config.
+
+Run from shared/ (each service's tests run from its own directory):
+
+    cd services/shared && python -m pytest
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # services/
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    return app
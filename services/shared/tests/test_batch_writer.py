@@ -0,0 +1,56 @@
+"""Background batch writer (batch_writer.py)"""
+
+import time
+
+import pytest
+
+from shared.batch_writer import BatchWriter
+
+
+class ListWriter(BatchWriter):
+    thread_name = 'list-writer'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.batches = []
+
+    def write(self, batch):
+        self.batches.append(batch)
+
+    def written(self):
+        return [item for batch in self.batches for item in batch]
+
+
+def test_write_is_abstract():
+    with pytest.raises(TypeError):
+        BatchWriter()
+
+
+def test_full_queue_refuses_items():
+    writer = ListWriter(max_queue=2)
+    writer._ensure_running = lambda: None  # Nothing drains the queue
+    assert [writer.submit(item) for item in range(3)] == [True, True, False]
+    writer.flush()
+    assert writer.batches == [[0, 1]] and writer.queued == 0
+
+
+def test_thread_writes_batches():
+    writer = ListWriter(flush_interval=0.05, batch_size=2)
+    for item in range(3):
+        assert writer.submit(item)
+
+    deadline = time.monotonic() + 2
+    while len(writer.written()) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Batches of at most batch_size, in order
+    assert writer.written() == [0, 1, 2]
+    assert all(len(batch) <= 2 for batch in writer.batches)
+    assert writer._thread.name == 'list-writer'
+
+
+def test_fork_starts_empty():
+    writer = ListWriter(max_queue=5)
+    writer._ensure_running = lambda: None
+    writer.submit('parent')
+    writer._reset_after_fork()
+    assert writer.queued == 0 and writer._queue.maxsize == 5
@@ -0,0 +1,71 @@
+"""JSON providers (json_provider.py): the orjson and standard library providers answer alike"""
+
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import pytest
+from flask import jsonify
+
+from shared.json_provider import JSONProvider, OrjsonProvider, json_provider, orjson
+
+ORDER = {
+    'id': uuid.UUID('7d0c4d1e-5b3f-4f8e-9a2b-1c3d5e7f9a0b'),
+    'total_amount': Decimal('17.50'),
+    'created_at': datetime(2026, 3, 14, 20, 15, 30, 250000),
+    'service_day': date(2026, 3, 14),
+    'opens_at': time(19, 0),
+    'status': 'confirmed',
+    'notes': 'senza glutine, più basilico',
+    'items': [{'quantity': 2, 'unit_price': 7.5}]
+}
+
+needs_orjson = pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+
+EXPECTED = {
+    'id': '7d0c4d1e-5b3f-4f8e-9a2b-1c3d5e7f9a0b',
+    'total_amount': 17.5,
+    'created_at': '2026-03-14T20:15:30.250000',
+    'service_day': '2026-03-14',
+    'opens_at': '19:00:00',
+    'status': 'confirmed',
+    'notes': 'senza glutine, più basilico',
+    'items': [{'quantity': 2, 'unit_price': 7.5}]
+}
+
+
+@pytest.fixture(params=[JSONProvider, pytest.param(OrjsonProvider, marks=needs_orjson)])
+def provider_app(app, request):
+    app.json = request.param(app)
+
+    @app.route('/order')
+    def order():
+        return jsonify(ORDER)
+
+    return app
+
+
+def test_model_values_encoded(provider_app):
+    response = provider_app.test_client().get('/order')
+    assert response.mimetype == 'application/json'
+    body = response.get_data(as_text=True)
+    assert json.loads(body) == EXPECTED
+    assert list(json.loads(body)) == list(ORDER)  # Keys keep the order the dict was built in
+
+
+@needs_orjson
+def test_providers_agree(app):
+    # Same body, whitespace aside, and both read what they wrote
+    standard, fast = JSONProvider(app), OrjsonProvider(app)
+    assert json.loads(standard.dumps(ORDER)) == json.loads(fast.dumps(ORDER)) == EXPECTED
+    assert fast.loads(fast.dumps(ORDER)) == standard.loads(standard.dumps(ORDER))
+
+
+@needs_orjson
+def test_orjson_falls_back_for_big_integers(app):
+    assert json.loads(OrjsonProvider(app).dumps({'change_seq': 2 ** 70})) == {'change_seq': 2 ** 70}
+
+
+def test_fastest_provider_picked(app):
+    assert type(json_provider(app)) is (OrjsonProvider if orjson is not None else JSONProvider)
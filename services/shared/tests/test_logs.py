@@ -0,0 +1,105 @@
+"""Structured logging (logs.py): redaction, truncation, sampling, and export failures reaching the logs"""
+
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+from shared import logs
+from shared.logs import REDACTED, LogPipeline, Sanitizer, _DroppingQueueHandler
+from shared.tracing import KIND_SERVER, Span, SpanExporter, Tracer
+
+
+@pytest.fixture
+def output():
+    """A pipeline writing JSON lines to a buffer; call the returned function to read them"""
+    pipeline = LogPipeline()
+    stream = io.StringIO()
+    pipeline.install('test-service', level='DEBUG', sample_rates={logging.INFO: 0.5}, max_length=20,
+                     max_items=3, stream=stream)
+
+    def lines():
+        pipeline.stop()  # Flushes the queue
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield lines
+    pipeline.stop()
+    logging.getLogger().removeHandler(pipeline.handler)
+
+
+@pytest.mark.parametrize('key', ['card_number', 'cardHolder', 'X-Api-Key', 'access_token', 'cookies',
+                                 'customer_name', 'Authorization'])
+def test_sensitive_keys_redacted(key):
+    assert Sanitizer().is_sensitive(key)
+
+
+@pytest.mark.parametrize('key', ['discard_count', 'customer_id', 'payment_method', 'order_number', 'emailed'])
+def test_keys_containing_a_sensitive_word_kept(key):
+    # Matched word by word, not as substrings
+    assert not Sanitizer().is_sensitive(key)
+
+
+def test_configured_keys_redacted():
+    sanitizer = Sanitizer(logs.DEFAULT_REDACT_KEYS + ('loyalty_id',))
+    assert sanitizer.clean({'LoyaltyId': 'L-42', 'loyalty_points': 10}) == {'LoyaltyId': REDACTED,
+                                                                             'loyalty_points': 10}
+
+
+def test_record_fields_cleaned(output, monkeypatch):
+    monkeypatch.setattr(logs.random, 'random', lambda: 0.1)
+    logging.getLogger('payments').warning('Card declined', extra={
+        'card_number': '4111 1111 1111 1111',
+        'discard_count': 2,
+        'payment': {'method': 'card', 'card': {'cvv': '123'}},
+        'note': 'x' * 30,
+        'order_ids': ['a', 'b', 'c', 'd']
+    })
+
+    [entry] = output()
+    assert entry['level'] == 'warning' and entry['logger'] == 'payments' and entry['message'] == 'Card declined'
+    assert entry['card_number'] == REDACTED
+    assert entry['discard_count'] == 2
+    assert entry['payment'] == {'method': 'card', 'card': REDACTED}
+    assert entry['note'] == 'x' * 20 + '... (10 more chars)'
+    assert entry['order_ids'] == ['a', 'b', 'c', '... 1 more items']
+
+
+def test_sampled_levels(output, monkeypatch):
+    monkeypatch.setattr(logs.random, 'random', lambda: 0.7)  # Above the info rate of 0.5
+    logger = logging.getLogger('kitchen')
+    logger.info('Item bumped')
+    logger.warning('Station backed up')
+    logger.debug('Not sampled: kept')
+
+    assert [entry['message'] for entry in output()] == ['Station backed up', 'Not sampled: kept']
+
+
+def test_full_queue_drops_records():
+    counters = {'dropped': 0, 'sampled_out': 0}
+    handler = _DroppingQueueHandler(queue.Queue(maxsize=1), counters)
+    logger = logging.getLogger('flood')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for _ in range(3):
+            logger.warning('Printer offline')
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+    assert counters['dropped'] == 2 and handler.queue.qsize() == 1
+
+
+def test_span_export_failure_logged(tmp_path, caplog):
+    exporter = SpanExporter()
+    exporter.configure('test-service', file_path=str(tmp_path))  # A directory: the write fails
+    span = Span(Tracer(), 'GET /orders', KIND_SERVER, '0' * 32, None)
+    span.end_ns = span.start_ns
+
+    with caplog.at_level(logging.WARNING, logger='shared.tracing'):
+        exporter.write([span])
+
+    assert exporter.stats['dropped'] == 1 and exporter.stats['last_error']
+    [record] = [record for record in caplog.records if record.name == 'shared.tracing']
+    assert record.getMessage() == 'Span export failed' and record.spans == 1
@@ -0,0 +1,65 @@
+"""Query budgets (query_budget.py): requests over their endpoint's budget warn, or raise in tests"""
+
+import logging
+
+import pytest
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from shared.query_budget import QueryBudgetExceeded, query_budget
+
+
+@pytest.fixture
+def budgeted(app):
+    """An app whose /items/<n> runs n statements; returns a function configuring and initializing it"""
+    db = SQLAlchemy()
+
+    @app.route('/items/<int:count>')
+    def items(count):
+        for _ in range(count):
+            db.session.execute(text('SELECT 1')).scalar()
+        return {'count': count}
+
+    def configure(**config):
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', QUERY_BUDGET_DEFAULT=3, QUERY_DEBUG_HEADERS=True,
+                          **config)
+        db.init_app(app)
+        query_budget.init_app(app, db)
+        return app.test_client()
+
+    return configure
+
+
+def test_under_budget(budgeted, caplog):
+    client = budgeted()
+    with caplog.at_level(logging.WARNING, logger='shared.query_budget'):
+        response = client.get('/items/3')
+    assert response.headers['X-DB-Queries'] == '3'
+    assert not caplog.records
+    assert query_budget.stats['endpoints']['items']['over_budget'] == 0
+
+
+def test_over_budget_warns_with_repeated_statement(budgeted, caplog):
+    client = budgeted()
+    with caplog.at_level(logging.WARNING, logger='shared.query_budget'):
+        assert client.get('/items/5').status_code == 200
+
+    [record] = caplog.records
+    assert record.getMessage() == 'Query budget exceeded'
+    assert (record.queries, record.budget) == (5, 3)
+    assert (record.repeated_statement, record.repeated_times) == ('SELECT 1', 5)
+    totals = query_budget.stats['endpoints']['items']
+    assert totals['over_budget'] == 1 and totals['max_queries'] == 5
+
+
+def test_endpoint_budget_overrides_default(budgeted, caplog):
+    client = budgeted(QUERY_BUDGETS='items=10')
+    with caplog.at_level(logging.WARNING, logger='shared.query_budget'):
+        client.get('/items/5')
+    assert not caplog.records
+
+
+def test_raise_action_fails_the_request(budgeted):
+    client = budgeted(QUERY_BUDGET_ACTION='raise')
+    with pytest.raises(QueryBudgetExceeded, match=r'items ran 5 queries .* budget 3; 5x: SELECT 1'):
+        client.get('/items/5')
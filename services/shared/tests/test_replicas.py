@@ -0,0 +1,88 @@
+"""Read replicas (replicas.py): lagging, stale and failing replicas are skipped"""
+
+import logging
+import time
+
+import pytest
+
+from shared.replicas import CONSISTENCY_HEADER, LAST_WRITE_HEADER, ReplicaRouter
+
+
+@pytest.fixture
+def router(app, tmp_path):
+    app.config.update(SQLALCHEMY_REPLICA_URIS=[f'sqlite:///{tmp_path}/replica-a.db',
+                                               f'sqlite:///{tmp_path}/replica-b.db'],
+                      REPLICA_MAX_LAG_SECONDS=5.0)
+    router = ReplicaRouter()
+    router.init_app(app)
+    router.check_once()
+    return router
+
+
+def lag(monkeypatch, replica, seconds):
+    """Make the replica's checks report `seconds` of lag"""
+    def check():
+        replica.lag, replica.checked_at, replica.healthy, replica.error = seconds, time.time(), True, None
+    monkeypatch.setattr(replica, 'check', check)
+
+
+def chosen(app, router, headers=None):
+    with app.test_request_context('/api/menu', headers=headers or {}):
+        replica = router.choose()
+    return replica.url if replica is not None else 'primary'
+
+
+def test_reads_spread_over_replicas(app, router):
+    urls = [replica.url for replica in router.replicas]
+    assert [chosen(app, router) for _ in range(4)] == urls * 2
+    assert router.stats['reads'] == {'primary': 0, 'replica': 4}
+
+
+def test_lagging_replica_skipped(app, router, monkeypatch, caplog):
+    behind, current = router.replicas
+    lag(monkeypatch, behind, 30.0)
+
+    with caplog.at_level(logging.INFO, logger='shared.replicas'):
+        router.check_once()
+    assert [record.getMessage() for record in caplog.records] == ['Replica skipped']
+    assert {chosen(app, router) for _ in range(3)} == {current.url}
+
+    # Caught up again: back in the rotation
+    lag(monkeypatch, behind, 0.5)
+    router.check_once()
+    assert {chosen(app, router) for _ in range(2)} == {behind.url, current.url}
+
+
+def test_primary_when_no_replica_usable(app, router, monkeypatch):
+    first, second = router.replicas
+    lag(monkeypatch, first, 30.0)
+    monkeypatch.setattr(second, 'check', lambda: 1 / 0)  # Unreachable
+    router.check_once()
+
+    assert not second.healthy and second.error
+    assert chosen(app, router) == 'primary'
+    assert router.fallbacks['no_replica'] == 1
+
+
+def test_stale_check_not_trusted(app, router):
+    for replica in router.replicas:
+        replica.checked_at -= 60  # The checker thread stopped
+    assert chosen(app, router) == 'primary'
+
+
+def test_read_your_writes(app, router, monkeypatch):
+    first, second = router.replicas
+    lag(monkeypatch, first, 3.0)
+    router.check_once()
+    written = time.time() - 1  # One second ago: only the replica without lag has it
+
+    assert {chosen(app, router, {LAST_WRITE_HEADER: f'{written:.3f}'}) for _ in range(2)} == {second.url}
+    lag(monkeypatch, second, 3.0)
+    router.check_once()
+    assert chosen(app, router, {LAST_WRITE_HEADER: f'{written:.3f}'}) == 'primary'
+    assert router.fallbacks['read_your_writes'] == 1
+
+
+def test_primary_forced(app, router):
+    assert chosen(app, router, {CONSISTENCY_HEADER: 'primary'}) == 'primary'
+    assert router.fallbacks['forced'] == 1
@@ -0,0 +1,85 @@
+"""Request IDs and spans (tracing.py)"""
+
+import json
+
+import pytest
+
+from shared.tracing import REQUEST_ID_HEADER, TRACEPARENT_HEADER, Tracer
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+@pytest.fixture
+def traced(app, tmp_path, monkeypatch):
+    """The app with its own tracer writing to a file; spans are written on flush() only"""
+    app.config['TRACE_FILE'] = str(tmp_path / 'spans.jsonl')
+    tracer = Tracer()
+    monkeypatch.setattr(tracer.exporter, '_ensure_running', lambda: None)
+    tracer.init_app(app, 'test-service')
+
+    @app.route('/orders')
+    def orders():
+        with tracer.span('validate', rows=3):
+            headers = tracer.outgoing_headers()
+        return {'headers': headers}
+
+    return tracer
+
+
+def exported(tracer):
+    tracer.exporter.flush()
+    spans = []
+    with open(tracer.exporter.file_path) as lines:
+        for line in lines:
+            resource = json.loads(line)['resourceSpans'][0]
+            assert resource['resource']['attributes'][0]['value'] == {'stringValue': 'test-service'}
+            spans.extend(resource['scopeSpans'][0]['spans'])
+    return {span['name']: span for span in spans}
+
+
+def test_request_id_echoed_and_passed_on(app, traced):
+    client = app.test_client()
+
+    response = client.get('/orders', headers={REQUEST_ID_HEADER: 'terminal-7.42'})
+    assert response.headers[REQUEST_ID_HEADER] == 'terminal-7.42'
+    assert response.get_json()['headers'] == {REQUEST_ID_HEADER: 'terminal-7.42'}  # Not sampled: no traceparent
+
+    # Unusable IDs are replaced
+    response = client.get('/orders', headers={REQUEST_ID_HEADER: 'no spaces allowed'})
+    assert response.headers[REQUEST_ID_HEADER] != 'no spaces allowed'
+    assert traced.exporter.queued == 0
+
+
+def test_sampled_caller_continues_its_trace(app, traced):
+    response = app.test_client().get('/orders', headers={TRACEPARENT_HEADER: f'00-{TRACE_ID}-{PARENT_ID}-01'})
+
+    spans = exported(traced)
+    assert set(spans) == {'GET /orders', 'routing', 'validate'}
+    server = spans['GET /orders']
+    assert server['traceId'] == TRACE_ID and server['parentSpanId'] == PARENT_ID
+    assert spans['routing']['parentSpanId'] == spans['validate']['parentSpanId'] == server['spanId']
+    assert {'key': 'http.status_code', 'value': {'intValue': '200'}} in server['attributes']
+    assert {'key': 'rows', 'value': {'intValue': '3'}} in spans['validate']['attributes']
+
+    # Calls made inside the span carry it as their parent
+    outgoing = response.get_json()['headers'][TRACEPARENT_HEADER]
+    assert outgoing == f"00-{TRACE_ID}-{spans['validate']['spanId']}-01"
+
+
+def test_unsampled_caller_not_traced(app, traced):
+    traced.sample_rate = 1.0  # Applies only where a trace starts
+    app.test_client().get('/orders', headers={TRACEPARENT_HEADER: f'00-{TRACE_ID}-{PARENT_ID}-00'})
+    assert traced.exporter.queued == 0
+
+
+def test_failed_request_marks_its_span(app, traced):
+    @app.route('/broken')
+    def broken():
+        raise RuntimeError('kitchen printer offline')
+
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    assert app.test_client().get('/broken', headers={
+        TRACEPARENT_HEADER: f'00-{TRACE_ID}-{PARENT_ID}-01'}).status_code == 500
+
+    assert exported(traced)['GET /broken']['status']['code'] == 2
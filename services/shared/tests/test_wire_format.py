@@ -0,0 +1,63 @@
+"""MessagePack negotiation (json_provider.py): asked for by Accept, JSON whenever it cannot be used"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import jsonify, request
+
+from shared import json_provider as wire
+from shared.json_provider import JSON_MIMETYPE, MSGPACK_MIMETYPE, WireRequest, json_provider, loads_body
+
+pytestmark = pytest.mark.skipif(wire.msgpack is None, reason='msgpack is not installed')
+
+ORDER = {'table_number': 4, 'total_amount': Decimal('17.50'), 'created_at': datetime(2026, 3, 14, 20, 15)}
+DECODED = {'table_number': 4, 'total_amount': 17.5, 'created_at': '2026-03-14T20:15:00'}
+
+
+@pytest.fixture
+def client(app):
+    app.json = json_provider(app)
+    app.request_class = WireRequest
+
+    @app.route('/order', methods=['GET', 'POST'])
+    def order():
+        return jsonify(request.json if request.method == 'POST' else ORDER)
+
+    return app.test_client()
+
+
+def decoded(app, response):
+    return loads_body(app, response.get_data(), response.headers['Content-Type'])
+
+
+@pytest.mark.parametrize('accept, mimetype', [
+    (MSGPACK_MIMETYPE, MSGPACK_MIMETYPE),
+    ('application/x-msgpack', MSGPACK_MIMETYPE),
+    (f'{MSGPACK_MIMETYPE}, {JSON_MIMETYPE};q=0.5', MSGPACK_MIMETYPE),
+    (f'{JSON_MIMETYPE}, {MSGPACK_MIMETYPE};q=0.5', JSON_MIMETYPE),
+    ('*/*', JSON_MIMETYPE),  # JSON stays the default
+    ('text/html', JSON_MIMETYPE),
+    (None, JSON_MIMETYPE),
+])
+def test_negotiated(app, client, accept, mimetype):
+    response = client.get('/order', headers={'Accept': accept} if accept else {})
+    assert response.mimetype == mimetype
+    assert 'Accept' in response.vary
+    assert decoded(app, response) == DECODED
+
+
+def test_json_without_msgpack(app, client, monkeypatch):
+    monkeypatch.setattr(wire, 'msgpack', None)
+    response = client.get('/order', headers={'Accept': MSGPACK_MIMETYPE})
+    assert response.mimetype == JSON_MIMETYPE and 'Accept' not in response.vary
+    assert decoded(app, response) == DECODED
+
+
+def test_msgpack_request_body(app, client):
+    response = client.post('/order', data=wire.packb(ORDER), content_type=MSGPACK_MIMETYPE)
+    assert response.get_json() == DECODED
+
+
+def test_malformed_msgpack_body_refused(client):
+    assert client.post('/order', data=b'\xc1', content_type=MSGPACK_MIMETYPE).status_code == 400
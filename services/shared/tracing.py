@@ -0,0 +1,379 @@
+"""
+Request IDs and timing spans across the services.
+
+Every request gets a request ID: the client's X-Request-ID header when it
+sends a usable one, a new one otherwise. It is echoed in the response and
+passed on, with a W3C `traceparent` header, on every call to another
+service (see outgoing_headers()), so one ID follows an order from the
+gateway through order-management to the menu service.
+
+Sampled requests also record timing spans:
+
+    server   the whole request, one per service hop
+    routing  WSGI entry to the first before_request hook (URL matching,
+             request context setup)
+    db       every SQL statement (SQLAlchemy engine events), e.g. `db SELECT`
+    client   calls to other services (proxy_request, order -> menu)
+    custom   `with tracer.span('validate'):` around interesting blocks
+
+The sampling decision is taken once, where the trace starts (normally the
+gateway), with probability TRACE_SAMPLE_RATE, and travels in the
+traceparent flags so downstream services keep or drop the same traces.
+A caller can force a trace by sending a sampled traceparent.
+
+Finished spans are queued and written by a background thread (see
+batch_writer.py), in OpenTelemetry's OTLP/JSON encoding: one
+`{"resourceSpans": [...]}` object per line to TRACE_FILE (readable by the
+collector's otlpjsonfile receiver), and/or POSTed to an OTLP/HTTP endpoint
+(TRACE_ENDPOINT, e.g. http://otel-collector:4318/v1/traces). A full queue
+drops spans instead of slowing requests down.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import time
+import urllib.request
+import uuid
+
+from shared.batch_writer import BatchWriter
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TRACEPARENT_HEADER = 'traceparent'
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# Longest SQL statement kept on a db span
+MAX_STATEMENT_LENGTH = 1000
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+_current_request_id = contextvars.ContextVar('request_id', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+def _new_id(bytes_count):
+    return random.getrandbits(bytes_count * 8).to_bytes(bytes_count, 'big').hex()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+class Span:
+    """One timed operation; ended spans are handed to the exporter"""
+
+    __slots__ = ('tracer', 'name', 'kind', 'trace_id', 'span_id', 'parent_id',
+                 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, tracer, name, kind, trace_id, parent_id, start_ns=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.error = str(message)[:500]
+
+    def child(self, name, kind=KIND_INTERNAL, start_ns=None, attributes=None):
+        return Span(self.tracer, name, kind, self.trace_id, self.span_id, start_ns, attributes)
+
+    def end(self, end_ns=None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            self.tracer.exporter.export(self)
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 0}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class SpanExporter(BatchWriter):
+    """Background thread that batches finished spans to a file and/or an OTLP/HTTP endpoint"""
+
+    thread_name = 'span-exporter'
+
+    def __init__(self):
+        super().__init__()
+        self.service_name = 'unknown'
+        self.file_path = None
+        self.endpoint = None
+        self.stats = {'exported': 0, 'dropped': 0, 'last_error': None}
+
+    def configure(self, service_name, file_path=None, endpoint=None, flush_interval=1.0, max_queue=10000):
+        self.service_name = service_name
+        self.file_path = file_path or None
+        self.endpoint = endpoint or None
+        self.flush_interval = flush_interval
+        self.set_max_queue(max_queue)
+
+    @property
+    def enabled(self):
+        return bool(self.file_path or self.endpoint)
+
+    def export(self, span):
+        if self.enabled and not self.submit(span):
+            self.stats['dropped'] += 1
+
+    def encode(self, spans):
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'byteristo.tracing'},
+                    'spans': [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+
+    def write(self, spans):
+        payload = json.dumps(self.encode(spans), separators=(',', ':'))
+        try:
+            if self.file_path:
+                # One O_APPEND write per batch: workers and services can share a file
+                fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, (payload + '\n').encode('utf-8'))
+                finally:
+                    os.close(fd)
+            if self.endpoint:
+                request = urllib.request.Request(self.endpoint, data=payload.encode('utf-8'), method='POST',
+                                                 headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+            self.stats['exported'] += len(spans)
+        except Exception as e:
+            self.stats['dropped'] += len(spans)
+            self.stats['last_error'] = str(e)
+            logger.warning('Span export failed', extra={'spans': len(spans), 'error': str(e)})
+
+
+class Tracer:
+    """Request IDs, trace context propagation and span recording for one service"""
+
+    def __init__(self):
+        self.exporter = SpanExporter()
+        self.sample_rate = 0.0
+        self.service_name = 'unknown'
+        self._sqlalchemy_instrumented = False
+
+    def init_app(self, app, service_name):
+        config = app.config
+        self.service_name = service_name
+        self.sample_rate = float(config.get('TRACE_SAMPLE_RATE', 0.0))
+        self.exporter.configure(
+            service_name,
+            file_path=config.get('TRACE_FILE'),
+            endpoint=config.get('TRACE_ENDPOINT'),
+            flush_interval=float(config.get('TRACE_FLUSH_INTERVAL', 1.0)),
+            max_queue=int(config.get('TRACE_MAX_QUEUE', 10000))
+        )
+        app.extensions['tracer'] = self
+
+        app.wsgi_app = _StampStart(app.wsgi_app)
+        # First before_request hook, so the routing span ends before any other hook runs
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._end_request)
+
+    # -- request lifecycle ---------------------------------------------------
+
+    def _start_request(self):
+        from flask import g, request
+
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.trace_tokens = [_current_request_id.set(request_id)]
+
+        parent = _TRACEPARENT.match(request.headers.get(TRACEPARENT_HEADER, ''))
+        if parent:
+            trace_id, parent_id, sampled = parent.group(1), parent.group(2), int(parent.group(3), 16) & 1
+        else:
+            trace_id, parent_id = _new_id(16), None
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled:
+            return
+
+        started = request.environ.get('byteristo.start_ns')
+        route = request.url_rule.rule if request.url_rule else request.path
+        span = Span(self, f'{request.method} {route}', KIND_SERVER, trace_id, parent_id, started, {
+            'http.method': request.method,
+            'http.route': route,
+            'http.target': request.full_path.rstrip('?'),
+            'http.request_id': request_id
+        })
+        span.child('routing', start_ns=started).end()
+        g.trace_span = span
+        g.trace_tokens.append(_current_span.set(span))
+
+    def _finish_request(self, response):
+        from flask import g
+
+        request_id = getattr(g, 'request_id', None)
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        span = getattr(g, 'trace_span', None)
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.set_error(f'HTTP {response.status_code}')
+        return response
+
+    def _end_request(self, error=None):
+        from flask import g
+
+        span = g.pop('trace_span', None)
+        if span is not None:
+            if error is not None:
+                span.set_error(repr(error))
+            span.end()
+        for token in reversed(g.pop('trace_tokens', [])):
+            token.var.reset(token)
+
+    # -- spans ---------------------------------------------------------------
+
+    @property
+    def current_span(self):
+        return _current_span.get()
+
+    def request_id(self):
+        """ID of the request being handled, or None outside a request"""
+        return _current_request_id.get()
+
+    def span(self, name, kind=KIND_INTERNAL, **attributes):
+        """Context manager timing a block as a child of the current span (a no-op when not sampled)"""
+        return _SpanContext(self, name, kind, attributes)
+
+    def outgoing_headers(self):
+        """Headers that carry the request ID and trace context to another service"""
+        headers = {}
+        request_id = _current_request_id.get()
+        if request_id:
+            headers[REQUEST_ID_HEADER] = request_id
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent
+        return headers
+
+    def instrument_sqlalchemy(self):
+        """Record a db span for every SQL statement run while a sampled request is active"""
+        if self._sqlalchemy_instrumented:
+            return
+        self._sqlalchemy_instrumented = True
+
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        def before(conn, cursor, statement, parameters, context, executemany):
+            parent = _current_span.get()
+            if parent is not None and context is not None:
+                verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+                context._trace_span = parent.child(f'db {verb}', KIND_CLIENT, attributes={
+                    'db.system': conn.dialect.name,
+                    'db.statement': statement[:MAX_STATEMENT_LENGTH]
+                })
+
+        def after(conn, cursor, statement, parameters, context, executemany):
+            span = getattr(context, '_trace_span', None)
+            if span is not None:
+                span.set_attribute('db.rows', cursor.rowcount if cursor.rowcount >= 0 else None)
+                span.end()
+
+        def failed(exception_context):
+            span = getattr(exception_context.execution_context, '_trace_span', None)
+            if span is not None:
+                span.set_error(repr(exception_context.original_exception))
+                span.end()
+
+        event.listen(Engine, 'before_cursor_execute', before)
+        event.listen(Engine, 'after_cursor_execute', after)
+        event.listen(Engine, 'handle_error', failed)
+
+
+class _SpanContext:
+    __slots__ = ('tracer', 'name', 'kind', 'attributes', 'span', 'token')
+
+    def __init__(self, tracer, name, kind, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        self.span = parent.child(self.name, self.kind, attributes=self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        _current_span.reset(self.token)
+        if exc is not None:
+            self.span.set_error(repr(exc))
+        self.span.end()
+        return False
+
+
+class _StampStart:
+    """WSGI middleware recording when the request reached the app (start of the routing span)"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        environ['byteristo.start_ns'] = time.time_ns()
+        return self.wsgi_app(environ, start_response)
+
+
+tracer = Tracer()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=tracer.exporter._reset_after_fork)
@@ -0,0 +1,145 @@
+"""
+Shared pytest plugin for the micro-benchmarks.
+
+Timing comes from pytest-benchmark (the `benchmark` fixture). The `bench`
+fixture wraps it: it first runs the function once under tracemalloc and
+records the peak and retained memory in the benchmark's extra_info, then
+times it as usual.
+
+Allocation baselines work like pytest-benchmark's saved runs:
+
+    --alloc-save       store this run's allocations in --alloc-baseline
+    (default)          compare with --alloc-baseline when it exists and fail
+                       a benchmark whose peak grew by more than --alloc-tolerance
+
+The services share module names (models, config, app), so one pytest run
+benchmarks one service; other service directories are skipped.
+"""
+
+import json
+import os
+import tracemalloc
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIRS = ('menu_inventory', 'order_management')
+
+# Realistic data sizes: a quiet lunch up to a long-lived, busy database
+SIZES = (10, 100, 1000, 10000)
+
+# Peaks below this many bytes of growth are noise, not regressions
+ALLOC_FLOOR = 16 * 1024
+
+_service_key = pytest.StashKey[str]()
+_allocations_key = pytest.StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('allocations', 'allocation tracking (test/bench)')
+    group.addoption('--max-size', type=int, default=max(SIZES),
+                    help='skip data sizes above this many rows (default: %(default)s)')
+    group.addoption('--alloc-baseline', default=os.path.join(BENCH_DIR, '.benchmarks', 'allocations.json'),
+                    help='allocation baseline file')
+    group.addoption('--alloc-save', action='store_true', help='store allocations in the baseline file')
+    group.addoption('--alloc-tolerance', type=float, default=0.2,
+                    help='allowed relative growth of peak memory (default: %(default)s)')
+
+
+def pytest_configure(config):
+    config.stash[_allocations_key] = {}
+
+    # The first service named on the command line; the first one overall for `pytest test/bench`
+    services = [_service_of(os.path.join(str(config.invocation_params.dir), arg.split('::')[0]))
+                for arg in config.args]
+    config.stash[_service_key] = next((service for service in services if service), SERVICE_DIRS[0])
+
+
+def _service_of(path):
+    relative = os.path.relpath(str(path), BENCH_DIR)
+    top = relative.split(os.sep)[0]
+    return top if top in SERVICE_DIRS else None
+
+
+def pytest_ignore_collect(collection_path, config):
+    service = _service_of(collection_path)
+    if service is not None and service != config.stash[_service_key]:
+        return True
+    return None
+
+
+def pytest_report_header(config):
+    return f"benchmark sizes: {', '.join(str(size) for size in SIZES if size <= config.getoption('max_size'))}"
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    chosen = config.stash[_service_key]
+    skipped = [service for service in SERVICE_DIRS if service != chosen]
+    if skipped:
+        terminalreporter.write_line(
+            f"Benchmarked {chosen} only; run {', '.join(skipped)} in a separate pytest invocation")
+
+
+def pytest_generate_tests(metafunc):
+    if 'size' in metafunc.fixturenames:
+        max_size = metafunc.config.getoption('max_size')
+        metafunc.parametrize('size', [size for size in SIZES if size <= max_size])
+
+
+def _load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    measured = config.stash[_allocations_key]
+    if not config.getoption('alloc_save') or not measured:
+        return
+    path = config.getoption('alloc_baseline')
+    baseline = _load_baseline(path)
+    baseline.update(measured)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def measure_allocations(function, *args):
+    """Peak and retained bytes allocated while running function(*args) once, after a warm-up call"""
+    function(*args)  # Fill statement and compiled-query caches first
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = function(*args)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {'peak_bytes': peak - before, 'retained_bytes': after - before}
+
+
+@pytest.fixture
+def bench(benchmark, request):
+    """Time function(*args) with pytest-benchmark, after measuring its allocations"""
+    config = request.config
+
+    def run(function, *args):
+        allocations = measure_allocations(function, *args)
+        benchmark.extra_info.update(allocations)
+        config.stash[_allocations_key][request.node.nodeid] = allocations
+
+        result = benchmark(function, *args)
+
+        if not config.getoption('alloc_save'):
+            baseline = _load_baseline(config.getoption('alloc_baseline')).get(request.node.nodeid)
+            if baseline:
+                limit = max(baseline['peak_bytes'] * (1 + config.getoption('alloc_tolerance')),
+                            baseline['peak_bytes'] + ALLOC_FLOOR)
+                if allocations['peak_bytes'] > limit:
+                    pytest.fail(f"peak allocations regressed: {baseline['peak_bytes'] / 1024:.0f} KiB -> "
+                                f"{allocations['peak_bytes'] / 1024:.0f} KiB")
+        return result
+    return run
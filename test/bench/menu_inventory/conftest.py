@@ -0,0 +1,45 @@
+"""
+Fixtures for the menu service benchmarks: an in-memory app holding
+`size` generated menu items (see menu_data.py).
+"""
+
+import os
+import sys
+
+import pytest
+
+SERVICES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services'))
+sys.path[:0] = [os.path.join(SERVICES_DIR, 'menu-inventory', 'src'), SERVICES_DIR]  # The service, then shared/
+
+from app import create_app  # noqa: E402
+from models import db, MenuItem  # noqa: E402
+from menu_data import generate_menu_items  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(scope='session')
+def _seeded():
+    return {'size': None}
+
+
+@pytest.fixture
+def menu_db(app, size, _seeded):
+    """The database holding exactly `size` menu items (reseeded only when the size changes)"""
+    if _seeded['size'] != size:
+        db.session.execute(MenuItem.__table__.delete())
+        db.session.execute(MenuItem.__table__.insert(), generate_menu_items(size))
+        db.session.commit()
+        _seeded['size'] = size
+    yield db
+    db.session.rollback()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,44 @@
+"""Deterministic menu items for the benchmarks, shaped like the sample menu"""
+
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+CATEGORIES = ['appetizer', 'main', 'dessert', 'beverage', 'side']
+ALLERGENS = ['gluten', 'dairy', 'eggs', 'nuts', 'fish', 'soy']
+
+
+def menu_payload(rng, number):
+    """A POST /api/menu body, as the manager screen sends it"""
+    return {
+        'name': f'Dish {number}',
+        'description': rng.choice(['Antipasto con mozzarella di bufala, pomodori e basilico',
+                                   'Pasta fresca con guanciale, pecorino e pepe', None]),
+        'price': round(rng.uniform(2, 30), 2),
+        'category': rng.choice(CATEGORIES),
+        'is_available': rng.random() < 0.9,
+        'preparation_time': rng.randint(1, 30),
+        'allergens': rng.sample(ALLERGENS, rng.randint(0, 3)),
+        'nutritional_info': {'calories': rng.randint(50, 900), 'protein': rng.randint(0, 40),
+                             'carbs': rng.randint(0, 90), 'fat': rng.randint(0, 50)}
+    }
+
+
+def generate_menu_items(size):
+    """Rows for `size` menu items (allergens and nutritional info stored as JSON text)"""
+    rng = random.Random(size)
+    now = datetime.utcnow()
+    rows = []
+    for number in range(size):
+        payload = menu_payload(rng, number)
+        created_at = now - timedelta(days=rng.randint(0, 365))
+        rows.append({
+            **payload,
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'allergens': json.dumps(payload['allergens']),
+            'nutritional_info': json.dumps(payload['nutritional_info']),
+            'created_at': created_at,
+            'updated_at': created_at
+        })
+    return rows
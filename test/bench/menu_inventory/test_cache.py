@@ -0,0 +1,87 @@
+"""The two-tier cache (services/shared/cache.py) on the menu reads, with the in-memory backend"""
+
+import threading
+import time
+
+import pytest
+
+from shared.cache import Cache, MemoryBackend, cache
+
+MODES = ('off', 'memory')
+
+
+@pytest.fixture(params=MODES)
+def cache_mode(request, app):
+    cache.configure(MemoryBackend() if request.param == 'memory' else None)
+    yield request.param
+    cache.configure(None)
+
+
+@pytest.fixture
+def menu_cache(app, menu_db):
+    """A fresh memory backend for one test"""
+    cache.configure(MemoryBackend())
+    yield cache
+    cache.configure(None)
+
+
+@pytest.mark.parametrize('path', ['/api/menu/available', '/api/menu/?category=main'])
+def test_cached_read(bench, client, menu_db, size, cache_mode, path):
+    def get():
+        response = client.get(path)
+        assert response.status_code == 200
+        return response.get_data()
+    bench(get)
+
+
+def test_cached_body_matches(client, menu_cache, size):
+    cache.configure(None)
+    uncached = client.get('/api/menu/available').get_json()
+    cache.configure(MemoryBackend())
+    client.get('/api/menu/available')
+    assert client.get('/api/menu/available').get_json() == uncached
+    assert cache.stats['local_hits'] == 1
+
+
+def test_update_invalidates(client, menu_cache, size):
+    item = client.get('/api/menu/available').get_json()['data'][0]
+    response = client.put(f"/api/menu/{item['id']}", json={'is_available': False})
+    assert response.status_code == 200
+    ids = [entry['id'] for entry in client.get('/api/menu/available').get_json()['data']]
+    assert item['id'] not in ids
+    assert client.get(f"/api/menu/{item['id']}").get_json()['data']['is_available'] is False
+    client.put(f"/api/menu/{item['id']}", json={'is_available': True})
+
+
+def test_invalidation_reaches_other_processes():
+    # Two processes sharing one tier: the second drops its local copy on the message
+    shared = MemoryBackend()
+    first, second = Cache(), Cache()
+    first.configure(shared)
+    second.configure(shared)
+    assert second.get_or_set('menu', 'available', lambda: [1]) == [1]
+    first.invalidate_namespace('menu')
+    assert second.get_or_set('menu', 'available', lambda: [2]) == [2]
+    second.invalidate('menu', 'available')
+    assert first.get_or_set('menu', 'available', lambda: [3]) == [3]
+
+
+def test_stampede_loads_once():
+    shared = MemoryBackend()
+    processes = [Cache() for _ in range(4)]
+    for process in processes:
+        process.configure(shared)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return {'items': []}
+
+    threads = [threading.Thread(target=process.get_or_set, args=('menu', 'available', loader))
+               for process in processes for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
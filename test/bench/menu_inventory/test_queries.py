@@ -0,0 +1,16 @@
+"""Read endpoints of the menu service end to end: query, to_dict and JSON encoding"""
+
+import pytest
+
+
+@pytest.mark.parametrize('path', [
+    '/api/menu/',
+    '/api/menu/available',
+    '/api/menu/?category=main'
+])
+def test_read_endpoint(bench, client, menu_db, size, path):
+    def get():
+        response = client.get(path)
+        assert response.status_code == 200
+        return response.get_data()
+    bench(get)
@@ -0,0 +1,27 @@
+"""Serialization hot paths of the menu service: to_dict, raw-row dicts, marshmallow load"""
+
+import random
+
+from sqlalchemy import select
+
+from models import MenuItem
+from menu_data import menu_payload
+from routes.menu_routes import menu_item_schema, menu_row_to_dict
+
+
+def test_menu_item_to_dict(bench, menu_db, size):
+    items = MenuItem.query.all()
+    assert len(items) == size
+    bench(lambda: [item.to_dict() for item in items])
+
+
+def test_menu_row_to_dict(bench, menu_db, size):
+    # The raw-row path of GET/PUT /api/menu/<id>, applied to the whole menu
+    rows = menu_db.session.execute(select(MenuItem.__table__)).fetchall()
+    bench(lambda: [menu_row_to_dict(row) for row in rows])
+
+
+def test_menu_item_schema_load(bench, size):
+    rng = random.Random(size)
+    payloads = [menu_payload(rng, number) for number in range(size)]
+    bench(lambda: [menu_item_schema.load(payload) for payload in payloads])
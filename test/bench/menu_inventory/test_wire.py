@@ -0,0 +1,61 @@
+"""Wire formats on GET /api/menu/available, the body the order service fetches for every new order"""
+
+import pytest
+
+from shared.json_provider import JSON_MIMETYPE, MSGPACK_MIMETYPE, msgpack, packb, unpackb
+from routes.menu_routes import load_available_menu_items
+
+FORMATS = ('json', 'msgpack')
+
+
+@pytest.fixture(params=FORMATS)
+def wire_format(request, app):
+    if request.param == 'msgpack' and msgpack is None:
+        pytest.skip('msgpack is not installed')
+    if request.param == 'msgpack':
+        return packb, unpackb
+    return app.json.dumps_bytes if hasattr(app.json, 'dumps_bytes') else app.json.dumps, app.json.loads
+
+
+def available_response():
+    items = load_available_menu_items()
+    return {'success': True, 'data': items, 'count': len(items)}
+
+
+def test_encode_available_menu(bench, benchmark, wire_format, menu_db, size):
+    encode, _ = wire_format
+    body = available_response()
+    benchmark.extra_info['bytes'] = len(encode(body))
+    bench(encode, body)
+
+
+def test_decode_available_menu(bench, benchmark, wire_format, menu_db, size):
+    # The order service's side of the hop
+    encode, decode = wire_format
+    payload = encode(available_response())
+    benchmark.extra_info['bytes'] = len(payload)
+    bench(decode, payload)
+
+
+@pytest.mark.parametrize('accept', [JSON_MIMETYPE, MSGPACK_MIMETYPE])
+def test_available_menu_endpoint(bench, benchmark, client, menu_db, size, accept):
+    if accept == MSGPACK_MIMETYPE and msgpack is None:
+        pytest.skip('msgpack is not installed')
+
+    def get():
+        response = client.get('/api/menu/available', headers={'Accept': accept})
+        assert response.status_code == 200 and response.mimetype == accept
+        return response.get_data()
+    benchmark.extra_info['bytes'] = len(get())
+    bench(get)
+
+
+def test_msgpack_request_body(client, menu_db, size):
+    if msgpack is None:
+        pytest.skip('msgpack is not installed')
+    item = client.get('/api/menu/available').get_json()['data'][0]
+    response = client.put(f"/api/menu/{item['id']}", data=packb({'price': 7.5}),
+                          headers={'Content-Type': MSGPACK_MIMETYPE, 'Accept': MSGPACK_MIMETYPE})
+    assert response.status_code == 200
+    assert unpackb(response.get_data())['data']['price'] == 7.5
+    client.put(f"/api/menu/{item['id']}", json={'price': item['price']})
@@ -0,0 +1,48 @@
+"""
+Fixtures for the order service benchmarks: an in-memory app holding
+`size` generated orders (see orders_data.py).
+"""
+
+import os
+import sys
+
+import pytest
+
+SERVICES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services'))
+sys.path[:0] = [os.path.join(SERVICES_DIR, 'order-management', 'src'), SERVICES_DIR]  # The service, then shared/
+
+from app import create_app  # noqa: E402
+from models import db, Order, OrderItem  # noqa: E402
+from orders_data import generate_orders  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(scope='session')
+def _seeded():
+    return {'size': None}
+
+
+@pytest.fixture
+def orders_db(app, size, _seeded):
+    """The database holding exactly `size` orders (reseeded only when the size changes)"""
+    if _seeded['size'] != size:
+        db.session.execute(OrderItem.__table__.delete())
+        db.session.execute(Order.__table__.delete())
+        orders, items = generate_orders(size)
+        db.session.execute(Order.__table__.insert(), orders)
+        db.session.execute(OrderItem.__table__.insert(), items)
+        db.session.commit()
+        _seeded['size'] = size
+    yield db
+    db.session.rollback()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,86 @@
+"""Deterministic order data for the benchmarks: 1-5 items per order, a dinner's mix of statuses"""
+
+import random
+import uuid
+from datetime import timedelta
+
+from models import italy_now
+
+MENU = [
+    ('Bruschetta', 6.5, 5), ('Caprese', 8.0, 5), ('Margherita', 9.0, 12), ('Diavola', 10.5, 12),
+    ('Carbonara', 12.0, 15), ('Lasagna', 13.5, 20), ('Tiramisu', 6.0, 3), ('Panna Cotta', 5.5, 3),
+    ('Acqua', 2.0, 1), ('Vino Rosso', 5.0, 1)
+]
+MENU_IDS = [str(uuid.UUID(int=number + 1)) for number in range(len(MENU))]
+
+ORDER_STATUSES = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'payed', 'payed', 'payed', 'cancelled']
+ITEM_STATUS = {'pending': 'pending', 'confirmed': 'pending', 'preparing': 'preparing', 'ready': 'ready',
+               'delivered': 'served', 'payed': 'served', 'cancelled': 'cancelled'}
+
+
+def order_payload(rng, table_number):
+    """A POST /api/orders body, as the frontend sends it"""
+    items = []
+    for number in rng.sample(range(len(MENU)), rng.randint(1, 5)):
+        name, price, _ = MENU[number]
+        quantity = rng.randint(1, 3)
+        items.append({
+            'menu_item_id': MENU_IDS[number],
+            'menu_item_name': name,
+            'quantity': quantity,
+            'unit_price': price,
+            'total_price': round(price * quantity, 2),
+            'special_instructions': rng.choice([None, 'no onions', 'well done'])
+        })
+    return {
+        'table_number': table_number,
+        'customer_name': None,
+        'order_type': 'dine_in',
+        'special_instructions': None,
+        'total_amount': round(sum(item['total_price'] for item in items), 2),
+        'items': items
+    }
+
+
+def generate_orders(size):
+    """Rows for `size` orders and their items, spread over the last day"""
+    rng = random.Random(size)
+    now = italy_now()
+    orders, items = [], []
+    for number in range(size):
+        payload = order_payload(rng, rng.randint(1, 40))
+        status = rng.choice(ORDER_STATUSES)
+        created_at = now - timedelta(seconds=rng.randint(0, 86400))
+        order_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        total = payload['total_amount']
+        orders.append({
+            'id': order_id,
+            'order_number': f'ORD-{number:06d}',
+            'table_number': payload['table_number'],
+            'status': status,
+            'order_type': 'dine_in',
+            'total_amount': total,
+            'tax_amount': round(total * 0.1, 2),
+            'discount_amount': 0,
+            'final_amount': round(total * 1.1, 2),
+            'estimated_completion_time': created_at + timedelta(minutes=20),
+            'created_at': created_at,
+            'updated_at': created_at,
+            'change_seq': number + 1
+        })
+        for item in payload['items']:
+            items.append({
+                'id': str(uuid.UUID(int=rng.getrandbits(128))),
+                'order_id': order_id,
+                'menu_item_id': item['menu_item_id'],
+                'menu_item_name': item['menu_item_name'],
+                'quantity': item['quantity'],
+                'unit_price': item['unit_price'],
+                'total_price': item['total_price'],
+                'preparation_time': MENU[MENU_IDS.index(item['menu_item_id'])][2],
+                'special_instructions': item['special_instructions'],
+                'status': ITEM_STATUS[status],
+                'created_at': created_at,
+                'updated_at': created_at
+            })
+    return orders, items
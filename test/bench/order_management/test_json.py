@@ -0,0 +1,37 @@
+"""JSON providers on order lists: the standard library encoder against orjson"""
+
+import pytest
+
+from shared.json_provider import JSONProvider, OrjsonProvider, orjson
+from test_serialization import load_orders
+
+PROVIDERS = {'stdlib': JSONProvider, 'orjson': OrjsonProvider}
+
+
+@pytest.fixture(params=sorted(PROVIDERS))
+def provider(request, app):
+    if request.param == 'orjson' and orjson is None:
+        pytest.skip('orjson is not installed')
+    return PROVIDERS[request.param](app)
+
+
+def orders_response(orders_db):
+    # The body of GET /api/orders/ before encoding
+    orders = [order.to_dict() for order in load_orders(orders_db)]
+    return {'success': True, 'data': orders, 'count': len(orders)}
+
+
+def test_encode_order_list(bench, provider, orders_db, size):
+    bench(provider.response, orders_response(orders_db))
+
+
+def test_decode_order_list(bench, app, provider, orders_db, size):
+    body = JSONProvider(app).dumps(orders_response(orders_db))
+    bench(provider.loads, body)
+
+
+def test_providers_agree(app, orders_db, size):
+    if orjson is None:
+        pytest.skip('orjson is not installed')
+    body = orders_response(orders_db)
+    assert OrjsonProvider(app).response(body).get_json() == JSONProvider(app).response(body).get_json()
@@ -0,0 +1,17 @@
+"""Read endpoints of the order service end to end: query, row-to-dict and JSON encoding"""
+
+import pytest
+
+
+@pytest.mark.parametrize('path', [
+    '/api/orders/',
+    '/api/orders/?status=active',
+    '/api/orders/tables',
+    '/api/orders/changes?since=0&limit=1000'
+])
+def test_read_endpoint(bench, client, orders_db, size, path):
+    def get():
+        response = client.get(path)
+        assert response.status_code == 200
+        return response.get_data()
+    bench(get)
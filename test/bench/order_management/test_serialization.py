@@ -0,0 +1,51 @@
+"""Serialization hot paths of the order service: to_dict, raw-row dicts, receipts, marshmallow load"""
+
+import random
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from models import Order, OrderItem, order_row_to_dict, order_item_row_to_dict
+from orders_data import order_payload
+from routes.order_routes import build_receipt, order_schema
+
+
+def load_orders(db):
+    return db.session.query(Order).options(selectinload(Order.items)).all()
+
+
+def test_order_to_dict(bench, orders_db, size):
+    orders = load_orders(orders_db)
+    assert len(orders) == size
+    bench(lambda: [order.to_dict() for order in orders])
+
+
+def test_order_item_to_dict(bench, orders_db, size):
+    items = orders_db.session.query(OrderItem).all()
+    bench(lambda: [item.to_dict() for item in items])
+
+
+def test_order_row_to_dict(bench, orders_db, size):
+    # The raw-row path used by the state machine's UPDATE ... RETURNING responses
+    order_rows = orders_db.session.execute(select(Order.__table__)).fetchall()
+    items_by_order = defaultdict(list)
+    for row in orders_db.session.execute(select(OrderItem.__table__)).fetchall():
+        items_by_order[row.order_id].append(row)
+    bench(lambda: [order_row_to_dict(row, items_by_order[row.id]) for row in order_rows])
+
+
+def test_order_item_row_to_dict(bench, orders_db, size):
+    item_rows = orders_db.session.execute(select(OrderItem.__table__)).fetchall()
+    bench(lambda: [order_item_row_to_dict(row) for row in item_rows])
+
+
+def test_build_receipt(bench, orders_db, size):
+    orders = [order.to_dict() for order in load_orders(orders_db)]
+    bench(build_receipt, orders)
+
+
+def test_order_schema_load(bench, size):
+    rng = random.Random(size)
+    payloads = [order_payload(rng, rng.randint(1, 40)) for _ in range(size)]
+    bench(lambda: [order_schema.load(payload) for payload in payloads])
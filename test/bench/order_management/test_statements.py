@@ -0,0 +1,50 @@
+"""Hot statements through the registry (services/shared/statements.py) against a plain db.session.execute()"""
+
+import pytest
+
+from models import Order
+from shared.statements import postgres_array, statements
+import transitions
+
+RUNNERS = ('session', 'registry')
+
+
+@pytest.fixture(params=RUNNERS)
+def run(request, orders_db):
+    if request.param == 'registry':
+        return statements.execute
+    return lambda statement, params: orders_db.session.execute(statement.statement, params)
+
+
+def test_items_of_order(bench, run, orders_db, size):
+    order_id = orders_db.session.query(Order.id).first().id
+    bench(lambda: run(transitions._SELECT_ITEMS, {'order_id': order_id}).fetchall())
+
+
+def test_order_by_id(bench, run, orders_db, size):
+    order_id = orders_db.session.query(Order.id).first().id
+    bench(lambda: run(transitions._SELECT_ORDER, {'order_id': order_id}).fetchone())
+
+
+def test_hot_statements_preparable():
+    # A statement without a PostgreSQL form silently runs unprepared
+    unpreparable = [name for name, statement in statements.statements.items() if statement.execute_sql is None]
+    assert not unpreparable
+    assert statements.statements['orders.update_status'].execute_sql == (
+        'EXECUTE byteristo_orders_update_status(%(status)s, %(now)s, %(change_seq)s, %(order_id)s, %(allowed)s)'
+    )
+    assert 'status = ANY($5)' in statements.statements['orders.update_status'].prepare_sql
+
+
+def test_array_parameters_sent_as_literals():
+    # A list would go out as ARRAY[...], text[], which an enum column cannot be compared with
+    assert statements.statements['orders.update_status'].array_keys == ['allowed']
+    assert postgres_array(['ready', 'say "hi"', None]) == '{"ready","say \\"hi\\"",NULL}'
+
+
+def test_latency_recorded(orders_db, size):
+    order_id = orders_db.session.query(Order.id).first().id
+    calls = statements.stats['statements']['orders.by_id']['calls']
+    statements.execute(transitions._SELECT_ORDER, {'order_id': order_id})
+    recorded = statements.stats['statements']['orders.by_id']
+    assert recorded['calls'] == calls + 1 and recorded['max_ms'] > 0
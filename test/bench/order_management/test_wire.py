@@ -0,0 +1,53 @@
+"""Wire formats on order lists: JSON (the app's provider) against MessagePack, by size and encode/decode time"""
+
+import pytest
+
+from shared.json_provider import JSON_MIMETYPE, MSGPACK_MIMETYPE, msgpack, packb, unpackb
+from test_json import orders_response
+
+FORMATS = ('json', 'msgpack')
+
+
+@pytest.fixture(params=FORMATS)
+def wire_format(request, app):
+    if request.param == 'msgpack' and msgpack is None:
+        pytest.skip('msgpack is not installed')
+    if request.param == 'msgpack':
+        return packb, unpackb
+    return app.json.dumps_bytes if hasattr(app.json, 'dumps_bytes') else app.json.dumps, app.json.loads
+
+
+def test_encode_order_list(bench, benchmark, wire_format, orders_db, size):
+    encode, _ = wire_format
+    body = orders_response(orders_db)
+    benchmark.extra_info['bytes'] = len(encode(body))
+    bench(encode, body)
+
+
+def test_decode_order_list(bench, benchmark, wire_format, orders_db, size):
+    encode, decode = wire_format
+    payload = encode(orders_response(orders_db))
+    benchmark.extra_info['bytes'] = len(payload)
+    bench(decode, payload)
+
+
+@pytest.mark.parametrize('accept', [JSON_MIMETYPE, MSGPACK_MIMETYPE])
+def test_order_list_endpoint(bench, benchmark, client, orders_db, size, accept):
+    if accept == MSGPACK_MIMETYPE and msgpack is None:
+        pytest.skip('msgpack is not installed')
+
+    def get():
+        response = client.get('/api/orders/', headers={'Accept': accept})
+        assert response.status_code == 200 and response.mimetype == accept
+        return response.get_data()
+    benchmark.extra_info['bytes'] = len(get())
+    bench(get)
+
+
+def test_formats_agree(client, orders_db, size):
+    if msgpack is None:
+        pytest.skip('msgpack is not installed')
+    as_json = client.get('/api/orders/').get_json()
+    as_msgpack = client.get('/api/orders/', headers={'Accept': MSGPACK_MIMETYPE})
+    assert as_msgpack.headers['Vary'] == 'Accept'
+    assert unpackb(as_msgpack.get_data()) == as_json
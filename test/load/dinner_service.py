@@ -0,0 +1,338 @@
+"""
+End-to-end load test: a simulated dinner service through the API gateway.
+
+Starts the three services locally on SQLite (see stack.py), or uses an
+already running gateway, and plays a dinner service against it:
+
+    tables   one waiter terminal per table: reads the menu, places orders
+             (with an Idempotency-Key, like the frontend), keeps its order
+             list in sync through /orders/changes and checks the table bill
+    cooks    poll the active orders and bump items pending -> preparing ->
+             ready in batches (PATCH /orders/items/status)
+    cashier  settles payable tables, with /orders/pay-batch or one
+             /orders/<id>/pay per order
+    manager  edits menu prices and looks at the analytics
+
+Every request is timed under its endpoint label; the report gives
+requests/s and p50/p95/p99 per endpoint. --save-baseline stores the report
+as JSON; later runs compare against it and exit with status 1 when an
+endpoint got slower, started failing, or total throughput dropped by more
+than --tolerance.
+
+Usage:
+    python test/load/dinner_service.py --save-baseline
+    python test/load/dinner_service.py                    # compare with test/load/baseline.json
+    python test/load/dinner_service.py --tables 40 --duration 120 --mode dev
+    python test/load/dinner_service.py --gateway-url http://localhost:3000 --no-compare
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import Recorder, compare, load_baseline, save_baseline  # noqa: E402
+from stack import ServiceStack, MODES  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Settings that must match for a baseline comparison to be meaningful
+RUN_SETTINGS = ('tables', 'cooks', 'duration', 'pace', 'mode')
+
+
+class Client:
+    """Keep-alive JSON client that times every call into a Recorder"""
+
+    def __init__(self, base_url, recorder, address=None):
+        parsed = urllib.parse.urlparse(base_url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.recorder = recorder
+        self.connection = None
+        # Every simulated terminal connects from 127.0.0.1; X-Forwarded-For
+        # gives each its own rate limits at the gateway
+        self.headers = {'Content-Type': 'application/json'}
+        if address:
+            self.headers['X-Forwarded-For'] = address
+
+    def _send(self, method, path, payload, headers):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        body = response.read()
+        if response.will_close:
+            self.close()
+        return response.status, body
+
+    def call(self, endpoint, method, path, body=None, headers=None):
+        """Send a request; returns (status, parsed JSON), status None on a transport error"""
+        payload = json.dumps(body) if body is not None else None
+        headers = {**self.headers, **(headers or {})}
+        started = time.perf_counter()
+        try:
+            try:
+                status, raw = self._send(method, path, payload, headers)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Idle keep-alive connection closed by the server: retry once
+                self.close()
+                status, raw = self._send(method, path, payload, headers)
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.recorder.record(endpoint, time.perf_counter() - started, None)
+            return None, None
+        self.recorder.record(endpoint, time.perf_counter() - started, status)
+        try:
+            return status, json.loads(raw or b'null')
+        except ValueError:
+            return status, None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class DinnerService:
+    """The simulated restaurant: one thread per table, cook, cashier and manager"""
+
+    def __init__(self, gateway_url, tables=20, cooks=2, pace=1.0, seed=None):
+        self.gateway_url = gateway_url
+        self.tables = tables
+        self.cooks = cooks
+        self.pace = pace
+        self.seed = seed
+        self.recorder = Recorder()
+        self.stopping = threading.Event()
+        self.terminals = 0
+        self.counts_lock = threading.Lock()
+        self.counts = {'orders_placed': 0, 'items_bumped': 0, 'orders_paid': 0, 'menu_edits': 0}
+
+    def count(self, name, amount=1):
+        if self.recorder.recording:
+            with self.counts_lock:
+                self.counts[name] += amount
+
+    def think(self, rng, low, high):
+        """Sleep like a person would; returns False once the service is over"""
+        return not self.stopping.wait(rng.uniform(low, high) * self.pace)
+
+    def actor(self, name, target, *args):
+        rng = random.Random(f'{self.seed}-{name}') if self.seed is not None else random.Random()
+        self.terminals += 1
+        address = f'10.0.{self.terminals // 250}.{self.terminals % 250 + 1}'
+        client = Client(self.gateway_url, self.recorder, address=address)
+
+        def run():
+            try:
+                target(client, rng, *args)
+            except Exception as e:
+                print(f"{name} stopped: {e!r}")
+            finally:
+                client.close()
+        return threading.Thread(target=run, name=name, daemon=True)
+
+    def table(self, client, rng, table_number):
+        status, menu = client.call('GET /api/menu/available', 'GET', '/api/menu/available')
+        dishes = (menu or {}).get('data') or []
+        cursor = 0
+
+        while self.think(rng, 1.0, 3.0):
+            # The waiter only takes a new order when the table is not waiting on two already
+            status, bills = client.call('GET /api/orders/tables', 'GET',
+                                        f'/api/orders/tables?table_number={table_number}')
+            bill = next(iter((bills or {}).get('data') or []), None)
+            if dishes and (bill is None or bill['orders_count'] < 2):
+                items = []
+                for dish in rng.sample(dishes, min(len(dishes), rng.randint(1, 4))):
+                    quantity = rng.randint(1, 3)
+                    items.append({
+                        'menu_item_id': dish['id'],
+                        'menu_item_name': dish['name'],
+                        'quantity': quantity,
+                        'unit_price': dish['price'],
+                        'total_price': round(dish['price'] * quantity, 2)
+                    })
+                status, _ = client.call('POST /api/orders', 'POST', '/api/orders', {
+                    'table_number': table_number,
+                    'order_type': 'dine_in',
+                    'items': items
+                }, headers={'Idempotency-Key': str(uuid.uuid4())})
+                if status == 201:
+                    self.count('orders_placed')
+
+            # Delta sync of the waiter's order list
+            status, changes = client.call('GET /api/orders/changes', 'GET', f'/api/orders/changes?since={cursor}')
+            if status == 200:
+                cursor = changes['next_cursor']
+
+            if rng.random() < 0.1:
+                status, menu = client.call('GET /api/menu/available', 'GET', '/api/menu/available')
+                dishes = (menu or {}).get('data') or dishes
+
+    def cook(self, client, rng, station, stations):
+        next_status = {'pending': 'preparing', 'preparing': 'ready'}
+        while self.think(rng, 0.5, 1.5):
+            status, orders = client.call('GET /api/orders?status=active', 'GET', '/api/orders?status=active')
+            if status != 200:
+                continue
+            # Stations split the tickets so two cooks do not bump the same items
+            bumps = [
+                {'order_id': order['id'], 'item_id': item['id'], 'status': next_status[item['status']]}
+                for order in orders['data'] if order['table_number'] % stations == station
+                for item in order['items'] if item['status'] in next_status
+            ][:50]
+            if bumps:
+                status, result = client.call('PATCH /api/orders/items/status', 'PATCH', '/api/orders/items/status',
+                                             {'items': bumps})
+                if status == 200:
+                    self.count('items_bumped', result['updated'])
+
+    def cashier(self, client, rng):
+        while self.think(rng, 1.0, 2.0):
+            status, bills = client.call('GET /api/orders/tables?status=payable', 'GET',
+                                        '/api/orders/tables?status=payable')
+            if status != 200:
+                continue
+            for bill in bills['data']:
+                if not bill['payable_order_ids']:
+                    continue
+                method = rng.choice(['cash', 'card'])
+                if len(bill['payable_order_ids']) > 1 or rng.random() < 0.5:
+                    status, _ = client.call('POST /api/orders/pay-batch', 'POST', '/api/orders/pay-batch', {
+                        'order_ids': bill['payable_order_ids'],
+                        'payment_method': method
+                    }, headers={'Idempotency-Key': str(uuid.uuid4())})
+                    if status == 200:
+                        self.count('orders_paid', len(bill['payable_order_ids']))
+                else:
+                    order_id = bill['payable_order_ids'][0]
+                    status, _ = client.call('POST /api/orders/<id>/pay', 'POST', f'/api/orders/{order_id}/pay',
+                                            {'payment_method': method},
+                                            headers={'Idempotency-Key': str(uuid.uuid4())})
+                    if status == 200:
+                        self.count('orders_paid')
+
+    def manager(self, client, rng):
+        while self.think(rng, 3.0, 6.0):
+            status, menu = client.call('GET /api/menu', 'GET', '/api/menu')
+            if status == 200 and menu['data']:
+                dish = rng.choice(menu['data'])
+                price = max(1.0, round(dish['price'] + rng.choice([-0.5, 0.5]), 2))
+                status, _ = client.call('PUT /api/menu/<id>', 'PUT', f"/api/menu/{dish['id']}", {'price': price})
+                if status == 200:
+                    self.count('menu_edits')
+            client.call('GET /api/analytics/summary', 'GET', '/api/analytics/summary')
+
+    def run(self, duration, warmup=5.0):
+        threads = [self.actor(f'table-{number}', self.table, number) for number in range(1, self.tables + 1)]
+        threads += [self.actor(f'cook-{station}', self.cook, station, self.cooks) for station in range(self.cooks)]
+        threads += [self.actor('cashier', self.cashier), self.actor('manager', self.manager)]
+        for thread in threads:
+            thread.start()
+
+        # Let the first orders reach the kitchen before measuring
+        time.sleep(warmup)
+        self.recorder.start()
+        time.sleep(duration)
+        self.recorder.stop()
+
+        self.stopping.set()
+        for thread in threads:
+            thread.join(timeout=35)
+
+        report = self.recorder.summary()
+        report['counts'] = dict(self.counts)
+        return report
+
+
+def print_report(report):
+    elapsed = report['elapsed']
+    print(f"\n{'endpoint':40s} {'reqs':>7s} {'req/s':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} "
+          f"{'4xx':>5s} {'err':>5s}")
+    rows = sorted(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for endpoint, stats in rows:
+        print(f"{endpoint:40s} {stats['requests']:7d} {stats['rps']:7.1f} {stats['p50_ms']:8.1f} "
+              f"{stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f} {stats['rejected']:5d} {stats['errors']:5d}")
+    counts = report['counts']
+    print(f"\nIn {elapsed:.0f} s: {counts['orders_placed']} orders placed, {counts['items_bumped']} item bumps, "
+          f"{counts['orders_paid']} orders paid, {counts['menu_edits']} menu edits")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=20, help='simulated tables (one waiter terminal each)')
+    parser.add_argument('--cooks', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=60.0, help='measured seconds, after the warm-up')
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--pace', type=float, default=1.0, help='think time multiplier; below 1 is a busier night')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the simulated staff')
+    parser.add_argument('--mode', default='gunicorn', choices=MODES, help='how stack.py serves the services')
+    parser.add_argument('--base-port', type=int, default=3000)
+    parser.add_argument('--gateway-url', help='use a running gateway instead of starting the services')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--no-compare', action='store_true', help='do not compare with the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown / throughput drop (default 0.25)')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    settings = {
+        'tables': args.tables,
+        'cooks': args.cooks,
+        'duration': args.duration,
+        'pace': args.pace,
+        'mode': 'external' if args.gateway_url else args.mode,
+        'cpus': os.cpu_count()
+    }
+    print(f"Dinner service: {args.tables} tables, {args.cooks} cooks, {args.duration:.0f} s, "
+          f"pace {args.pace}, {settings['mode']}")
+
+    service_kwargs = {'tables': args.tables, 'cooks': args.cooks, 'pace': args.pace, 'seed': args.seed}
+    if args.gateway_url:
+        report = DinnerService(args.gateway_url, **service_kwargs).run(args.duration, args.warmup)
+    else:
+        # Rate limits per simulated terminal (Client sends X-Forwarded-For)
+        with ServiceStack(mode=args.mode, base_port=args.base_port, env={'RATE_LIMIT_TRUST_PROXY': 'true'}) as stack:
+            report = DinnerService(stack.gateway_url, **service_kwargs).run(args.duration, args.warmup)
+    report['settings'] = settings
+
+    print_report(report)
+
+    if args.json:
+        save_baseline(args.json, report)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, report)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if args.no_compare or not os.path.exists(args.baseline):
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    different = [name for name in RUN_SETTINGS if baseline.get('settings', {}).get(name) != settings[name]]
+    if different:
+        print(f"\nWarning: baseline was recorded with different {', '.join(different)}; "
+              f"the comparison may not be meaningful")
+
+    regressions = compare(report, baseline, tolerance=args.tolerance)
+    if regressions:
+        print(f"\nREGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
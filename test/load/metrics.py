@@ -0,0 +1,134 @@
+"""
+Latency bookkeeping shared by the load scripts.
+
+Recorder collects one latency per request under an endpoint label
+('POST /api/orders'), from any number of threads, and summarizes them as
+requests/s and p50/p95/p99. compare() checks a summary against a saved
+baseline and returns the regressions it finds.
+"""
+
+import json
+import threading
+import time
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0, rejected=0):
+    """requests/s and latency percentiles (ms) for a list of latencies in seconds"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rejected': rejected,
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency log
+
+    Status >= 500 and transport failures count as errors; 4xx responses are
+    counted as rejected (e.g. a payment that lost a race) but still timed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+        self._rejected = {}
+        self.started_at = None
+        self.stopped_at = None
+
+    def start(self):
+        with self._lock:
+            self._latencies.clear()
+            self._errors.clear()
+            self._rejected.clear()
+            self.started_at = time.perf_counter()
+            self.stopped_at = None
+
+    def stop(self):
+        self.stopped_at = time.perf_counter()
+
+    @property
+    def recording(self):
+        return self.started_at is not None and self.stopped_at is None
+
+    def record(self, endpoint, seconds, status):
+        if not self.recording:
+            return  # Warm-up or cool-down
+        with self._lock:
+            if status is None or status >= 500:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+                if status is None:
+                    return
+            elif status >= 400:
+                self._rejected[endpoint] = self._rejected.get(endpoint, 0) + 1
+            self._latencies.setdefault(endpoint, []).append(seconds)
+
+    def summary(self):
+        elapsed = (self.stopped_at or time.perf_counter()) - self.started_at
+        with self._lock:
+            endpoints = sorted(set(self._latencies) | set(self._errors))
+            by_endpoint = {
+                endpoint: summarize(self._latencies.get(endpoint, []), elapsed,
+                                    self._errors.get(endpoint, 0), self._rejected.get(endpoint, 0))
+                for endpoint in endpoints
+            }
+            everything = [latency for latencies in self._latencies.values() for latency in latencies]
+            total = summarize(everything, elapsed, sum(self._errors.values()), sum(self._rejected.values()))
+        return {'elapsed': elapsed, 'total': total, 'endpoints': by_endpoint}
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, report):
+    with open(path, 'w') as baseline_file:
+        json.dump(report, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def compare(current, baseline, tolerance=0.25, min_requests=20, latency_floor_ms=5.0):
+    """Regressions of `current` against `baseline` (both summary() dicts), as readable strings
+
+    A percentile regresses when it grows by more than `tolerance` and by more
+    than `latency_floor_ms`, so a 2 ms -> 3 ms blip on an idle endpoint is
+    not flagged. Endpoints with fewer than `min_requests` samples in either
+    run are skipped. Total throughput regresses when it drops by more than
+    `tolerance`; any new server error is a regression.
+    """
+    regressions = []
+
+    for endpoint, base in baseline['endpoints'].items():
+        now = current['endpoints'].get(endpoint)
+        if now is None:
+            regressions.append(f'{endpoint}: no longer exercised')
+            continue
+        if base['requests'] < min_requests or now['requests'] < min_requests:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if now[key] > base[key] * (1 + tolerance) and now[key] - base[key] > latency_floor_ms:
+                regressions.append(f'{endpoint}: {key[:3]} {base[key]:.1f} ms -> {now[key]:.1f} ms')
+
+    for endpoint, now in current['endpoints'].items():
+        base_errors = baseline['endpoints'].get(endpoint, {}).get('errors', 0)
+        if now['errors'] > base_errors:
+            regressions.append(f'{endpoint}: {now["errors"]} server error(s), baseline had {base_errors}')
+
+    base_rps, now_rps = baseline['total']['rps'], current['total']['rps']
+    if now_rps < base_rps * (1 - tolerance):
+        regressions.append(f'throughput {base_rps:.1f} -> {now_rps:.1f} req/s')
+
+    return regressions
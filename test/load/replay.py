@@ -0,0 +1,320 @@
+"""
+Replay traffic recorded at the gateway (RECORD_FILE, see
+services/api-gateway/src/recorder.py) against a local stack.
+
+Every recorded client gets its own keep-alive connection and re-issues its
+requests in their original order, at their original offsets divided by
+--rate (2 = twice as fast). Ids are mapped as the replay goes: the ids in
+the response to a recorded POST are paired with those in the replayed
+response, and later paths and bodies (order_id, item_id, menu_item_id,
+order_ids) use the replayed ones. Ids first seen in other responses (the
+menu, orders placed before the recording started) are paired by position.
+Idempotency keys are replaced by fresh ones, consistently, so recorded
+retries stay retries. Ids never seen in a response are sent as recorded
+and counted as unmapped.
+
+The report compares, per endpoint, the recorded latency (gateway arrival to
+service answer) with the replayed one (client round trip), and counts the
+requests whose status or response shape differs from the recording. Like
+dinner_service.py it can save the replay as a baseline and compare later
+replays of the same recording against it, so two releases can be compared
+under the same traffic.
+
+Usage:
+    python test/load/replay.py traffic.jsonl.gz
+    python test/load/replay.py traffic.jsonl.gz --rate 2 --save-baseline --baseline replay-baseline.json
+    python test/load/replay.py traffic.jsonl.gz --rate 2 --baseline replay-baseline.json
+    python test/load/replay.py traffic.jsonl.gz --gateway-url http://localhost:3000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+LOAD_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.join(LOAD_DIR, '..', '..', 'services')
+sys.path[:0] = [LOAD_DIR, os.path.join(SERVICES_DIR, 'api-gateway', 'src'), SERVICES_DIR]
+
+from dinner_service import Client  # noqa: E402
+from metrics import Recorder, compare, load_baseline, save_baseline, summarize  # noqa: E402
+from recorder import collect_ids, response_shape  # noqa: E402
+from stack import ServiceStack, MODES  # noqa: E402
+
+# Which ids a path segment or body field refers to, as '<service>:<key path in the response>'
+PATH_ID_KINDS = {'menu': 'menu:data', 'orders': 'orders:data', 'items': 'orders:data.items'}
+BODY_ID_KINDS = {
+    'menu_item_id': 'menu:data',
+    'order_id': 'orders:data',
+    'order_ids': 'orders:data',
+    'item_id': 'orders:data.items'
+}
+ID_SEGMENT = re.compile(r'/(?:\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?=/|$)')
+MAX_DIFFERENCES = 5  # Distinct shape differences listed per endpoint
+
+
+def read_recording(path):
+    """The recorded exchanges in a RECORD_FILE (plain or .gz), oldest first"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as recording:
+        entries = [json.loads(line) for line in recording if line.strip()]
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def endpoint_label(entry):
+    """'PUT /api/orders/<id>/status', 'GET /api/orders?status=active'"""
+    label = entry['m'] + ' ' + ID_SEGMENT.sub('/<id>', entry['p'])
+    if entry.get('q'):
+        label += '?' + re.sub(r'=\d[^&]*', '=<n>', entry['q'])
+    return label
+
+
+def shape_differences(recorded, replayed, path=''):
+    """Where two response shapes disagree; null and empty lists match anything"""
+    if recorded == replayed or 'null' in (recorded, replayed) or [] in (recorded, replayed):
+        return []
+    if isinstance(recorded, dict) and isinstance(replayed, dict):
+        differences = []
+        for key in recorded.keys() | replayed.keys():
+            where = f'{path}.{key}' if path else key
+            if key not in replayed:
+                differences.append(f'{where}: missing')
+            elif key not in recorded:
+                differences.append(f'{where}: new')
+            else:
+                differences += shape_differences(recorded[key], replayed[key], where)
+        return differences
+    if isinstance(recorded, list) and isinstance(replayed, list):
+        return shape_differences(recorded[0], replayed[0], f'{path}[]')
+    return [f'{path or "body"}: {_kind(recorded)} -> {_kind(replayed)}']
+
+
+def _kind(shape):
+    if isinstance(shape, dict):
+        return 'object'
+    return 'list' if isinstance(shape, list) else shape
+
+
+class IdMap:
+    """Recorded ids -> ids of the rows the replay created, per kind"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self.unmapped = 0
+
+    def learn(self, entry, body, created=False):
+        """Pair the ids of a recorded response with the replayed one's; `created` ids replace earlier guesses"""
+        service = 'menu' if entry['p'].startswith('/api/menu') else 'orders'
+        replayed = collect_ids(body)
+        with self._lock:
+            for key_path, recorded_ids in entry.get('ids', {}).items():
+                mapping = self._ids.setdefault(f'{service}:{key_path}', {})
+                for recorded_id, replayed_id in zip(recorded_ids, replayed.get(key_path, [])):
+                    if created:
+                        mapping[recorded_id] = replayed_id
+                    else:
+                        mapping.setdefault(recorded_id, replayed_id)
+
+    def get(self, kind, recorded_id):
+        replayed_id = self._ids.get(kind, {}).get(recorded_id)
+        if replayed_id is None:
+            self.unmapped += 1
+            return recorded_id
+        return replayed_id
+
+    def path(self, path):
+        segments = path.split('/')
+        for position in range(1, len(segments)):
+            kind = PATH_ID_KINDS.get(segments[position - 1])
+            if kind and ID_SEGMENT.fullmatch('/' + segments[position]):
+                recorded_id = int(segments[position]) if segments[position].isdigit() else segments[position]
+                segments[position] = str(self.get(kind, recorded_id))
+        return '/'.join(segments)
+
+    def body(self, value):
+        if isinstance(value, list):
+            return [self.body(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        mapped = {}
+        for key, item in value.items():
+            kind = BODY_ID_KINDS.get(key)
+            if kind and isinstance(item, (str, int)):
+                mapped[key] = self.get(kind, item)
+            elif kind and isinstance(item, list):
+                mapped[key] = [self.get(kind, each) if isinstance(each, (str, int)) else each for each in item]
+            else:
+                mapped[key] = self.body(item)
+        return mapped
+
+
+class Replay:
+    """Re-issues a recording, one thread per recorded client"""
+
+    def __init__(self, gateway_url, entries, rate=1.0):
+        self.gateway_url = gateway_url
+        self.entries = entries
+        self.rate = rate
+        self.recorder = Recorder()
+        self.ids = IdMap()
+        self.keys_lock = threading.Lock()
+        self.idempotency_keys = {}
+        self.diff_lock = threading.Lock()
+        self.diffs = {}
+        self.max_behind = 0.0
+
+    def idempotency_key(self, recorded_key):
+        with self.keys_lock:
+            return self.idempotency_keys.setdefault(recorded_key, str(uuid.uuid4()))
+
+    def compare(self, label, entry, status, body):
+        with self.diff_lock:
+            diff = self.diffs.setdefault(label, {'recorded_ms': [], 'status': 0, 'shape': 0, 'differences': set()})
+            diff['recorded_ms'].append(entry['ms'] / 1000)
+            if status != entry['s']:
+                diff['status'] += 1
+            elif 'shape' in entry:
+                differences = shape_differences(entry['shape'], response_shape(body))
+                if differences:
+                    diff['shape'] += 1
+                    diff['differences'].update(differences)
+
+    def client(self, name, entries, started):
+        address = f'10.{int(name[:2], 16)}.{int(name[2:4], 16)}.{int(name[4:6], 16)}'
+        client = Client(self.gateway_url, self.recorder, address=address)
+        first = self.entries[0]['t']
+        try:
+            for entry in entries:
+                delay = started + (entry['t'] - first) / self.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_behind = max(self.max_behind, -delay)
+
+                headers = dict(entry.get('h') or {})
+                if 'Idempotency-Key' in headers:
+                    headers['Idempotency-Key'] = self.idempotency_key(headers['Idempotency-Key'])
+                path = self.ids.path(entry['p']) + (f"?{entry['q']}" if entry.get('q') else '')
+                body = self.ids.body(entry.get('b'))
+
+                label = endpoint_label(entry)
+                status, response = client.call(label, entry['m'], path, body, headers)
+                if status is not None and status < 300:
+                    self.ids.learn(entry, response, created=entry['m'] == 'POST')
+                self.compare(label, entry, status, response)
+        finally:
+            client.close()
+
+    def run(self):
+        clients = {}
+        for entry in self.entries:
+            clients.setdefault(entry['c'], []).append(entry)
+        started = time.perf_counter() + 0.5
+        threads = [threading.Thread(target=self.client, args=(name, entries, started), daemon=True)
+                   for name, entries in clients.items()]
+
+        self.recorder.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.recorder.stop()
+
+        report = self.recorder.summary()
+        recorded_span = (self.entries[-1]['t'] - self.entries[0]['t']) or 1.0
+        for label, diff in self.diffs.items():
+            stats = report['endpoints'].setdefault(label, summarize([], report['elapsed']))
+            recorded = summarize(diff['recorded_ms'], recorded_span)
+            stats['recorded'] = {key: recorded[key] for key in ('requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms')}
+            stats['status_mismatches'] = diff['status']
+            stats['shape_mismatches'] = diff['shape']
+            stats['shape_differences'] = sorted(diff['differences'])[:MAX_DIFFERENCES]
+        report['clients'] = len(clients)
+        report['unmapped_ids'] = self.ids.unmapped
+        report['max_behind_s'] = round(self.max_behind, 3)
+        return report
+
+
+def print_report(report):
+    print(f"\n{'endpoint':40s} {'reqs':>6s} {'rec p50':>8s} {'p50 ms':>8s} {'rec p95':>8s} {'p95 ms':>8s} "
+          f"{'status':>7s} {'shape':>6s}")
+    for endpoint, stats in sorted(report['endpoints'].items()):
+        recorded = stats.get('recorded', {})
+        print(f"{endpoint:40s} {stats['requests']:6d} {recorded.get('p50_ms', 0):8.1f} {stats['p50_ms']:8.1f} "
+              f"{recorded.get('p95_ms', 0):8.1f} {stats['p95_ms']:8.1f} {stats.get('status_mismatches', 0):7d} "
+              f"{stats.get('shape_mismatches', 0):6d}")
+        for difference in stats.get('shape_differences', []):
+            print(f"    shape: {difference}")
+    total = report['total']
+    print(f"{'TOTAL':40s} {total['requests']:6d} {'':8s} {total['p50_ms']:8.1f} {'':8s} {total['p95_ms']:8.1f}")
+    print(f"\n{report['clients']} clients, {total['rps']:.1f} req/s over {report['elapsed']:.0f} s; "
+          f"{report['unmapped_ids']} unmapped ids; "
+          f"at most {report['max_behind_s']:.2f} s behind schedule")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help='RECORD_FILE written by the gateway (.jsonl or .gz)')
+    parser.add_argument('--rate', type=float, default=1.0, help='speed-up of the recorded timing (default 1)')
+    parser.add_argument('--limit', type=int, help='replay only the first LIMIT requests')
+    parser.add_argument('--mode', default='gunicorn', choices=MODES, help='how stack.py serves the services')
+    parser.add_argument('--base-port', type=int, default=3000)
+    parser.add_argument('--gateway-url', help='use a running gateway instead of starting the services')
+    parser.add_argument('--baseline', help='replay report to compare with (or to write with --save-baseline)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this replay as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown / throughput drop (default 0.25)')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    entries = read_recording(args.recording)[:args.limit]
+    if not entries:
+        print(f'{args.recording} holds no requests')
+        return 1
+    print(f"Replaying {len(entries)} requests recorded over {entries[-1]['t'] - entries[0]['t']:.0f} s "
+          f"at {args.rate}x")
+
+    if args.gateway_url:
+        report = Replay(args.gateway_url, entries, args.rate).run()
+    else:
+        # Recorded clients keep their own rate limits (Client sends X-Forwarded-For)
+        with ServiceStack(mode=args.mode, base_port=args.base_port, env={'RATE_LIMIT_TRUST_PROXY': 'true'}) as stack:
+            report = Replay(stack.gateway_url, entries, args.rate).run()
+    report['settings'] = {'recording': os.path.basename(args.recording), 'requests': len(entries), 'rate': args.rate}
+
+    print_report(report)
+
+    if args.json:
+        save_baseline(args.json, report)
+
+    if args.baseline and args.save_baseline:
+        save_baseline(args.baseline, report)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline or not os.path.exists(args.baseline):
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get('settings') != report['settings']:
+        print(f"\nWarning: baseline replayed {baseline.get('settings')}; the comparison may not be meaningful")
+
+    regressions = compare(report, baseline, tolerance=args.tolerance)
+    if regressions:
+        print(f"\nREGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
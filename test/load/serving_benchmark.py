@@ -0,0 +1,171 @@
+"""
+Throughput of the Flask dev server vs gunicorn, for the same endpoints.
+
+Starts the three services locally on SQLite (see stack.py) once per
+serving mode, seeds a few orders, then hits a handful of read endpoints
+with concurrent keep-alive clients and reports requests/s and latency
+percentiles. Results are described in SERVING_BENCHMARK.md.
+
+Usage:
+    python test/load/serving_benchmark.py [--duration 10] [--concurrency 16] [--modes dev gunicorn]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import summarize  # noqa: E402
+from stack import ServiceStack, MODES  # noqa: E402
+
+
+def request_json(base_url, method, path, body=None):
+    parsed = urllib.parse.urlparse(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        connection.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+    finally:
+        connection.close()
+
+
+def hammer(base_url, path, concurrency, duration):
+    """Send GET `path` from `concurrency` threads for `duration` seconds"""
+    parsed = urllib.parse.urlparse(base_url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def get(connection):
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        if response.will_close:
+            connection.close()
+        return response.status
+
+    def worker():
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                try:
+                    status = get(connection)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # Idle keep-alive connection closed by the server (e.g. a
+                    # recycled worker): reconnect and retry once, like browsers do
+                    connection.close()
+                    status = get(connection)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                continue
+            if status >= 400:
+                failed += 1
+            local.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors[0])
+
+
+def seed(stack, orders=50):
+    """Create some orders (half of them ready) so the reads have data"""
+    status, menu = request_json(stack.menu_url, 'GET', '/api/menu/available')
+    items = menu['data'] if status == 200 else []
+    for number in range(orders):
+        item = items[number % len(items)]
+        status, created = request_json(stack.order_url, 'POST', '/api/orders/', {
+            'table_number': number % 12 + 1,
+            'order_type': 'dine_in',
+            'items': [{
+                'menu_item_id': item['id'],
+                'menu_item_name': item['name'],
+                'quantity': 2,
+                'unit_price': item['price'],
+                'total_price': item['price'] * 2
+            }]
+        })
+        if status == 201 and number % 2:
+            request_json(stack.order_url, 'PUT', f"/api/orders/{created['data']['id']}/status", {'status': 'ready'})
+
+
+def targets(stack):
+    return [
+        ('menu    GET /api/menu/', stack.menu_url, '/api/menu/'),
+        ('orders  GET /api/orders/?status=active', stack.order_url, '/api/orders/?status=active'),
+        ('orders  GET /api/orders/tables', stack.order_url, '/api/orders/tables'),
+        ('gateway GET /api/menu', stack.gateway_url, '/api/menu'),
+        ('gateway GET /api/orders?status=active', stack.gateway_url, '/api/orders?status=active')
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--base-port', type=int, default=3000)
+    parser.add_argument('--workers', type=int, help='GUNICORN_WORKERS (default: 2 x CPUs + 1)')
+    parser.add_argument('--threads', type=int, help='GUNICORN_THREADS')
+    parser.add_argument('--worker-class', choices=('sync', 'gthread'),
+                        help='GUNICORN_WORKER_CLASS of every service (gevent is refused by the menu and order services)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    env = {}
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    if args.threads:
+        env['GUNICORN_THREADS'] = str(args.threads)
+    if args.worker_class:
+        env['GUNICORN_WORKER_CLASS'] = args.worker_class
+
+    results = {}
+    for mode in args.modes:
+        print(f"\n=== {mode} ===")
+        with ServiceStack(mode=mode, base_port=args.base_port, env=env) as stack:
+            seed(stack)
+            for name, base_url, path in targets(stack):
+                hammer(base_url, path, args.concurrency, 1.0)  # Warm up
+                result = hammer(base_url, path, args.concurrency, args.duration)
+                results.setdefault(name, {})[mode] = result
+                print(f"{name:42s} {result['rps']:8.1f} req/s  p50 {result['p50_ms']:6.1f} ms  "
+                      f"p95 {result['p95_ms']:6.1f} ms  p99 {result['p99_ms']:6.1f} ms  errors {result['errors']}")
+
+    if len(args.modes) > 1:
+        first, last = args.modes[0], args.modes[-1]
+        print(f"\n=== {last} vs {first} ===")
+        for name, by_mode in results.items():
+            if by_mode[first]['rps']:
+                print(f"{name:42s} x{by_mode[last]['rps'] / by_mode[first]['rps']:.2f} throughput")
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'concurrency': args.concurrency, 'duration': args.duration, 'cpus': os.cpu_count(),
+                       'gunicorn': env, 'results': results},
+                      output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Start the three ByteRisto services locally on SQLite, for load tests.
+
+    with ServiceStack(mode='gunicorn') as stack:
+        stack.gateway_url  # http://127.0.0.1:3000
+
+Modes:
+    dev       python src/app.py (the Flask dev server, FLASK_ENV=development)
+    gunicorn  gunicorn --config gunicorn.conf.py wsgi:app (FLASK_ENV=production)
+
+Each run gets fresh SQLite databases in a temporary directory. Extra
+environment variables (e.g. GUNICORN_WORKERS) are passed to every service.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SERVICES_DIR = os.path.join(ROOT, 'services')
+
+MODES = ('dev', 'gunicorn')
+
+
+class ServiceStack:
+    """Menu, order and gateway services running as local subprocesses"""
+
+    def __init__(self, mode='gunicorn', base_port=3000, env=None, log_dir=None, keep_data=False):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.gateway_port = base_port
+        self.menu_port = base_port + 1
+        self.order_port = base_port + 2
+        self.extra_env = env or {}
+        self.keep_data = keep_data
+        self.data_dir = tempfile.mkdtemp(prefix='byteristo-load-')
+        self.log_dir = log_dir or self.data_dir
+        self.processes = []
+
+    @property
+    def gateway_url(self):
+        return f'http://127.0.0.1:{self.gateway_port}'
+
+    @property
+    def menu_url(self):
+        return f'http://127.0.0.1:{self.menu_port}'
+
+    @property
+    def order_url(self):
+        return f'http://127.0.0.1:{self.order_port}'
+
+    def _start(self, service, port, env):
+        service_dir = os.path.join(SERVICES_DIR, service)
+        full_env = {
+            **os.environ,
+            'PYTHONPATH': os.pathsep.join([os.path.join(service_dir, 'src'), SERVICES_DIR]),  # + shared/
+            'PORT': str(port),
+            'FLASK_ENV': 'development' if self.mode == 'dev' else 'production',
+            **env,
+            **self.extra_env
+        }
+        if self.mode == 'dev':
+            command = [sys.executable, 'src/app.py']
+        else:
+            command = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'wsgi:app']
+
+        log = open(os.path.join(self.log_dir, f'{service}.log'), 'w')
+        process = subprocess.Popen(command, cwd=service_dir, env=full_env, stdout=log, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+        self.processes.append((service, process, log))
+
+    def start(self, timeout=30):
+        menu_db = os.path.join(self.data_dir, 'menu.db')
+        order_db = os.path.join(self.data_dir, 'orders.db')
+
+        self._start('menu-inventory', self.menu_port, {'DATABASE_URL': f'sqlite:///{menu_db}'})
+        self._start('order-management', self.order_port, {
+            'DATABASE_URL': f'sqlite:///{order_db}',
+            'MENU_SERVICE_URL': self.menu_url
+        })
+        self._start('api-gateway', self.gateway_port, {
+            'MENU_SERVICE_URL': self.menu_url,
+            'ORDER_SERVICE_URL': self.order_url
+        })
+
+        for url in (self.menu_url, self.order_url, self.gateway_url):
+            self._wait_ready(url, timeout)
+        return self
+
+    def _wait_ready(self, url, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for service, process, _ in self.processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f'{service} exited with code {process.returncode}; '
+                                       f'see {self.log_dir}/{service}.log')
+            try:
+                with urllib.request.urlopen(f'{url}/readyz', timeout=2) as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f'{url} did not become ready within {timeout}s')
+
+    def stop(self):
+        for _, process, log in self.processes:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, 15)
+                except ProcessLookupError:
+                    pass
+        for _, process, log in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, 9)
+            log.close()
+        self.processes = []
+        if not self.keep_data and self.log_dir != self.data_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -29,7 +29,7 @@ wait_for_service() {
     echo -n "⏳ Waiting for $service_name on port $port... "
     
     while [ $attempt -le $max_attempts ]; do
-        if curl -f -s "http://localhost:$port/health" >/dev/null 2>&1; then
+        if curl -f -s "http://localhost:$port/readyz" >/dev/null 2>&1; then
             echo -e "${GREEN}✅ Ready!${NC}"
             return 0
         fi